@@ -0,0 +1,42 @@
+"""Add per-question mastery table
+
+Revision ID: 33cdb5356a18
+Revises: 6f06e3c01a43
+Create Date: 2026-10-18 09:12:40.118204
+
+Populate existing installations with `python backend/question_mastery.py`.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '33cdb5356a18'
+down_revision: Union[str, Sequence[str], None] = '6f06e3c01a43'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('question_masteries',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('question_id', sa.Integer(), nullable=False),
+    sa.Column('score', sa.Integer(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.ForeignKeyConstraint(['question_id'], ['questions.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('user_id', 'question_id', name='uq_question_masteries_user_question')
+    )
+    op.create_index(op.f('ix_question_masteries_id'), 'question_masteries', ['id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_question_masteries_id'), table_name='question_masteries')
+    op.drop_table('question_masteries')
@@ -0,0 +1,51 @@
+"""Add composite indexes for hot query filters
+
+Revision ID: a4e1c07b9d52
+Revises: 33cdb5356a18
+Create Date: 2026-10-18 10:02:17.554310
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a4e1c07b9d52'
+down_revision: Union[str, Sequence[str], None] = '33cdb5356a18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (index name, table, columns) matched to the filters in routers/
+INDEXES = [
+    ('ix_users_role', 'users', ['role']),
+    ('ix_users_class_id_role', 'users', ['class_id', 'role']),
+    ('ix_classes_teacher_id', 'classes', ['teacher_id']),
+    ('ix_courses_class_id', 'courses', ['class_id']),
+    ('ix_units_course_id', 'units', ['course_id']),
+    ('ix_lessons_unit_id', 'lessons', ['unit_id']),
+    ('ix_materials_lesson_id', 'materials', ['lesson_id']),
+    ('ix_questions_lesson_id', 'questions', ['lesson_id']),
+    ('ix_questions_subject', 'questions', ['subject']),
+    ('ix_user_answers_user_id_question_id', 'user_answers', ['user_id', 'question_id']),
+    ('ix_user_answers_question_id', 'user_answers', ['question_id']),
+    ('ix_masteries_user_id_topic', 'masteries', ['user_id', 'topic']),
+    ('ix_gamifications_user_id', 'gamifications', ['user_id']),
+    ('ix_sessions_user_id_start_time', 'sessions', ['user_id', 'start_time']),
+    ('ix_progress_user_id_lesson_id', 'progress', ['user_id', 'lesson_id']),
+    ('ix_progress_lesson_id_user_id', 'progress', ['lesson_id', 'user_id']),
+    ('ix_progress_user_id_status', 'progress', ['user_id', 'status']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for name, table, columns in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
@@ -0,0 +1,31 @@
+"""Add composite index for the interventions listing
+
+Revision ID: a7d3e9f41c85
+Revises: f1c94a7e2b60
+Create Date: 2026-10-18 17:41:52.730164
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d3e9f41c85'
+down_revision: Union[str, Sequence[str], None] = 'f1c94a7e2b60'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_interventions_teacher_id_status_priority_created_at', 'interventions',
+        ['teacher_id', 'status', 'priority', 'created_at'], unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_interventions_teacher_id_status_priority_created_at', table_name='interventions')
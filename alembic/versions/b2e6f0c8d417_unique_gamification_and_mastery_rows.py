@@ -0,0 +1,56 @@
+"""Make gamification and topic mastery rows unique per student
+
+Revision ID: b2e6f0c8d417
+Revises: a7d3e9f41c85
+Create Date: 2026-10-18 19:12:40.581937
+
+Duplicates left by concurrent first answers are merged before the
+constraints are added: a student's gamification rows keep the summed points
+and the longest streak, and duplicate topic masteries keep the highest score.
+The unique constraints replace the plain lookup indexes on the same columns.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b2e6f0c8d417'
+down_revision: Union[str, Sequence[str], None] = 'a7d3e9f41c85'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute(
+        'UPDATE gamifications SET '
+        'points = (SELECT SUM(g.points) FROM gamifications g WHERE g.user_id = gamifications.user_id), '
+        'streak = (SELECT MAX(g.streak) FROM gamifications g WHERE g.user_id = gamifications.user_id) '
+        'WHERE id IN (SELECT MIN(id) FROM gamifications GROUP BY user_id HAVING COUNT(*) > 1)'
+    )
+    op.execute('DELETE FROM gamifications WHERE id NOT IN (SELECT MIN(id) FROM gamifications GROUP BY user_id)')
+    op.execute(
+        'UPDATE masteries SET '
+        'score = (SELECT MAX(m.score) FROM masteries m WHERE m.user_id = masteries.user_id AND m.topic = masteries.topic) '
+        'WHERE id IN (SELECT MIN(id) FROM masteries GROUP BY user_id, topic HAVING COUNT(*) > 1)'
+    )
+    op.execute('DELETE FROM masteries WHERE id NOT IN (SELECT MIN(id) FROM masteries GROUP BY user_id, topic)')
+
+    with op.batch_alter_table('gamifications') as batch_op:
+        batch_op.drop_index('ix_gamifications_user_id')
+        batch_op.create_unique_constraint('uq_gamifications_user_id', ['user_id'])
+    with op.batch_alter_table('masteries') as batch_op:
+        batch_op.drop_index('ix_masteries_user_id_topic')
+        batch_op.create_unique_constraint('uq_masteries_user_topic', ['user_id', 'topic'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('masteries') as batch_op:
+        batch_op.drop_constraint('uq_masteries_user_topic', type_='unique')
+        batch_op.create_index('ix_masteries_user_id_topic', ['user_id', 'topic'], unique=False)
+    with op.batch_alter_table('gamifications') as batch_op:
+        batch_op.drop_constraint('uq_gamifications_user_id', type_='unique')
+        batch_op.create_index('ix_gamifications_user_id', ['user_id'], unique=False)
@@ -0,0 +1,31 @@
+"""Add content hash and size to materials
+
+Revision ID: c81f2d6e4a90
+Revises: a4e1c07b9d52
+Create Date: 2026-10-18 13:41:05.218774
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c81f2d6e4a90'
+down_revision: Union[str, Sequence[str], None] = 'a4e1c07b9d52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('materials', sa.Column('content_hash', sa.String(length=64), nullable=True))
+    op.add_column('materials', sa.Column('size', sa.BigInteger(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('materials') as batch_op:
+        batch_op.drop_column('size')
+        batch_op.drop_column('content_hash')
@@ -0,0 +1,35 @@
+"""Add submission ids to user answers
+
+Revision ID: c9a4d2f7e815
+Revises: b2e6f0c8d417
+Create Date: 2026-10-18 21:05:13.204719
+
+Answers committed from the write-behind journal carry the id they were
+journaled under; the unique constraint makes replaying a journal after a
+crash apply each answer at most once. Existing answers keep a NULL id.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c9a4d2f7e815'
+down_revision: Union[str, Sequence[str], None] = 'b2e6f0c8d417'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('user_answers') as batch_op:
+        batch_op.add_column(sa.Column('submission_id', sa.String(length=36), nullable=True))
+        batch_op.create_unique_constraint('uq_user_answers_submission_id', ['submission_id'])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('user_answers') as batch_op:
+        batch_op.drop_constraint('uq_user_answers_submission_id', type_='unique')
+        batch_op.drop_column('submission_id')
@@ -0,0 +1,37 @@
+"""Add item parameters
+
+Revision ID: d6f83b1a9c24
+Revises: c9a4d2f7e815
+Create Date: 2026-10-18 22:41:06.817352
+
+The table is filled by running irt_calibration.py.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd6f83b1a9c24'
+down_revision: Union[str, Sequence[str], None] = 'c9a4d2f7e815'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('item_parameters',
+    sa.Column('question_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('difficulty', sa.Float(), nullable=False),
+    sa.Column('discrimination', sa.Float(), nullable=False),
+    sa.Column('answers', sa.Integer(), nullable=False),
+    sa.Column('calibrated_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['question_id'], ['questions.id'], ),
+    sa.PrimaryKeyConstraint('question_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('item_parameters')
@@ -0,0 +1,42 @@
+"""Add per-class dashboard rollups
+
+Revision ID: e5b28c4f1d73
+Revises: d3a97b1e5f20
+Create Date: 2026-10-18 15:52:09.447102
+
+Rows are built on first dashboard load; `python backend/class_rollups.py`
+refreshes every class up front.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b28c4f1d73'
+down_revision: Union[str, Sequence[str], None] = 'd3a97b1e5f20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('class_rollups',
+    sa.Column('class_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('total_students', sa.Integer(), nullable=False),
+    sa.Column('active_students_today', sa.Integer(), nullable=False),
+    sa.Column('mastery_sum', sa.Float(), nullable=False),
+    sa.Column('mastery_count', sa.Integer(), nullable=False),
+    sa.Column('total_questions_attempted', sa.Integer(), nullable=False),
+    sa.Column('completed_students', sa.Integer(), nullable=False),
+    sa.Column('top_students', sa.Text(), nullable=False),
+    sa.Column('refreshed_at', sa.DateTime(timezone=True), nullable=False),
+    sa.ForeignKeyConstraint(['class_id'], ['classes.id'], ),
+    sa.PrimaryKeyConstraint('class_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('class_rollups')
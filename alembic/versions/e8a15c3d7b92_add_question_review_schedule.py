@@ -0,0 +1,42 @@
+"""Add the SM-2 review schedule to question masteries
+
+Revision ID: e8a15c3d7b92
+Revises: d6f83b1a9c24
+Create Date: 2026-10-18 23:26:52.095318
+
+Existing question masteries become due immediately with a fresh schedule;
+run question_mastery.py afterwards to rebuild the schedules from answer
+history instead.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8a15c3d7b92'
+down_revision: Union[str, Sequence[str], None] = 'd6f83b1a9c24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('question_masteries') as batch_op:
+        batch_op.add_column(sa.Column('easiness', sa.Float(), nullable=False, server_default='2.5'))
+        batch_op.add_column(sa.Column('interval_days', sa.Float(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('repetitions', sa.Integer(), nullable=False, server_default='0'))
+        batch_op.add_column(sa.Column('due_at', sa.DateTime(timezone=True), nullable=True))
+        batch_op.create_index('ix_question_masteries_user_id_due_at', ['user_id', 'due_at'], unique=False)
+    op.execute('UPDATE question_masteries SET due_at = updated_at')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('question_masteries') as batch_op:
+        batch_op.drop_index('ix_question_masteries_user_id_due_at')
+        batch_op.drop_column('due_at')
+        batch_op.drop_column('repetitions')
+        batch_op.drop_column('interval_days')
+        batch_op.drop_column('easiness')
@@ -0,0 +1,48 @@
+"""Add daily active users
+
+Revision ID: f1c94a7e2b60
+Revises: e5b28c4f1d73
+Create Date: 2026-10-18 17:04:31.208415
+
+The table is backfilled from existing sessions; new sessions are recorded as
+they are inserted.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1c94a7e2b60'
+down_revision: Union[str, Sequence[str], None] = 'e5b28c4f1d73'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('daily_active_users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('day', 'user_id', name='uq_daily_active_users_day_user')
+    )
+    op.create_index(op.f('ix_daily_active_users_id'), 'daily_active_users', ['id'], unique=False)
+
+    if op.get_bind().dialect.name == 'sqlite':
+        session_day = 'date(start_time)'
+    else:
+        session_day = 'CAST(start_time AS DATE)'
+    op.execute(
+        'INSERT INTO daily_active_users (user_id, day) '
+        f'SELECT DISTINCT user_id, {session_day} FROM sessions'
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_daily_active_users_id'), table_name='daily_active_users')
+    op.drop_table('daily_active_users')
@@ -0,0 +1,32 @@
+"""Add question version
+
+Revision ID: f3b97e2c6a41
+Revises: e8a15c3d7b92
+Create Date: 2026-10-19 00:12:37.480215
+
+The ORM increments the version on every update to a question; cached
+question payloads are keyed by it. Existing questions start at 1.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3b97e2c6a41'
+down_revision: Union[str, Sequence[str], None] = 'e8a15c3d7b92'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with op.batch_alter_table('questions') as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), nullable=False, server_default='1'))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table('questions') as batch_op:
+        batch_op.drop_column('version')
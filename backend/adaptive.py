@@ -0,0 +1,331 @@
+"""
+Pluggable next-question selection for the practice system.
+
+get_next_question asks `question_selector` for a question and submitting an
+answer reports it back through record_answer. QUESTION_SELECTOR picks the
+engine:
+
+- "mastery" (default): the question the student has the lowest per-question
+  mastery in, ties broken at random.
+- "elo": an online Elo/IRT model. Each question has a difficulty b (and a
+  discrimination a, 1 until calibrated) and each student an ability theta;
+  the chance of a correct answer is 1 / (1 + exp(-a * (theta - b))). After
+  every answer both estimates move towards the observed outcome, by steps
+  that shrink as more answers are seen. Hints and slow answers count as
+  partially correct. The next question is drawn from the few questions
+  whose difficulty is closest to the one the student should answer
+  correctly ADAPTIVE_TARGET_SUCCESS of the time, skipping the student's
+  most recent questions.
+
+The Elo state lives in NumPy arrays in the process. Question parameters
+start from the latest offline calibration in item_parameters (see
+irt_calibration.py), falling back to the Question.difficulty label, and are
+reloaded when a newer calibration is seen. Abilities start from the
+student's overall success rate, so a restart loses only the online
+refinements. Each question
+bank scope keeps its questions sorted by difficulty (re-sorted as the
+estimates drift), so a pick is a binary search rather than a scan of the
+pool.
+"""
+
+import bisect
+import math
+import os
+import random
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import case, func
+from sqlalchemy.orm import Session
+
+from models import ItemParameter, QuestionMastery, UserAnswer
+from question_bank import QuestionEntry, question_bank
+
+QUESTION_SELECTOR = os.getenv("QUESTION_SELECTOR", "mastery")
+# Probability of a correct answer the Elo selector aims for
+ADAPTIVE_TARGET_SUCCESS = float(os.getenv("ADAPTIVE_TARGET_SUCCESS", "0.7"))
+
+# Initial difficulties of the hand-labelled levels, on the ability scale
+DIFFICULTY_PRIORS = {"easy": -1.0, "medium": 0.0, "hard": 1.0}
+# Step size K(n) = ELO_K / (1 + ELO_K_DECAY * n) after n answers
+ELO_K = 0.8
+ELO_K_DECAY = 0.05
+# Partial credit for correct answers
+HINT_PENALTY = 0.25
+SLOW_ANSWER_SECONDS = 60
+SLOW_ANSWER_PENALTY = 0.15
+MIN_CORRECT_SCORE = 0.25
+# Questions nearest the target difficulty that the pick is drawn from
+SELECTION_WINDOW = 8
+# Questions a student answered recently that are not offered again
+RECENT_QUESTIONS = 10
+# Difficulty updates before a scope is re-sorted, as a fraction of its size
+RESORT_FRACTION = 0.05
+RESORT_MIN_UPDATES = 100
+
+class QuestionSelector(ABC):
+    """Chooses the next practice question and learns from answers."""
+
+    @abstractmethod
+    def select(
+        self,
+        db: Session,
+        user_id: int,
+        lesson_id: Optional[int] = None,
+        unit_id: Optional[int] = None,
+        subject: Optional[str] = None
+    ) -> Optional[QuestionEntry]:
+        """Return the next question in the most specific scope given, or None if it is empty."""
+
+    @abstractmethod
+    def select_many(
+        self,
+        db: Session,
+        user_id: int,
+        count: int,
+        lesson_id: Optional[int] = None,
+        unit_id: Optional[int] = None,
+        subject: Optional[str] = None
+    ) -> List[QuestionEntry]:
+        """Return up to `count` distinct questions to serve next, in order, as select would pick them now."""
+
+    def record_answer(self, db: Session, user_id: int, question, is_correct: bool,
+                      time_taken: Optional[float] = None, hints_used: Optional[int] = 0):
+        """Update the selector after a student answered `question`."""
+
+class MasterySelector(QuestionSelector):
+    """Lowest per-question mastery first, read from question_masteries."""
+
+    def _mastery_scores(self, db: Session, user_id: int, questions: List[QuestionEntry]) -> Dict[int, float]:
+        question_ids = [q.id for q in questions]
+        return dict(db.query(QuestionMastery.question_id, QuestionMastery.score).filter(
+            QuestionMastery.user_id == user_id,
+            QuestionMastery.question_id.in_(question_ids)
+        ).all())
+
+    def select(self, db, user_id, lesson_id=None, unit_id=None, subject=None):
+        questions = question_bank.get_questions(db, lesson_id=lesson_id, unit_id=unit_id, subject=subject)
+        if not questions:
+            return None
+        mastery_scores = self._mastery_scores(db, user_id, questions)
+
+        # Select question with lowest mastery (unanswered count as 0) or random if all equal
+        min_mastery = min(mastery_scores.get(q.id, 0) for q in questions)
+        candidates = [q for q in questions if mastery_scores.get(q.id, 0) == min_mastery]
+        return random.choice(candidates)
+
+    def select_many(self, db, user_id, count, lesson_id=None, unit_id=None, subject=None):
+        questions = question_bank.get_questions(db, lesson_id=lesson_id, unit_id=unit_id, subject=subject)
+        if not questions:
+            return []
+        mastery_scores = self._mastery_scores(db, user_id, questions)
+
+        # Lowest mastery first, random order within equal scores
+        shuffled = random.sample(questions, len(questions))
+        return sorted(shuffled, key=lambda q: mastery_scores.get(q.id, 0))[:count]
+
+def answer_score(is_correct: bool, time_taken: Optional[float], hints_used: Optional[int]) -> float:
+    """Return the observed outcome of an answer in [0, 1]."""
+    if not is_correct:
+        return 0.0
+    score = 1.0 - HINT_PENALTY * (hints_used or 0)
+    if time_taken is not None and time_taken >= SLOW_ANSWER_SECONDS:
+        score -= SLOW_ANSWER_PENALTY
+    return max(MIN_CORRECT_SCORE, score)
+
+def _grow(array: np.ndarray, size: int, fill: float) -> np.ndarray:
+    if size <= len(array):
+        return array
+    grown = np.full(max(size, 2 * len(array)), fill, dtype=array.dtype)
+    grown[:len(array)] = array
+    return grown
+
+@dataclass
+class _Scope:
+    """A question bank scope sorted by difficulty."""
+    generation: int
+    updates: int  # Difficulty updates seen when the scope was sorted
+    difficulties: List[float]
+    entries: List[QuestionEntry]
+
+class EloSelector(QuestionSelector):
+    """Online Elo/IRT ability and difficulty estimates kept in NumPy arrays."""
+
+    def __init__(self, target_success: float = ADAPTIVE_TARGET_SUCCESS, rng: Optional[random.Random] = None):
+        # Pick b so that P(correct) = target_success for an average question
+        self.target_offset = math.log(target_success / (1 - target_success))
+        self.rng = rng or random.Random()
+        self._lock = threading.Lock()
+        self._item_slots: Dict[int, int] = {}
+        self._difficulty = np.zeros(1024)
+        self._discrimination = np.ones(1024)
+        self._item_answers = np.zeros(1024, dtype=np.int64)
+        self._student_slots: Dict[int, int] = {}
+        self._ability = np.zeros(1024)
+        self._student_answers = np.zeros(1024, dtype=np.int64)
+        self._recent: Dict[int, Deque[int]] = {}
+        self._scopes: Dict[Tuple[str, object], _Scope] = {}
+        self._updates = 0
+        self._calibration: Dict[int, Tuple[float, float]] = {}
+        self._calibrated_at = None
+
+    def _load_calibration(self, db: Session):
+        """Apply item_parameters if a calibration newer than the loaded one exists."""
+        calibrated_at = db.query(func.max(ItemParameter.calibrated_at)).scalar()
+        if calibrated_at is None or calibrated_at == self._calibrated_at:
+            return
+        calibration = {
+            row.question_id: (row.difficulty, row.discrimination)
+            for row in db.query(ItemParameter.question_id, ItemParameter.difficulty, ItemParameter.discrimination)
+        }
+        with self._lock:
+            self._calibration = calibration
+            self._calibrated_at = calibrated_at
+            for question_id, (difficulty, discrimination) in calibration.items():
+                slot = self._item_slots.get(question_id)
+                if slot is not None:
+                    self._difficulty[slot] = difficulty
+                    self._discrimination[slot] = discrimination
+            self._scopes.clear()  # Sorted by the old difficulties
+
+    def _item_slot(self, question_id: int, difficulty_label: str) -> int:
+        slot = self._item_slots.get(question_id)
+        if slot is None:
+            slot = len(self._item_slots)
+            self._difficulty = _grow(self._difficulty, slot + 1, 0.0)
+            self._discrimination = _grow(self._discrimination, slot + 1, 1.0)
+            self._item_answers = _grow(self._item_answers, slot + 1, 0)
+            difficulty, discrimination = self._calibration.get(
+                question_id, (DIFFICULTY_PRIORS.get(difficulty_label, 0.0), 1.0)
+            )
+            self._difficulty[slot] = difficulty
+            self._discrimination[slot] = discrimination
+            self._item_slots[question_id] = slot
+        return slot
+
+    def _student_slot(self, db: Session, user_id: int) -> int:
+        slot = self._student_slots.get(user_id)
+        if slot is not None:
+            return slot
+        # Seed from the student's success rate (smoothed log-odds) on first sight
+        answered, correct = db.query(
+            func.count(UserAnswer.id),
+            func.count(case((UserAnswer.is_correct == True, 1)))
+        ).filter(UserAnswer.user_id == user_id).one()
+        with self._lock:
+            slot = self._student_slots.get(user_id)
+            if slot is None:
+                slot = len(self._student_slots)
+                self._ability = _grow(self._ability, slot + 1, 0.0)
+                self._student_answers = _grow(self._student_answers, slot + 1, 0)
+                self._ability[slot] = math.log((correct + 1) / (answered - correct + 1))
+                self._student_answers[slot] = answered
+                self._student_slots[user_id] = slot
+        return slot
+
+    def _scope(self, db: Session, lesson_id, unit_id, subject) -> Optional[_Scope]:
+        key = question_bank.scope_key(lesson_id, unit_id, subject)
+        generation = question_bank.current_generation()
+        scope = self._scopes.get(key)
+        if scope is not None and scope.generation == generation and (
+            self._updates - scope.updates <= max(RESORT_MIN_UPDATES, RESORT_FRACTION * len(scope.entries))
+        ):
+            return scope
+
+        self._load_calibration(db)
+        entries = question_bank.get_questions(db, lesson_id=lesson_id, unit_id=unit_id, subject=subject)
+        if not entries:
+            return None
+        with self._lock:
+            slots = np.fromiter((self._item_slot(e.id, e.difficulty) for e in entries),
+                                dtype=np.int64, count=len(entries))
+            difficulties = self._difficulty[slots]
+            updates = self._updates
+        order = np.argsort(difficulties, kind="stable")
+        scope = _Scope(
+            generation=generation,
+            updates=updates,
+            difficulties=difficulties[order].tolist(),
+            entries=[entries[i] for i in order]
+        )
+        self._scopes[key] = scope
+        return scope
+
+    def _candidates(self, db, user_id, lesson_id, unit_id, subject) -> Tuple[Optional[_Scope], List[int]]:
+        """Return the scope and the sorted positions of the questions nearest the student's target."""
+        scope = self._scope(db, lesson_id, unit_id, subject)
+        if scope is None:
+            return None, []
+        target = float(self._ability[self._student_slot(db, user_id)]) - self.target_offset
+
+        # Walk outwards from the target's place in the sorted scope, nearest first
+        difficulties = scope.difficulties
+        n = len(difficulties)
+        recent = self._recent.get(user_id, ())
+        right = bisect.bisect_left(difficulties, target)
+        left = right - 1
+        nearest, candidates = [], []
+        while len(candidates) < SELECTION_WINDOW and (left >= 0 or right < n):
+            if right >= n or (left >= 0 and target - difficulties[left] <= difficulties[right] - target):
+                k = left
+                left -= 1
+            else:
+                k = right
+                right += 1
+            nearest.append(k)
+            if scope.entries[k].id not in recent:
+                candidates.append(k)
+        # Only recently answered questions in the scope: repeat the nearest ones
+        return scope, candidates or nearest[:SELECTION_WINDOW]
+
+    def select(self, db, user_id, lesson_id=None, unit_id=None, subject=None):
+        scope, candidates = self._candidates(db, user_id, lesson_id, unit_id, subject)
+        if scope is None:
+            return None
+        return scope.entries[self.rng.choice(candidates)]
+
+    def select_many(self, db, user_id, count, lesson_id=None, unit_id=None, subject=None):
+        scope, candidates = self._candidates(db, user_id, lesson_id, unit_id, subject)
+        if scope is None:
+            return []
+        return [scope.entries[k] for k in self.rng.sample(candidates, min(count, len(candidates)))]
+
+    def record_answer(self, db, user_id, question, is_correct, time_taken=None, hints_used=0):
+        student = self._student_slot(db, user_id)
+        score = answer_score(is_correct, time_taken, hints_used)
+        with self._lock:
+            item = self._item_slot(question.id, question.difficulty)
+            a = self._discrimination[item]
+            theta = self._ability[student]
+            b = self._difficulty[item]
+            error = score - 1 / (1 + math.exp(-a * (theta - b)))
+            self._ability[student] = theta + ELO_K / (1 + ELO_K_DECAY * self._student_answers[student]) * error
+            self._difficulty[item] = b - ELO_K / (1 + ELO_K_DECAY * self._item_answers[item]) * error
+            self._student_answers[student] += 1
+            self._item_answers[item] += 1
+            self._updates += 1
+            self._recent.setdefault(user_id, deque(maxlen=RECENT_QUESTIONS)).append(question.id)
+
+    def ability(self, user_id: int) -> Optional[float]:
+        """Return a student's current ability estimate, if seen."""
+        slot = self._student_slots.get(user_id)
+        return None if slot is None else float(self._ability[slot])
+
+    def difficulty(self, question_id: int) -> Optional[float]:
+        """Return a question's current difficulty estimate, if seen."""
+        slot = self._item_slots.get(question_id)
+        return None if slot is None else float(self._difficulty[slot])
+
+SELECTORS = {
+    "mastery": MasterySelector,
+    "elo": EloSelector
+}
+
+if QUESTION_SELECTOR not in SELECTORS:
+    raise ValueError(f"Unknown QUESTION_SELECTOR {QUESTION_SELECTOR!r}; choose one of: {', '.join(SELECTORS)}")
+
+question_selector: QuestionSelector = SELECTORS[QUESTION_SELECTOR]()
@@ -0,0 +1,130 @@
+"""
+Cached ownership lookups for content permission checks.
+
+Courses, units and lessons are only readable by students of the owning class
+and writable by the class's teacher. Instead of walking Lesson -> Unit ->
+Course -> Class one query per hop, the resolver answers "which class and
+teacher own this object" with a single joined query and caches the result.
+Any committed update or delete of a class, course, unit or lesson clears the
+cache; inserts cannot change an existing object's owner, and missing objects
+are never cached.
+"""
+
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from cache import TTLCache
+from database import Base
+from models import Class, Course, Lesson, Unit
+
+# Upper bound on staleness when another process moves content between classes
+ANCESTRY_CACHE_TTL_SECONDS = float(os.getenv("ANCESTRY_CACHE_TTL_SECONDS", "300"))
+ANCESTRY_CACHE_MAX_SIZE = int(os.getenv("ANCESTRY_CACHE_MAX_SIZE", "50000"))
+
+_TRACKED_MODELS = (Class, Course, Unit, Lesson)
+
+@dataclass(frozen=True)
+class Ancestry:
+    """The class and teacher that own a course, unit or lesson."""
+    class_id: int
+    teacher_id: Optional[int]
+
+def _statement(kind: str, object_id: int):
+    columns = (Course.class_id, Class.teacher_id)
+    if kind == "course":
+        stmt = select(*columns).select_from(Course).where(Course.id == object_id)
+    elif kind == "unit":
+        stmt = (
+            select(*columns).select_from(Unit)
+            .join(Course, Course.id == Unit.course_id)
+            .where(Unit.id == object_id)
+        )
+    elif kind == "lesson":
+        stmt = (
+            select(*columns).select_from(Lesson)
+            .join(Unit, Unit.id == Lesson.unit_id)
+            .join(Course, Course.id == Unit.course_id)
+            .where(Lesson.id == object_id)
+        )
+    else:
+        raise ValueError(f"Unknown content kind: {kind}")
+    return stmt.outerjoin(Class, Class.id == Course.class_id)
+
+class AncestryResolver:
+    """Resolves and caches the owning class and teacher of content objects."""
+
+    def __init__(self, maxsize: int = ANCESTRY_CACHE_MAX_SIZE, ttl_seconds: float = ANCESTRY_CACHE_TTL_SECONDS):
+        self._cache = TTLCache(maxsize=maxsize, ttl_seconds=ttl_seconds)
+
+    def resolve(self, db: Session, kind: str, object_id: int) -> Optional[Ancestry]:
+        """Return the owner of a course, unit or lesson, or None if it does not exist."""
+        key = (kind, object_id)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        row = db.execute(_statement(kind, object_id)).first()
+        return self._store(key, row)
+
+    async def resolve_async(self, db: AsyncSession, kind: str, object_id: int) -> Optional[Ancestry]:
+        """Async variant of resolve() for endpoints using get_async_db."""
+        key = (kind, object_id)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        row = (await db.execute(_statement(kind, object_id))).first()
+        return self._store(key, row)
+
+    def _store(self, key, row) -> Optional[Ancestry]:
+        if row is None:
+            return None
+        ancestry = Ancestry(class_id=row.class_id, teacher_id=row.teacher_id)
+        self._cache.set(key, ancestry)
+        return ancestry
+
+    def invalidate(self):
+        """Drop every cached owner."""
+        self._cache.clear()
+
+    def stats(self):
+        """Return cache hit/miss counters."""
+        return self._cache.stats()
+
+ancestry_resolver = AncestryResolver()
+
+def check_read_access(ancestry: Ancestry, current_user):
+    """Students may read their own class's content, teachers their classes' content."""
+    if current_user.role == "student" and ancestry.class_id != current_user.class_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    elif current_user.role == "teacher" and ancestry.teacher_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+def check_write_access(ancestry: Ancestry, current_user):
+    """Only the owning class's teacher may change its content."""
+    if ancestry.teacher_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+@event.listens_for(Session, "after_flush")
+def _mark_ownership_writes(session, flush_context):
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, _TRACKED_MODELS):
+            session.info["ancestry_dirty"] = True
+            return
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    if session.info.pop("ancestry_dirty", False):
+        ancestry_resolver.invalidate()
+
+@event.listens_for(Session, "after_rollback")
+def _reset_on_rollback(session):
+    session.info.pop("ancestry_dirty", None)
+
+@event.listens_for(Base.metadata, "after_drop")
+def _invalidate_on_drop(target, connection, **kw):
+    ancestry_resolver.invalidate()
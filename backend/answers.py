@@ -0,0 +1,177 @@
+"""
+Applying submitted answers.
+
+Single submissions and offline batches go through apply_answers, which
+applies a student's answers in order inside the caller's transaction. The
+questions of a batch are read with one query. Each touched topic mastery,
+question mastery and the gamification row then get one atomic UPDATE
+computed in SQL, so double taps and parallel tabs cannot lose updates, and
+the class rollup is updated once.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+from counters import ClampedChange, insert_ignore
+from models import Gamification, Mastery, Question, UserAnswer
+from spaced_repetition import review_quality
+import class_rollups
+import question_mastery
+
+# Topic mastery moves by these amounts per answer, within 0-100
+MASTERY_CORRECT_DELTA = 5
+MASTERY_WRONG_DELTA = 2
+MAX_MASTERY = 100
+
+@dataclass
+class AnswerInput:
+    """One answer to apply; `answered_at` is the client's timestamp, if known.
+
+    `submission_id` identifies answers replayed from the write-behind journal,
+    which are applied at most once.
+    """
+    question_id: int
+    answer: str
+    time_taken: Optional[float] = None
+    hints_used: Optional[int] = 0
+    answered_at: Optional[datetime] = None
+    submission_id: Optional[str] = None
+
+@dataclass
+class AnswerOutcome:
+    """Result of applying one answer; `question` is None if it does not exist."""
+    question: Optional[Question]
+    is_correct: bool = False
+    points_earned: int = 0
+    mastery_increased: bool = False
+
+def mastery_topic(question) -> str:
+    """Return the topic mastery a question counts towards."""
+    return f"{question.subject}_{question.difficulty}"
+
+def mastery_change(is_correct: bool) -> Tuple[int, int, int]:
+    """Return the (delta, low, high) clamped addition one answer applies to its topic mastery."""
+    return (MASTERY_CORRECT_DELTA if is_correct else -MASTERY_WRONG_DELTA), 0, MAX_MASTERY
+
+def grade_answer(question, answer: str, time_taken: Optional[float]) -> Tuple[bool, int]:
+    """Return whether an answer is correct and the points it earns."""
+    is_correct = answer.strip().lower() == question.correct_answer.strip().lower()
+    points_earned = 0
+    if is_correct:
+        points_earned = 10 + (5 if time_taken and time_taken < 60 else 0)  # Bonus for quick answers
+    return is_correct, points_earned
+
+def _stored_time(answered_at: datetime) -> datetime:
+    # Stored as naive UTC like the rest of the schema; clocks ahead of the server are clamped
+    if answered_at.tzinfo is not None:
+        answered_at = answered_at.astimezone(timezone.utc).replace(tzinfo=None)
+    return min(answered_at, datetime.utcnow())
+
+def apply_answers(db: Session, user_id: int, class_id: Optional[int], inputs: Sequence[AnswerInput]) -> List[AnswerOutcome]:
+    """Apply a student's answers in order without committing.
+
+    Answers to questions that do not exist are skipped and reported with
+    `question=None`.
+    """
+    now = datetime.utcnow()
+    questions: Dict[int, Question] = {
+        q.id: q for q in db.query(Question).filter(Question.id.in_({i.question_id for i in inputs}))
+    }
+    if not questions:
+        return [AnswerOutcome(question=None) for _ in inputs]
+
+    outcomes = []
+    graded = []
+    topic_changes: Dict[str, ClampedChange] = {}
+    points = 0
+    streak = 0
+    streak_broken = False
+    for item in inputs:
+        question = questions.get(item.question_id)
+        if question is None:
+            outcomes.append(AnswerOutcome(question=None))
+            continue
+
+        is_correct, points_earned = grade_answer(question, item.answer, item.time_taken)
+        answered_at = _stored_time(item.answered_at) if item.answered_at is not None else now
+        graded.append((question.id, is_correct, review_quality(is_correct, item.time_taken, item.hints_used),
+                       answered_at))
+
+        user_answer = UserAnswer(
+            user_id=user_id,
+            question_id=question.id,
+            answer=item.answer,
+            is_correct=is_correct,
+            time_taken=item.time_taken,
+            hints_used=item.hints_used or 0,
+            submission_id=item.submission_id
+        )
+        if item.answered_at is not None:
+            user_answer.created_at = answered_at
+        db.add(user_answer)
+
+        topic = mastery_topic(question)
+        topic_changes[topic] = topic_changes.get(topic, ClampedChange()).then(*mastery_change(is_correct))
+
+        points += points_earned
+        if is_correct:
+            streak += 1
+        else:
+            streak = 0
+            streak_broken = True
+
+        outcomes.append(AnswerOutcome(
+            question=question,
+            is_correct=is_correct,
+            points_earned=points_earned,
+            mastery_increased=is_correct
+        ))
+
+    # Update mastery. Missing rows are created first so that every change is
+    # an UPDATE; rows are locked in topic order (FOR UPDATE is a no-op on SQLite,
+    # where the inserts already hold the write lock) to read the previous scores
+    # for the class rollup.
+    mastery_added = 0
+    for topic in sorted(topic_changes):
+        mastery_added += insert_ignore(db, Mastery.__table__, {"user_id": user_id, "topic": topic, "score": 0.0},
+                                       ("user_id", "topic"))
+    previous_scores = dict(db.query(Mastery.topic, Mastery.score).filter(
+        Mastery.user_id == user_id,
+        Mastery.topic.in_(topic_changes)
+    ).order_by(Mastery.topic).with_for_update())
+    for topic in sorted(topic_changes):
+        db.execute(
+            update(Mastery)
+            .where(Mastery.user_id == user_id, Mastery.topic == topic)
+            .values(score=topic_changes[topic].expression(Mastery.score), updated_at=now)
+        )
+
+    # Update gamification
+    insert_ignore(db, Gamification.__table__, {"user_id": user_id, "points": 0, "streak": 0}, ("user_id",))
+    db.execute(
+        update(Gamification)
+        .where(Gamification.user_id == user_id)
+        .values(
+            points=Gamification.points + points,
+            streak=streak if streak_broken else Gamification.streak + streak,
+            updated_at=now
+        )
+    )
+
+    # Update per-question mastery and review schedule used for next question selection
+    question_mastery.record_answers(db, user_id, graded)
+
+    # Keep the class dashboard rollup current
+    class_rollups.record_answer(
+        db,
+        class_id,
+        mastery_delta=sum(change.apply(previous_scores[topic]) - previous_scores[topic]
+                          for topic, change in topic_changes.items()),
+        mastery_added=mastery_added,
+        answers=len(graded)
+    )
+    return outcomes
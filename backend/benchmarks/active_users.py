@@ -0,0 +1,103 @@
+"""
+Active-users-today benchmark.
+
+Loads a SQLite database with synthetic sessions (1M by default, spread over
+30 days), rebuilds daily_active_users from them and times each way of counting
+today's active students:
+
+- legacy:   `.distinct(user_id).count()` with `date(start_time) = today`, which
+            on SQLite counts sessions, not users, and cannot use an index
+- date():   `COUNT(DISTINCT user_id)` with `date(start_time) = today`
+- range:    `COUNT(DISTINCT user_id)` with a `start_time` range on the index
+- daily:    lookup in daily_active_users
+
+    python benchmarks/active_users.py --sessions 1000000 --users 20000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import warnings
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def timed(label, fn, repeat):
+    result = fn()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    elapsed = (time.perf_counter() - started) * 1000 / repeat
+    print(f"{label:<10} {result:>8}  {elapsed:9.2f} ms")
+
+def run(args):
+    from sqlalchemy import func, insert, select
+    from sqlalchemy.exc import SADeprecationWarning
+    from database import Base, SessionLocal, engine
+    from models import Session as UserSession, User
+    from daily_activity import count_active_from_sessions, count_active_users, rebuild_daily_active_users
+
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    today = now.date()
+
+    db = SessionLocal()
+    try:
+        db.execute(insert(User), [
+            {"username": f"student{i}", "email": f"student{i}@example.com", "hashed_password": "x",
+             "full_name": f"Student {i}", "role": "student"}
+            for i in range(args.users)
+        ])
+        batch = []
+        for _ in range(args.sessions):
+            batch.append({
+                "user_id": rng.randint(1, args.users),
+                "session_type": "practice",
+                "start_time": now - timedelta(seconds=rng.randint(0, 30 * 86400))
+            })
+            if len(batch) == 50000:
+                db.execute(insert(UserSession), batch)
+                batch = []
+        if batch:
+            db.execute(insert(UserSession), batch)
+        db.commit()
+
+        started = time.perf_counter()
+        rows = rebuild_daily_active_users(db)
+        print(f"sessions: {args.sessions}, users: {args.users}, daily active rows: {rows} "
+              f"(rebuilt in {time.perf_counter() - started:.1f}s)\n")
+
+        students = select(User.id).where(User.role == "student")
+        print(f"{'query':<10} {'count':>8}  {'mean':>12}")
+        # The legacy query's DISTINCT ON is ignored (with a deprecation warning) on SQLite
+        warnings.simplefilter("ignore", SADeprecationWarning)
+        timed("legacy", lambda: db.query(UserSession.user_id).filter(
+            UserSession.user_id.in_(students),
+            func.date(UserSession.start_time) == today
+        ).distinct(UserSession.user_id).count(), args.repeat)
+        timed("date()", lambda: db.query(func.count(func.distinct(UserSession.user_id))).filter(
+            UserSession.user_id.in_(students),
+            func.date(UserSession.start_time) == today
+        ).scalar(), args.repeat)
+        timed("range", lambda: count_active_from_sessions(db, today, students), args.repeat)
+        timed("daily", lambda: count_active_users(db, today, students), args.repeat)
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=1000000, help="Number of sessions to generate")
+    parser.add_argument("--users", type=int, default=20000, help="Number of students")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per query")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'active_users.db')}"
+        run(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Write-behind answer submission benchmark.
+
+Submits answers from many students concurrently against the app in-process,
+first committing each answer in its request and then with the write-behind
+journal group-committing every ANSWER_FLUSH_INTERVAL_MS:
+
+    python benchmarks/answer_write_behind.py --answers 2000 --students 50 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+async def run(args, journal_dir):
+    import httpx
+    from main import app
+    from database import SessionLocal, async_engine
+    from models import Class, Course, Lesson, Question, Unit, User, UserAnswer
+    from routers import auth
+    import write_behind
+
+    rng = random.Random(42)
+    db = SessionLocal()
+    try:
+        teacher = User(username="benchteacher", email="teacher@example.com", hashed_password="x",
+                       full_name="Bench Teacher", role="teacher")
+        db.add(teacher)
+        db.flush()
+        class_obj = Class(name="Bench", subject="Mathematics", teacher_id=teacher.id)
+        db.add(class_obj)
+        db.flush()
+        course = Course(name="Bench", subject="Mathematics", class_id=class_obj.id)
+        db.add(course)
+        db.flush()
+        unit = Unit(name="Bench", course_id=course.id)
+        db.add(unit)
+        db.flush()
+        lesson = Lesson(title="Bench", unit_id=unit.id)
+        db.add(lesson)
+        db.flush()
+        questions = [
+            Question(lesson_id=lesson.id, question_text=f"{i} + {i}?", question_type="short_answer",
+                     correct_answer=str(2 * i), difficulty=rng.choice(["easy", "medium", "hard"]),
+                     subject="Mathematics")
+            for i in range(args.questions)
+        ]
+        db.add_all(questions)
+        for mode in ("sync", "journal"):
+            for i in range(args.students):
+                db.add(User(username=f"{mode}{i}", email=f"{mode}{i}@example.com", hashed_password="x",
+                            full_name=f"{mode}{i}", role="student", class_id=class_obj.id))
+        db.commit()
+        answers_by_id = {q.id: q.correct_answer for q in questions}
+    finally:
+        db.close()
+
+    submissions = []
+    for i in range(args.answers):
+        question_id = rng.choice(list(answers_by_id))
+        correct = rng.random() < 0.7
+        submissions.append((i % args.students, question_id, answers_by_id[question_id] if correct else "wrong"))
+
+    async def submit_all(client, mode):
+        semaphore = asyncio.Semaphore(args.concurrency)
+        tokens = [auth.create_access_token({"sub": f"{mode}{i}"}) for i in range(args.students)]
+
+        async def submit(student, question_id, answer):
+            async with semaphore:
+                response = await client.post(
+                    f"/api/practice/questions/{question_id}/answer",
+                    json={"answer": answer, "time_taken": 30},
+                    headers={"Authorization": f"Bearer {tokens[student]}"}
+                )
+                assert response.status_code == 200, response.text
+
+        started = time.perf_counter()
+        await asyncio.gather(*(submit(*item) for item in submissions))
+        return time.perf_counter() - started
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        synchronous = await submit_all(client, "sync")
+
+        journal = write_behind.AnswerJournal(journal_dir, flush_interval_ms=args.flush_interval_ms)
+        journal.start()
+        write_behind.answer_journal = journal
+        try:
+            journaled = await submit_all(client, "journal")
+        finally:
+            write_behind.answer_journal = None
+            journal.stop()
+    # Close pooled aiosqlite connections, whose worker threads would keep the process alive
+    await async_engine.dispose()
+
+    db = SessionLocal()
+    try:
+        assert db.query(UserAnswer).count() == 2 * args.answers
+    finally:
+        db.close()
+
+    print(f"answers:      {args.answers} from {args.students} students, {args.concurrency} in flight")
+    print(f"synchronous:  {synchronous:.2f}s ({args.answers / synchronous:.0f} answers/s)")
+    print(f"write-behind: {journaled:.2f}s ({args.answers / journaled:.0f} answers/s, "
+          f"{synchronous / journaled:.1f}x, flush every {args.flush_interval_ms} ms)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--answers", type=int, default=2000, help="Answers submitted per mode")
+    parser.add_argument("--students", type=int, default=50, help="Students submitting")
+    parser.add_argument("--questions", type=int, default=50, help="Distinct questions answered")
+    parser.add_argument("--concurrency", type=int, default=50, help="Requests in flight")
+    parser.add_argument("--flush-interval-ms", type=int, default=50, help="Journal group commit interval")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'answer_write_behind.db')}"
+        asyncio.run(run(args, os.path.join(tmp, "journal")))
+
+if __name__ == "__main__":
+    main()
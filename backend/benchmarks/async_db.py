@@ -0,0 +1,109 @@
+"""
+Async DB path benchmark.
+
+Fires concurrent GET /auth/users/me requests at the app in-process with the
+identity cache disabled, so every request looks the user up in the database,
+while a probe repeatedly calls GET /. Compare the async session path (default)
+with the previous mixed mode, where the `async def` dependency ran the query
+on the synchronous Session and blocked the event loop:
+
+    python benchmarks/async_db.py --requests 2000 --concurrency 100
+    python benchmarks/async_db.py --requests 2000 --concurrency 100 --mixed
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+async def run(args):
+    import httpx
+    from fastapi import Depends, HTTPException
+    from jose import jwt
+    from sqlalchemy.orm import Session
+    from main import app
+    from database import SessionLocal, get_db
+    from models import User
+    from routers import auth
+
+    # Every request misses the identity cache and hits the database
+    auth.user_cache.ttl_seconds = 0
+
+    if args.mixed:
+        async def mixed_get_current_user(token: str = Depends(auth.oauth2_scheme), db: Session = Depends(get_db)):
+            payload = jwt.decode(token, auth.SECRET_KEY, algorithms=[auth.ALGORITHM])
+            user = db.query(User).filter(User.username == payload.get("sub")).first()
+            # Release the connection immediately; holding it until the response
+            # deadlocks the loop once concurrency exceeds the sync pool size
+            db.close()
+            if user is None:
+                raise HTTPException(status_code=401, detail="Could not validate credentials")
+            return auth.CurrentUser.model_validate(user)
+
+        app.dependency_overrides[auth.get_current_user] = mixed_get_current_user
+
+    db = SessionLocal()
+    try:
+        db.add(User(username="benchuser", email="bench@example.com",
+                    hashed_password=auth.get_password_hash("password123"),
+                    full_name="Bench User", role="student"))
+        db.commit()
+    finally:
+        db.close()
+    headers = {"Authorization": f"Bearer {auth.create_access_token({'sub': 'benchuser'})}"}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        semaphore = asyncio.Semaphore(args.concurrency)
+        done = asyncio.Event()
+        probe_latencies = []
+
+        async def request():
+            async with semaphore:
+                response = await client.get("/auth/users/me", headers=headers)
+                assert response.status_code == 200, response.text
+
+        async def probe():
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get("/")
+                probe_latencies.append((time.perf_counter() - started) * 1000)
+                await asyncio.sleep(0.005)
+
+        probe_task = asyncio.create_task(probe())
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*(request() for _ in range(args.requests)))
+        finally:
+            elapsed = time.perf_counter() - started
+            done.set()
+            await probe_task
+
+    print(f"mode:             {'mixed (sync session)' if args.mixed else 'async session'}")
+    print(f"requests:         {args.requests} in {elapsed:.2f}s ({args.requests / elapsed:.1f}/s)")
+    print(f"probe requests:   {len(probe_latencies)}")
+    if probe_latencies:
+        print(f"probe p50 / p99:  {statistics.median(probe_latencies):.1f} ms / {percentile(probe_latencies, 99):.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="Number of authenticated requests")
+    parser.add_argument("--concurrency", type=int, default=100, help="Concurrent requests")
+    parser.add_argument("--mixed", action="store_true", help="Resolve the user with the sync Session on the event loop")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'async_db.db')}"
+        asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
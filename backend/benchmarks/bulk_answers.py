@@ -0,0 +1,116 @@
+"""
+Bulk answer submission benchmark.
+
+Replays an offline queue of answers against the app in-process, first as
+sequential POST /api/practice/questions/{id}/answer calls (what tablets did
+on reconnect) and then through POST /api/practice/answers/bulk in batches,
+each run for a fresh student:
+
+    python benchmarks/bulk_answers.py --answers 2000 --batch 100
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+async def run(args):
+    import httpx
+    from main import app
+    from database import SessionLocal, async_engine
+    from models import Class, Course, Lesson, Question, Unit, User
+    from routers import auth
+
+    rng = random.Random(42)
+    db = SessionLocal()
+    try:
+        teacher = User(username="benchteacher", email="teacher@example.com", hashed_password="x",
+                       full_name="Bench Teacher", role="teacher")
+        db.add(teacher)
+        db.flush()
+        class_obj = Class(name="Bench", subject="Mathematics", teacher_id=teacher.id)
+        db.add(class_obj)
+        db.flush()
+        course = Course(name="Bench", subject="Mathematics", class_id=class_obj.id)
+        db.add(course)
+        db.flush()
+        unit = Unit(name="Bench", course_id=course.id)
+        db.add(unit)
+        db.flush()
+        lesson = Lesson(title="Bench", unit_id=unit.id)
+        db.add(lesson)
+        db.flush()
+        questions = [
+            Question(lesson_id=lesson.id, question_text=f"{i} + {i}?", question_type="short_answer",
+                     correct_answer=str(2 * i), difficulty=rng.choice(["easy", "medium", "hard"]),
+                     subject="Mathematics")
+            for i in range(args.questions)
+        ]
+        db.add_all(questions)
+        for name in ("sequential", "bulk"):
+            db.add(User(username=name, email=f"{name}@example.com", hashed_password="x",
+                        full_name=name, role="student", class_id=class_obj.id))
+        db.commit()
+        question_ids = [q.id for q in questions]
+        answers_by_id = {q.id: q.correct_answer for q in questions}
+    finally:
+        db.close()
+
+    queue = []
+    for _ in range(args.answers):
+        question_id = rng.choice(question_ids)
+        correct = rng.random() < 0.7
+        queue.append({
+            "question_id": question_id,
+            "answer": answers_by_id[question_id] if correct else "wrong",
+            "time_taken": rng.uniform(5, 120)
+        })
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        headers = {"Authorization": f"Bearer {auth.create_access_token({'sub': 'sequential'})}"}
+        started = time.perf_counter()
+        for item in queue:
+            response = await client.post(
+                f"/api/practice/questions/{item['question_id']}/answer",
+                json={"answer": item["answer"], "time_taken": item["time_taken"]},
+                headers=headers
+            )
+            assert response.status_code == 200, response.text
+        sequential = time.perf_counter() - started
+
+        headers = {"Authorization": f"Bearer {auth.create_access_token({'sub': 'bulk'})}"}
+        started = time.perf_counter()
+        for offset in range(0, len(queue), args.batch):
+            response = await client.post(
+                "/api/practice/answers/bulk",
+                json={"answers": queue[offset:offset + args.batch]},
+                headers=headers
+            )
+            assert response.status_code == 200, response.text
+        bulk = time.perf_counter() - started
+    # Close pooled aiosqlite connections, whose worker threads would keep the process alive
+    await async_engine.dispose()
+
+    print(f"answers:     {args.answers} over {args.questions} questions")
+    print(f"sequential:  {sequential:.2f}s ({args.answers / sequential:.0f} answers/s)")
+    print(f"bulk ({args.batch}): {bulk:.2f}s ({args.answers / bulk:.0f} answers/s, {sequential / bulk:.1f}x)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--answers", type=int, default=2000, help="Answers in the offline queue")
+    parser.add_argument("--questions", type=int, default=50, help="Distinct questions answered")
+    parser.add_argument("--batch", type=int, default=100, help="Answers per bulk request")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'bulk_answers.db')}"
+        asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Login burst benchmark.
+
+Fires a burst of concurrent POST /auth/token requests at the app in-process
+while a probe repeatedly calls GET /, and reports login throughput and
+probe latency. Run it with the hashing pool (default) and with `--inline` to
+compare against verifying passwords on the event loop:
+
+    python benchmarks/login_burst.py --logins 200 --concurrency 50
+    python benchmarks/login_burst.py --logins 200 --concurrency 50 --inline
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+async def run(args):
+    import httpx
+    from main import app
+    from database import SessionLocal
+    from models import User
+    from password_hashing import PasswordHasherPool
+    from routers import auth
+
+    if args.inline:
+        auth.password_pool = PasswordHasherPool(max_workers=0)
+    else:
+        auth.password_pool = PasswordHasherPool(max_workers=args.workers, max_queue=args.logins)
+
+    db = SessionLocal()
+    try:
+        db.add(User(username="burstuser", email="burst@example.com",
+                    hashed_password=auth.get_password_hash("password123"),
+                    full_name="Burst User", role="student"))
+        db.commit()
+    finally:
+        db.close()
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        semaphore = asyncio.Semaphore(args.concurrency)
+        done = asyncio.Event()
+        probe_latencies = []
+
+        async def login():
+            async with semaphore:
+                response = await client.post("/auth/token", data={"username": "burstuser", "password": "password123"})
+                assert response.status_code == 200, response.text
+
+        async def probe():
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get("/")
+                probe_latencies.append((time.perf_counter() - started) * 1000)
+                await asyncio.sleep(0.005)
+
+        probe_task = asyncio.create_task(probe())
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*(login() for _ in range(args.logins)))
+        finally:
+            elapsed = time.perf_counter() - started
+            done.set()
+            await probe_task
+
+    mode = "inline" if args.inline else f"pool ({args.workers} workers)"
+    print(f"mode:             {mode}")
+    print(f"logins:           {args.logins} in {elapsed:.2f}s ({args.logins / elapsed:.1f}/s)")
+    print(f"probe requests:   {len(probe_latencies)}")
+    if probe_latencies:
+        print(f"probe p50 / p99:  {statistics.median(probe_latencies):.1f} ms / {percentile(probe_latencies, 99):.1f} ms")
+        print(f"probe max:        {max(probe_latencies):.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=200, help="Number of logins in the burst")
+    parser.add_argument("--concurrency", type=int, default=50, help="Concurrent login requests")
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1), help="Hashing pool size")
+    parser.add_argument("--inline", action="store_true", help="Verify passwords on the event loop")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'login_burst.db')}"
+        asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Next-question selection benchmark.
+
+Times picks from one lesson's question pool with the mastery selector (the
+previous get_next_question logic) and the Elo selector, for a student who
+has answered part of the pool, and pops from a precomputed practice queue
+of mastery picks:
+
+    python benchmarks/question_selection.py --questions 50000 --answered 5000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def run(args):
+    from sqlalchemy import insert
+    from database import Base, SessionLocal, engine
+    from models import Class, Course, Lesson, Question, QuestionMastery, Unit, User
+    import adaptive
+    import practice_queues
+
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(42)
+    db = SessionLocal()
+    try:
+        teacher = User(username="benchteacher", email="teacher@example.com", hashed_password="x",
+                       full_name="Bench Teacher", role="teacher")
+        db.add(teacher)
+        db.flush()
+        class_obj = Class(name="Bench", subject="Mathematics", teacher_id=teacher.id)
+        db.add(class_obj)
+        db.flush()
+        course = Course(name="Bench", subject="Mathematics", class_id=class_obj.id)
+        db.add(course)
+        db.flush()
+        unit = Unit(name="Bench", course_id=course.id)
+        db.add(unit)
+        db.flush()
+        lesson = Lesson(title="Bench", unit_id=unit.id)
+        db.add(lesson)
+        student = User(username="student", email="student@example.com", hashed_password="x",
+                       full_name="Student", role="student", class_id=class_obj.id)
+        db.add(student)
+        db.flush()
+        db.execute(insert(Question), [
+            {"lesson_id": lesson.id, "question_text": f"{i} + {i}?", "question_type": "short_answer",
+             "correct_answer": str(2 * i), "difficulty": rng.choice(["easy", "medium", "hard"]),
+             "subject": "Mathematics"}
+            for i in range(args.questions)
+        ])
+        questions = db.query(Question).filter(Question.lesson_id == lesson.id).all()
+        answered = rng.sample(questions, args.answered)
+        db.execute(insert(QuestionMastery), [
+            {"user_id": student.id, "question_id": q.id, "score": rng.choice([20, 40, 60, 80, 100]), "attempts": 1}
+            for q in answered
+        ])
+        db.commit()
+        lesson_id, student_id = lesson.id, student.id
+
+        elo = adaptive.EloSelector(rng=rng)
+        for question in answered:
+            elo.record_answer(db, student_id, question, rng.random() < 0.7, rng.uniform(5, 120), rng.choice([0, 0, 1]))
+
+        results = {}
+        for name, selector in (("mastery", adaptive.MasterySelector()), ("elo", elo)):
+            selector.select(db, student_id, lesson_id=lesson_id)  # Warm the question bank and scope
+            picks = args.picks if name == "elo" else max(1, args.picks // 1000)
+            started = time.perf_counter()
+            for _ in range(picks):
+                selector.select(db, student_id, lesson_id=lesson_id)
+            results[name] = (time.perf_counter() - started) / picks
+
+        # A refill runs the mastery selection in the background after an answer; requests only pop
+        queues = practice_queues.PracticeQueues(size=args.queue_size)
+        scope = ("lesson", lesson_id)
+        configured = adaptive.question_selector
+        adaptive.question_selector = adaptive.MasterySelector()
+        try:
+            started = time.perf_counter()
+            queues.fill(db, student_id, scope)
+            refill = time.perf_counter() - started
+            pops = 0
+            started = time.perf_counter()
+            while queues.pop(student_id, scope) is not None:
+                pops += 1
+            results["queue"] = (time.perf_counter() - started) / pops
+        finally:
+            adaptive.question_selector = configured
+
+        started = time.perf_counter()
+        for question in answered[:args.picks]:
+            elo.record_answer(db, student_id, question, True, 30, 0)
+        record = (time.perf_counter() - started) / min(args.picks, len(answered))
+    finally:
+        db.close()
+
+    print(f"pool:     {args.questions} questions, {args.answered} answered")
+    print(f"mastery:  {results['mastery'] * 1e6:.0f} us per pick")
+    print(f"elo:      {results['elo'] * 1e6:.1f} us per pick ({results['mastery'] / results['elo']:.0f}x)")
+    print(f"elo update: {record * 1e6:.1f} us per answer")
+    print(f"queue:    {results['queue'] * 1e6:.1f} us per pop, {refill * 1e3:.0f} ms per background refill "
+          f"of {args.queue_size}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=50000, help="Questions in the lesson")
+    parser.add_argument("--answered", type=int, default=5000, help="Questions the student has answered")
+    parser.add_argument("--picks", type=int, default=20000, help="Elo picks timed (mastery times 1/1000 as many)")
+    parser.add_argument("--queue-size", type=int, default=5, help="Questions per precomputed practice queue")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tmp, 'question_selection.db')}"
+        run(args)
+
+if __name__ == "__main__":
+    main()
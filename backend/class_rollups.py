@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Per-class rollups behind the teacher dashboard.
+
+Each class has one `class_rollups` row holding its dashboard metrics.
+submit_answer keeps the answer count and mastery sum current with an atomic
+UPDATE; everything else (students, activity, completion, top students) is
+recomputed for all stale classes with a fixed number of grouped queries.
+The dashboard reads one row per class:
+
+- rows that are missing or were last refreshed on a previous day are
+  recomputed before responding, since "active today" would be wrong;
+- rows older than DASHBOARD_ROLLUP_TTL_SECONDS are served as they are and
+  refreshed in a background task.
+
+Run this module (e.g. from cron) to refresh every class:
+
+    python class_rollups.py
+"""
+
+import sys
+import os
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.dirname(__file__))
+
+import json
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from fastapi import BackgroundTasks
+from sqlalchemy import desc, distinct, func, select, update
+from sqlalchemy.orm import Session, sessionmaker
+from database import engine, naive_utc
+from models import Class, ClassRollup, DailyActiveUser, Mastery, Progress, User, UserAnswer
+import daily_activity  # Registers the listener that fills daily_active_users
+
+DASHBOARD_ROLLUP_TTL_SECONDS = float(os.getenv("DASHBOARD_ROLLUP_TTL_SECONDS", "300"))
+TOP_STUDENTS = 5
+
+def _grouped(db: Session, query) -> Dict[int, tuple]:
+    return {row[0]: tuple(row[1:]) for row in query.group_by(User.class_id).all()}
+
+def refresh_class_rollups(db: Session, class_ids: List[int], now: Optional[datetime] = None) -> Dict[int, ClassRollup]:
+    """Recompute the rollups for the given classes and commit them."""
+    if not class_ids:
+        return {}
+    now = now or datetime.utcnow()
+    today = now.date()
+    in_classes = User.class_id.in_(class_ids)
+
+    students = _grouped(db, db.query(User.class_id, func.count(User.id)).filter(in_classes))
+    active = _grouped(db, db.query(User.class_id, func.count(DailyActiveUser.user_id))
+                      .join(DailyActiveUser, DailyActiveUser.user_id == User.id)
+                      .filter(in_classes, DailyActiveUser.day == today))
+    mastery = _grouped(db, db.query(User.class_id, func.sum(Mastery.score), func.count(Mastery.id))
+                       .join(Mastery, Mastery.user_id == User.id)
+                       .filter(in_classes))
+    answers = _grouped(db, db.query(User.class_id, func.count(UserAnswer.id))
+                       .join(UserAnswer, UserAnswer.user_id == User.id)
+                       .filter(in_classes))
+    completed = _grouped(db, db.query(User.class_id, func.count(distinct(Progress.user_id)))
+                         .join(Progress, Progress.user_id == User.id)
+                         .filter(in_classes, Progress.status == "completed"))
+
+    # Top students per class in one query, ranked within each class
+    student_avg = (
+        select(
+            User.class_id,
+            User.id,
+            User.full_name,
+            func.avg(Mastery.score).label("avg_mastery")
+        )
+        .join(Mastery, Mastery.user_id == User.id)
+        .where(in_classes)
+        .group_by(User.class_id, User.id, User.full_name)
+        .subquery()
+    )
+    ranked = select(
+        student_avg,
+        func.row_number().over(
+            partition_by=student_avg.c.class_id,
+            order_by=(desc(student_avg.c.avg_mastery), student_avg.c.id)
+        ).label("rank")
+    ).subquery()
+    top: Dict[int, List[Dict]] = {class_id: [] for class_id in class_ids}
+    for row in db.execute(select(ranked).where(ranked.c.rank <= TOP_STUDENTS).order_by(ranked.c.class_id, ranked.c.rank)):
+        top[row.class_id].append({"id": row.id, "name": row.full_name, "average_mastery": round(row.avg_mastery, 1)})
+
+    existing = {r.class_id: r for r in db.query(ClassRollup).filter(ClassRollup.class_id.in_(class_ids))}
+    for class_id in class_ids:
+        rollup = existing.get(class_id)
+        if rollup is None:
+            rollup = ClassRollup(class_id=class_id)
+            db.add(rollup)
+            existing[class_id] = rollup
+        mastery_sum, mastery_count = mastery.get(class_id, (0.0, 0))
+        rollup.total_students = students.get(class_id, (0,))[0]
+        rollup.active_students_today = active.get(class_id, (0,))[0]
+        rollup.mastery_sum = mastery_sum or 0.0
+        rollup.mastery_count = mastery_count
+        rollup.total_questions_attempted = answers.get(class_id, (0,))[0]
+        rollup.completed_students = completed.get(class_id, (0,))[0]
+        rollup.top_students = json.dumps(top[class_id])
+        rollup.refreshed_at = now
+    db.commit()
+    return existing
+
+def record_answer(db: Session, class_id: Optional[int], mastery_delta: float, mastery_added: int, answers: int = 1):
+    """Apply submitted answers to their class rollup as part of the caller's transaction.
+
+    `mastery_delta` is the total change in mastery scores and `mastery_added`
+    the number of mastery rows created by the `answers` answers.
+    """
+    if class_id is None:
+        return
+    db.execute(
+        update(ClassRollup)
+        .where(ClassRollup.class_id == class_id)
+        .values(
+            total_questions_attempted=ClassRollup.total_questions_attempted + answers,
+            mastery_sum=ClassRollup.mastery_sum + mastery_delta,
+            mastery_count=ClassRollup.mastery_count + int(mastery_added)
+        )
+    )
+
+def _refresh_in_background(bind, class_ids: List[int]):
+    db = sessionmaker(autocommit=False, autoflush=False, bind=bind)()
+    try:
+        refresh_class_rollups(db, class_ids)
+    finally:
+        db.close()
+
+def load_class_rollups(db: Session, class_ids: List[int], background_tasks: Optional[BackgroundTasks] = None) -> List[ClassRollup]:
+    """Return the rollups for the given classes, refreshing missing or stale ones."""
+    now = datetime.utcnow()
+    rollups = {r.class_id: r for r in db.query(ClassRollup).filter(ClassRollup.class_id.in_(class_ids))}
+
+    outdated = [c for c in class_ids if c not in rollups or naive_utc(rollups[c].refreshed_at).date() != now.date()]
+    if outdated:
+        rollups.update(refresh_class_rollups(db, outdated, now))
+
+    stale_before = now - timedelta(seconds=DASHBOARD_ROLLUP_TTL_SECONDS)
+    stale = [c for c in class_ids if naive_utc(rollups[c].refreshed_at) < stale_before]
+    if stale and background_tasks is not None:
+        background_tasks.add_task(_refresh_in_background, db.get_bind(), stale)
+
+    return [rollups[c] for c in class_ids]
+
+def main():
+    """Refresh the rollups of every class."""
+    print("Refreshing class rollups...")
+
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = SessionLocal()
+
+    try:
+        class_ids = [c.id for c in db.query(Class.id).all()]
+        refresh_class_rollups(db, class_ids)
+        print(f"Refreshed {len(class_ids)} class rollups")
+    except Exception as e:
+        print(f"Error refreshing class rollups: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Contention-safe counter updates.
+
+Scores and points are updated with SQL expressions (`score = score + 5`)
+rather than read into Python and written back, so concurrent submissions for
+the same student cannot overwrite each other. Rows are created with an
+insert that ignores unique-constraint conflicts, so a race on the first
+answer cannot produce duplicates either.
+"""
+
+from dataclasses import dataclass
+
+from sqlalchemy import case, insert, select
+
+@dataclass(frozen=True)
+class ClampedChange:
+    """x -> min(high, max(low, x + add)): one or more clamped additions folded together.
+
+    Adding a delta and clamping to a range, repeated any number of times,
+    always reduces to a single addition followed by a single clamp, so a
+    whole batch of answers to one topic becomes one UPDATE.
+    """
+    add: float = 0
+    low: float = float("-inf")
+    high: float = float("inf")
+
+    def then(self, delta: float, low: float, high: float) -> "ClampedChange":
+        """Return the change that applies this one, then adds `delta` and clamps to [low, high]."""
+        clamp = lambda value: min(high, max(low, value))
+        return ClampedChange(
+            add=self.add + delta,
+            low=clamp(self.low + delta),
+            high=clamp(self.high + delta)
+        )
+
+    def apply(self, value: float) -> float:
+        """Apply the change to a Python value."""
+        return min(self.high, max(self.low, value + self.add))
+
+    def expression(self, column):
+        """Return the SQL expression applying the change to `column`."""
+        value = column + self.add
+        return case((value < self.low, self.low), (value > self.high, self.high), else_=value)
+
+def insert_ignore(connection, table, values: dict, conflict_columns) -> bool:
+    """Insert a row unless one with the same `conflict_columns` exists; return True if inserted.
+
+    `connection` may be a Connection or a Session. PostgreSQL and SQLite use
+    ON CONFLICT DO NOTHING; other databases fall back to check-then-insert.
+    """
+    bind = connection.get_bind() if hasattr(connection, "get_bind") else connection
+    dialect = bind.dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        key = [table.c[name] == values[name] for name in conflict_columns]
+        if connection.execute(select(table.c[conflict_columns[0]]).where(*key)).first() is not None:
+            return False
+        connection.execute(insert(table).values(**values))
+        return True
+    result = connection.execute(
+        dialect_insert(table).values(**values).on_conflict_do_nothing(index_elements=list(conflict_columns))
+    )
+    return result.rowcount == 1
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Daily active users.
+
+Counting "students active today" from the sessions table means a distinct
+count over every session row in the day. Instead, each session insert records
+(user, UTC day) in `daily_active_users`, at most once per pair, so the count
+is a lookup on the (day, user_id) unique index.
+
+Sessions written with bulk inserts or before the table existed are picked up
+by rebuilding the table from history:
+
+    python daily_activity.py
+"""
+
+import sys
+import os
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Tuple
+
+from sqlalchemy import cast, Date, distinct, event, func, insert, select
+from sqlalchemy.orm import Session, sessionmaker
+from database import engine
+from models import DailyActiveUser, Session as UserSession
+from counters import insert_ignore
+
+def utc_day(moment: datetime) -> date:
+    """Return the UTC calendar day of a timestamp (naive timestamps are UTC)."""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc)
+    return moment.date()
+
+def day_range(day: date) -> Tuple[datetime, datetime]:
+    """Return the [start, end) timestamps of a UTC day, for index-friendly range filters."""
+    start = datetime.combine(day, time.min)
+    return start, start + timedelta(days=1)
+
+@event.listens_for(UserSession, "after_insert")
+def _record_daily_activity(mapper, connection, target):
+    if target.start_time is not None:
+        insert_ignore(connection, DailyActiveUser.__table__,
+                      {"user_id": target.user_id, "day": utc_day(target.start_time)}, ("day", "user_id"))
+
+def count_active_users(db: Session, day: date, users) -> int:
+    """Count users in the `users` subquery with at least one session on `day`."""
+    return db.query(func.count(DailyActiveUser.user_id)).filter(
+        DailyActiveUser.user_id.in_(users),
+        DailyActiveUser.day == day
+    ).scalar()
+
+def count_active_from_sessions(db: Session, day: date, users) -> int:
+    """Count distinct users in `users` with a session on `day`, straight from the sessions table."""
+    start, end = day_range(day)
+    return db.query(func.count(distinct(UserSession.user_id))).filter(
+        UserSession.user_id.in_(users),
+        UserSession.start_time >= start,
+        UserSession.start_time < end
+    ).scalar()
+
+def rebuild_daily_active_users(db: Session) -> int:
+    """Rebuild the table from the full session history and return its row count."""
+    # SQLite stores timestamps as text, so CAST(... AS DATE) would not truncate them
+    if db.get_bind().dialect.name == "sqlite":
+        session_day = func.date(UserSession.start_time)
+    else:
+        session_day = cast(UserSession.start_time, Date)
+
+    db.query(DailyActiveUser).delete()
+    db.execute(
+        insert(DailyActiveUser).from_select(
+            ["user_id", "day"],
+            select(UserSession.user_id, session_day).distinct()
+        )
+    )
+    db.commit()
+    return db.query(func.count(DailyActiveUser.id)).scalar()
+
+def main():
+    """Rebuild daily active users from session history."""
+    print("Rebuilding daily active users from sessions...")
+
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = SessionLocal()
+
+    try:
+        rows = rebuild_daily_active_users(db)
+        print(f"Wrote {rows} daily active user rows")
+    except Exception as e:
+        print(f"Error rebuilding daily active users: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
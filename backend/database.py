@@ -1,4 +1,6 @@
+from datetime import datetime, timezone
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
@@ -16,8 +18,36 @@ engine = create_engine(
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def make_async_url(url: str) -> str:
+    """Map a sync database URL to its async driver (aiosqlite / asyncpg)."""
+    scheme, sep, rest = url.partition("://")
+    dialect = scheme.split("+")[0]
+    if dialect == "sqlite":
+        return f"sqlite+aiosqlite{sep}{rest}"
+    if dialect in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg{sep}{rest}"
+    return url
+
+# Async engine for `async def` endpoints, so queries never block the event loop
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", make_async_url(DATABASE_URL))
+
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_pre_ping=True,
+    pool_recycle=300,
+    echo=False
+)
+
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
 Base = declarative_base()
 
+def naive_utc(value: datetime) -> datetime:
+    """Return a stored time as naive UTC; PostgreSQL hands timestamptz columns back as aware."""
+    if value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
 def get_db():
     """Dependency to get DB session."""
     db = SessionLocal()
@@ -25,3 +55,8 @@ def get_db():
         yield db
     finally:
         db.close()
+
+async def get_async_db():
+    """Dependency to get an async DB session."""
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -17,6 +17,7 @@ from models import (
     User, Class, Course, Unit, Lesson, Material, Question,
     UserAnswer, Mastery, Gamification, Session, Progress, Intervention
 )
+import daily_activity  # Record daily active users for the generated sessions
 from passlib.context import CryptContext
 import random
 from datetime import datetime, timedelta
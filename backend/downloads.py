@@ -0,0 +1,81 @@
+"""
+Cacheable material downloads.
+
+Material files never change once uploaded, so downloads carry a strong ETag
+derived from the content hash (or, for files stored before content hashing,
+a weak one derived from size and modification time, like Starlette's) and a
+Cache-Control policy chosen by content type. Conditional requests (`If-None-Match`, `If-Modified-Since`) are answered
+with 304 Not Modified, and byte ranges (`Range`, `If-Range`) are served as
+206 Partial Content by Starlette's FileResponse.
+"""
+
+import os
+from datetime import datetime, timezone
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse
+
+from models import Material
+
+# Cache-Control per material content type. Responses are private because
+# downloads require authorization; types not listed are revalidated each time.
+CACHE_CONTROL = {
+    "video": "private, max-age=604800, immutable",
+    "pdf": "private, max-age=86400",
+    "slide": "private, max-age=86400",
+}
+DEFAULT_CACHE_CONTROL = "private, no-cache"
+
+def cache_control(content_type: str) -> str:
+    """Return the Cache-Control policy for a material content type."""
+    return CACHE_CONTROL.get(content_type, DEFAULT_CACHE_CONTROL)
+
+def _opaque_tag(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match uses weak comparison, so W/ prefixes are ignored
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or _opaque_tag(etag) in [_opaque_tag(tag) for tag in tags]
+
+def material_etag(material: Material, stat_result: os.stat_result) -> str:
+    """Return the material's ETag: its content hash, or a weak size/mtime tag for unhashed files."""
+    if material.content_hash:
+        return f'"{material.content_hash}"'
+    return f'W/"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+def is_not_modified(request: Request, etag: str, last_modified: float) -> bool:
+    """Return True if the client's cached copy is still current."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # If-Modified-Since is ignored when If-None-Match is present
+        return _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            # HTTP dates are always GMT, including the asctime and "-0000" forms
+            since = since.replace(tzinfo=timezone.utc)
+        # Last-Modified is sent in whole seconds
+        return datetime.fromtimestamp(int(last_modified), timezone.utc) <= since
+    return False
+
+def material_file_response(request: Request, material: Material) -> Response:
+    """Serve a material file with validators, caching policy and range support."""
+    stat_result = os.stat(material.file_path)
+    etag = material_etag(material, stat_result)
+    headers = {
+        "cache-control": cache_control(material.content_type),
+        "last-modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "etag": etag,
+    }
+
+    if is_not_modified(request, etag, stat_result.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    return FileResponse(material.file_path, filename=material.name, headers=headers, stat_result=stat_result)
@@ -0,0 +1,93 @@
+"""
+Streaming NDJSON and CSV export for large listings.
+
+Listing endpoints that support export check the request's Accept header with
+export_format(); when it asks for `application/x-ndjson` or `text/csv`, rows
+are read from a server-side cursor with `yield_per` and written to the client
+one at a time, so memory stays flat regardless of roster size.
+"""
+
+import csv
+import io
+import json
+from typing import Callable, Iterable, Iterator, List, Optional, Type
+
+from fastapi import HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy.orm import Query as ORMQuery
+
+from pagination import PageParams, decode_cursor
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+CSV_MEDIA_TYPE = "text/csv"
+EXPORT_BATCH_SIZE = 500
+
+# OpenAPI content entries for endpoints that support export
+EXPORT_RESPONSES = {
+    "content": {
+        NDJSON_MEDIA_TYPE: {"schema": {"type": "string"}},
+        CSV_MEDIA_TYPE: {"schema": {"type": "string"}}
+    }
+}
+
+def export_format(request: Request) -> Optional[str]:
+    """Return the requested export media type, or None for a regular JSON response."""
+    accept = request.headers.get("accept", "")
+    media_types = [part.split(";")[0].strip().lower() for part in accept.split(",")]
+    for media_type in media_types:
+        if media_type in (NDJSON_MEDIA_TYPE, CSV_MEDIA_TYPE):
+            return media_type
+    return None
+
+def export_rows(query: ORMQuery, page: PageParams, id_column) -> Iterable:
+    """Iterate every row after the optional cursor through a server-side cursor."""
+    if page.after:
+        query = query.filter(id_column > decode_cursor(page.after))
+    return query.order_by(id_column).yield_per(EXPORT_BATCH_SIZE)
+
+def _ndjson_lines(items: Iterable[BaseModel], include: Optional[set]) -> Iterator[str]:
+    for item in items:
+        yield json.dumps(jsonable_encoder(item, include=include)) + "\n"
+
+def _csv_lines(items: Iterable[BaseModel], columns: List[str]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush() -> str:
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return line
+
+    writer.writerow(columns)
+    yield flush()
+    for item in items:
+        data = jsonable_encoder(item)
+        writer.writerow(["" if data[c] is None else data[c] for c in columns])
+        yield flush()
+
+def stream_export(
+    media_type: str,
+    rows: Iterable,
+    to_item: Callable[..., BaseModel],
+    schema: Type[BaseModel],
+    fields: Optional[List[str]] = None,
+    filename: str = "export"
+) -> StreamingResponse:
+    """Stream rows as NDJSON or CSV, converting each with to_item."""
+    if fields:
+        unknown = [f for f in fields if f not in schema.model_fields]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    columns = fields or list(schema.model_fields)
+
+    items = (to_item(row) for row in rows)
+    if media_type == CSV_MEDIA_TYPE:
+        body = _csv_lines(items, columns)
+        headers = {"Content-Disposition": f'attachment; filename="{filename}.csv"'}
+    else:
+        body = _ndjson_lines(items, set(columns))
+        headers = None
+    return StreamingResponse(body, media_type=media_type, headers=headers)
@@ -0,0 +1,325 @@
+"""
+Content-addressed storage for uploaded material files.
+
+Uploads are copied to disk in fixed-size chunks while their SHA-256 is
+computed, so memory per upload stays at UPLOAD_CHUNK_SIZE regardless of file
+size. Data is staged in a hidden temp file inside the upload directory and
+then atomically renamed to `blobs/<hash[:2]>/<hash>`; an upload that fails or
+exceeds its size cap never leaves a partial file behind.
+
+Identical uploads share one blob. Each `Blob` row counts the materials that
+point at it. Files only move while the transaction that changes their row
+holds its lock: an upload takes its reference first and renames its staged
+file into place after the commit (a rollback just deletes the staged file),
+and dropping the last reference moves the blob file aside before the commit,
+deleting it after the commit or moving it back on rollback. An upload of the
+same file waits on the row until the release is over, so it never loses its
+file to it.
+
+Size caps are per material content type. `MAX_FILE_SIZE` is the default cap
+and `MAX_FILE_SIZE_<TYPE>` (e.g. `MAX_FILE_SIZE_VIDEO`) overrides it for one
+type. The content type is chosen by the client, so a cap above the default
+only applies when the file starts with a signature of that type; anything
+else labelled as video is held to `MAX_FILE_SIZE`.
+
+Existing installations are migrated with:
+
+    python file_storage.py --upload-dir uploads
+
+which hashes every material file, moves it into the blob store (dropping
+duplicates), rewrites Material rows, rebuilds reference counts and removes
+blob files nothing refers to.
+"""
+
+import argparse
+import hashlib
+import os
+import tempfile
+import uuid
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+import aiofiles
+from fastapi import HTTPException, UploadFile
+from sqlalchemy import delete, event, func, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from models import Blob, Material
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_FILE_SIZE = int(os.getenv("MAX_FILE_SIZE", str(100 * 1024 * 1024)))
+BLOB_DIR = "blobs"
+
+# Default caps for content types that are routinely larger than MAX_FILE_SIZE
+DEFAULT_SIZE_LIMITS = {
+    "video": 2 * 1024 * 1024 * 1024,
+}
+
+# Leading bytes (offset, magic) of the file formats accepted as each content type
+CONTENT_SIGNATURES = {
+    "video": [
+        (4, b"ftyp"),  # MP4, MOV
+        (0, b"\x1aE\xdf\xa3"),  # WebM, Matroska
+        (8, b"AVI "),
+        (0, b"OggS"),
+        (0, b"\x00\x00\x01\xba"),  # MPEG program stream
+        (0, b"FLV"),
+    ],
+    "pdf": [(0, b"%PDF-")],
+    "slide": [(0, b"PK\x03\x04"), (0, b"\xd0\xcf\x11\xe0"), (0, b"%PDF-")],
+    "document": [(0, b"PK\x03\x04"), (0, b"\xd0\xcf\x11\xe0"), (0, b"%PDF-")],
+}
+
+@dataclass(frozen=True)
+class StoredFile:
+    """An upload staged in the upload directory, not yet part of the blob store."""
+    path: str
+    size: int
+    content_hash: str
+
+def size_limit(content_type: str) -> int:
+    """Return the maximum upload size in bytes for a material content type."""
+    override = os.getenv(f"MAX_FILE_SIZE_{content_type.upper()}")
+    if override:
+        return int(override)
+    return DEFAULT_SIZE_LIMITS.get(content_type, MAX_FILE_SIZE)
+
+def matches_content_type(content_type: str, head: bytes) -> bool:
+    """Return True if a file starting with `head` has a signature of the content type."""
+    return any(
+        head[offset:offset + len(magic)] == magic
+        for offset, magic in CONTENT_SIGNATURES.get(content_type, [])
+    )
+
+def upload_limit(content_type: str, head: bytes) -> int:
+    """Return the size cap for an upload of the content type starting with `head`.
+
+    A cap above MAX_FILE_SIZE only applies when the file matches the type.
+    """
+    limit = size_limit(content_type)
+    if limit > MAX_FILE_SIZE and not matches_content_type(content_type, head):
+        return MAX_FILE_SIZE
+    return limit
+
+def blob_path(directory: str, content_hash: str) -> str:
+    """Return the storage path for a blob."""
+    return os.path.join(directory, BLOB_DIR, content_hash[:2], content_hash)
+
+def _too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"File exceeds the {max_bytes} byte limit for this content type")
+
+def _remove(path: Optional[str]):
+    if path and os.path.exists(path):
+        os.remove(path)
+
+async def stage_upload(file: UploadFile, directory: str, content_type: str) -> StoredFile:
+    """Stream an upload into a temp file in `directory`, hashing as it goes.
+
+    The size cap comes from upload_limit, checked against the first chunk.
+    """
+    chunk = await file.read(UPLOAD_CHUNK_SIZE)
+    max_bytes = upload_limit(content_type, chunk)
+    if file.size is not None and file.size > max_bytes:
+        raise _too_large(max_bytes)
+
+    # Temp file in the target directory so the final rename stays on one filesystem
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".upload-", suffix=".part")
+    os.close(fd)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with aiofiles.open(temp_path, "wb") as out:
+            while chunk:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise _too_large(max_bytes)
+                digest.update(chunk)
+                await out.write(chunk)
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+    except BaseException:
+        _remove(temp_path)
+        raise
+
+    return StoredFile(path=temp_path, size=size, content_hash=digest.hexdigest())
+
+async def acquire_blob(db: AsyncSession, stored: StoredFile, directory: str) -> str:
+    """Add a reference to the blob of a staged upload, creating its row if needed.
+
+    Returns the blob's path. The reference is part of the caller's transaction;
+    the staged file is renamed into place after it commits and deleted if it
+    does not.
+    """
+    path = blob_path(directory, stored.content_hash)
+    # Registered first, so the staged file is cleaned up however the transaction ends
+    db.sync_session.info.setdefault("staged_blobs", []).append((stored.path, path))
+
+    increment = (
+        update(Blob)
+        .where(Blob.content_hash == stored.content_hash)
+        .values(ref_count=Blob.ref_count + 1)
+    )
+    if (await db.execute(increment)).rowcount:
+        return path
+    try:
+        async with db.begin_nested():
+            db.add(Blob(content_hash=stored.content_hash, file_path=path, size=stored.size, ref_count=1))
+    except IntegrityError:
+        # A concurrent upload of the same file created the row first
+        await db.execute(increment)
+    return path
+
+def release_blob(db: Session, content_hash: Optional[str]):
+    """Drop one reference to a blob; its file is deleted after the commit that drops the last one."""
+    if content_hash is None:
+        return
+    # Atomic decrement, like acquire_blob's increment, so concurrent deletes cannot lose one
+    released = db.execute(
+        update(Blob)
+        .where(Blob.content_hash == content_hash)
+        .values(ref_count=Blob.ref_count - 1)
+        .returning(Blob.ref_count, Blob.file_path)
+    ).first()
+    if released is None or released.ref_count > 0:
+        return
+    # Only delete if no upload took a new reference in the meantime
+    deleted = db.execute(
+        delete(Blob).where(Blob.content_hash == content_hash, Blob.ref_count <= 0)
+    ).rowcount
+    if not deleted:
+        return
+    # Move the file aside while the row is still locked; an upload of the same
+    # file blocks on the row and places its own copy after this commits
+    aside = f"{released.file_path}.released-{uuid.uuid4().hex}"
+    try:
+        os.replace(released.file_path, aside)
+    except FileNotFoundError:
+        return
+    db.info.setdefault("released_blobs", []).append((released.file_path, aside))
+
+@event.listens_for(Session, "after_commit")
+def _finish_blob_moves(session):
+    if session.in_nested_transaction():
+        return  # A savepoint was released; the outer transaction may still roll back
+    for staged, path in session.info.pop("staged_blobs", []):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Same contents either way, so overwriting an existing blob is harmless
+        os.replace(staged, path)
+    for _, aside in session.info.pop("released_blobs", []):
+        _remove(aside)
+
+@event.listens_for(Session, "after_transaction_end")
+def _undo_blob_moves(session, transaction):
+    if transaction.parent is not None:
+        return
+    # Anything left was not committed (rollback, or closed without committing)
+    for staged, _ in session.info.pop("staged_blobs", []):
+        _remove(staged)
+    for path, aside in session.info.pop("released_blobs", []):
+        os.replace(aside, path)
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def dedupe_uploads(db: Session, directory: str, batch_size: int = 500) -> Dict[str, int]:
+    """Move every material file into the blob store and rebuild reference counts.
+
+    Safe to run repeatedly; materials already pointing at their blob are skipped.
+    """
+    stats = {"materials": 0, "moved": 0, "duplicates": 0, "missing": 0, "bytes_reclaimed": 0, "orphans": 0}
+
+    last_id = 0
+    while True:
+        materials = (
+            db.query(Material)
+            .filter(Material.id > last_id)
+            .order_by(Material.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not materials:
+            break
+        old_paths = []
+        for material in materials:
+            last_id = material.id
+            stats["materials"] += 1
+            if material.content_hash and material.file_path == blob_path(directory, material.content_hash):
+                continue
+            if not os.path.exists(material.file_path):
+                stats["missing"] += 1
+                continue
+
+            content_hash = _hash_file(material.file_path)
+            size = os.path.getsize(material.file_path)
+            target = blob_path(directory, content_hash)
+            if os.path.exists(target):
+                stats["duplicates"] += 1
+                stats["bytes_reclaimed"] += size
+                old_paths.append(material.file_path)
+            else:
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                os.replace(material.file_path, target)
+                stats["moved"] += 1
+            material.file_path = target
+            material.content_hash = content_hash
+            material.size = size
+        db.commit()
+        # Duplicates are only deleted once no committed row points at them
+        for path in old_paths:
+            _remove(path)
+
+    # Rebuild reference counts from the materials that now point at blobs
+    counts = dict(
+        db.query(Material.content_hash, func.count(Material.id))
+        .filter(Material.content_hash.isnot(None))
+        .group_by(Material.content_hash)
+        .all()
+    )
+    blobs = {blob.content_hash: blob for blob in db.query(Blob).all()}
+    for content_hash, ref_count in counts.items():
+        path = blob_path(directory, content_hash)
+        if not os.path.exists(path):
+            continue
+        blob = blobs.pop(content_hash, None)
+        if blob is None:
+            db.add(Blob(content_hash=content_hash, file_path=path, size=os.path.getsize(path), ref_count=ref_count))
+        else:
+            blob.ref_count = ref_count
+    for blob in blobs.values():
+        db.delete(blob)
+    db.commit()
+
+    # Remove blob files left behind by failed uploads or released references
+    referenced = {path for (path,) in db.query(Blob.file_path).all()}
+    for root, _, files in os.walk(os.path.join(directory, BLOB_DIR)):
+        for name in files:
+            path = os.path.join(root, name)
+            if path not in referenced:
+                os.remove(path)
+                stats["orphans"] += 1
+
+    return stats
+
+def main():
+    """Deduplicate the uploads directory into the blob store."""
+    from database import SessionLocal
+
+    parser = argparse.ArgumentParser(description="Deduplicate uploaded material files into the blob store.")
+    parser.add_argument("--upload-dir", default="uploads", help="Upload directory used by the API")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        stats = dedupe_uploads(db, args.upload_dir)
+    finally:
+        db.close()
+    for key, value in stats.items():
+        print(f"{key}: {value}")
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, Boolean, Float
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, Date, DateTime, ForeignKey, Text, Boolean, Float, BigInteger, UniqueConstraint, Index, event
+from sqlalchemy.orm import object_session, relationship
 from sqlalchemy.sql import func
 import sys
 import os
@@ -9,6 +9,10 @@ from database import Base
 class User(Base):
     """User model for students and teachers."""
     __tablename__ = "users"
+    __table_args__ = (
+        Index("ix_users_role", "role"),
+        Index("ix_users_class_id_role", "class_id", "role"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     username = Column(String, unique=True, index=True, nullable=False)
@@ -27,6 +31,9 @@ class User(Base):
 class Class(Base):
     """Class model."""
     __tablename__ = "classes"
+    __table_args__ = (
+        Index("ix_classes_teacher_id", "teacher_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
@@ -41,6 +48,9 @@ class Class(Base):
 class Course(Base):
     """Course model."""
     __tablename__ = "courses"
+    __table_args__ = (
+        Index("ix_courses_class_id", "class_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
@@ -55,6 +65,9 @@ class Course(Base):
 class Unit(Base):
     """Unit within a course."""
     __tablename__ = "units"
+    __table_args__ = (
+        Index("ix_units_course_id", "course_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
@@ -68,6 +81,9 @@ class Unit(Base):
 class Lesson(Base):
     """Lesson model."""
     __tablename__ = "lessons"
+    __table_args__ = (
+        Index("ix_lessons_unit_id", "unit_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
@@ -81,6 +97,9 @@ class Lesson(Base):
 class Material(Base):
     """Teaching material (slides, PDFs, etc.)."""
     __tablename__ = "materials"
+    __table_args__ = (
+        Index("ix_materials_lesson_id", "lesson_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     lesson_id = Column(Integer, ForeignKey("lessons.id"), nullable=False)
@@ -88,11 +107,28 @@ class Material(Base):
     file_path = Column(String, nullable=False)  # Path to uploaded file
     content_type = Column(String, nullable=False)  # "slide", "pdf", "video", etc.
     language = Column(String, default="en")
+    content_hash = Column(String(64), nullable=True)  # SHA-256 of the file contents
+    size = Column(BigInteger, nullable=True)  # File size in bytes
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class Blob(Base):
+    """Content-addressed file shared by every material with the same contents."""
+    __tablename__ = "blobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String(64), unique=True, nullable=False)  # SHA-256, also the file name
+    file_path = Column(String, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)  # Materials pointing at this blob
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 class Question(Base):
     """Question for practice."""
     __tablename__ = "questions"
+    __table_args__ = (
+        Index("ix_questions_lesson_id", "lesson_id"),
+        Index("ix_questions_subject", "subject"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     lesson_id = Column(Integer, ForeignKey("lessons.id"), nullable=False)
@@ -102,11 +138,24 @@ class Question(Base):
     correct_answer = Column(Text, nullable=False)
     difficulty = Column(String, default="medium")  # "easy", "medium", "hard"
     subject = Column(String, nullable=False)
+    # Incremented on every ORM update; cached question payloads are keyed by it
+    version = Column(Integer, nullable=False, default=1, server_default="1")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+@event.listens_for(Question, "before_update")
+def _bump_question_version(mapper, connection, target):
+    # Incremented in SQL so concurrent edits each get their own version
+    if object_session(target).is_modified(target, include_collections=False):
+        target.version = Question.version + 1
+
 class UserAnswer(Base):
     """User answers to questions."""
     __tablename__ = "user_answers"
+    __table_args__ = (
+        Index("ix_user_answers_user_id_question_id", "user_id", "question_id"),
+        Index("ix_user_answers_question_id", "question_id"),
+        UniqueConstraint("submission_id", name="uq_user_answers_submission_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -116,14 +165,48 @@ class UserAnswer(Base):
     time_taken = Column(Float)  # seconds
     hints_used = Column(Integer, default=0)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    submission_id = Column(String(36))  # Set for answers written through the write-behind journal
 
     # Relationships
     user = relationship("User", backref="answers")
     question = relationship("Question", backref="answers")
 
+class QuestionMastery(Base):
+    """Per-question mastery and review schedule, maintained incrementally on answer submit."""
+    __tablename__ = "question_masteries"
+    __table_args__ = (
+        UniqueConstraint("user_id", "question_id", name="uq_question_masteries_user_question"),
+        Index("ix_question_masteries_user_id_due_at", "user_id", "due_at"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    question_id = Column(Integer, ForeignKey("questions.id"), nullable=False)
+    score = Column(Integer, nullable=False, default=0)  # 0-100
+    attempts = Column(Integer, nullable=False, default=0)
+    # SM-2 review schedule (see spaced_repetition.py)
+    easiness = Column(Float, nullable=False, default=2.5)
+    interval_days = Column(Float, nullable=False, default=0)
+    repetitions = Column(Integer, nullable=False, default=0)
+    due_at = Column(DateTime(timezone=True))
+    updated_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class ItemParameter(Base):
+    """Calibrated 2PL IRT parameters of a question, written by irt_calibration.py."""
+    __tablename__ = "item_parameters"
+
+    question_id = Column(Integer, ForeignKey("questions.id"), primary_key=True, autoincrement=False)
+    difficulty = Column(Float, nullable=False)  # b, on the student ability scale
+    discrimination = Column(Float, nullable=False)  # a
+    answers = Column(Integer, nullable=False)  # Answers the fit was based on
+    calibrated_at = Column(DateTime(timezone=True), nullable=False)
+
 class Mastery(Base):
     """Mastery scores per topic."""
     __tablename__ = "masteries"
+    __table_args__ = (
+        UniqueConstraint("user_id", "topic", name="uq_masteries_user_topic"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -137,6 +220,9 @@ class Mastery(Base):
 class Gamification(Base):
     """Gamification data."""
     __tablename__ = "gamifications"
+    __table_args__ = (
+        UniqueConstraint("user_id", name="uq_gamifications_user_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -148,6 +234,9 @@ class Gamification(Base):
 class Session(Base):
     """User session tracking for analytics."""
     __tablename__ = "sessions"
+    __table_args__ = (
+        Index("ix_sessions_user_id_start_time", "user_id", "start_time"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -164,9 +253,25 @@ class Session(Base):
     user = relationship("User", backref="sessions")
     lesson = relationship("Lesson", backref="sessions")
 
+class DailyActiveUser(Base):
+    """One row per user per UTC day with at least one session, maintained on session insert."""
+    __tablename__ = "daily_active_users"
+    __table_args__ = (
+        UniqueConstraint("day", "user_id", name="uq_daily_active_users_day_user"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    day = Column(Date, nullable=False)
+
 class Progress(Base):
     """Student progress tracking."""
     __tablename__ = "progress"
+    __table_args__ = (
+        Index("ix_progress_user_id_lesson_id", "user_id", "lesson_id"),
+        Index("ix_progress_lesson_id_user_id", "lesson_id", "user_id"),
+        Index("ix_progress_user_id_status", "user_id", "status"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -183,6 +288,10 @@ class Progress(Base):
 class Intervention(Base):
     """Teacher interventions and recommendations."""
     __tablename__ = "interventions"
+    __table_args__ = (
+        # Serves the teacher's listing filtered by status and priority, newest first
+        Index("ix_interventions_teacher_id_status_priority_created_at", "teacher_id", "status", "priority", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -199,3 +308,17 @@ class Intervention(Base):
     student = relationship("User", foreign_keys=[student_id], backref="student_interventions")
     teacher = relationship("User", foreign_keys=[teacher_id], backref="teacher_interventions")
     lesson = relationship("Lesson", backref="interventions")
+
+class ClassRollup(Base):
+    """Precomputed teacher dashboard metrics for one class."""
+    __tablename__ = "class_rollups"
+
+    class_id = Column(Integer, ForeignKey("classes.id"), primary_key=True, autoincrement=False)
+    total_students = Column(Integer, nullable=False, default=0)
+    active_students_today = Column(Integer, nullable=False, default=0)
+    mastery_sum = Column(Float, nullable=False, default=0.0)  # Sum of mastery scores, kept incrementally
+    mastery_count = Column(Integer, nullable=False, default=0)  # Number of mastery rows
+    total_questions_attempted = Column(Integer, nullable=False, default=0)
+    completed_students = Column(Integer, nullable=False, default=0)
+    top_students = Column(Text, nullable=False, default="[]")  # JSON list of the class's top 5 students
+    refreshed_at = Column(DateTime(timezone=True), nullable=False)  # Last full recompute
@@ -0,0 +1,134 @@
+"""
+Keyset pagination and field selection shared by list endpoints.
+
+List endpoints accept `limit`, `after` and `fields` query parameters. Rows are
+returned as a plain JSON list; when more rows exist, the opaque cursor for the
+next page is returned in the `X-Next-Cursor` response header and is passed
+back as `after`. Without `limit` or `after` every row is returned; a cursor
+without `limit` continues in pages of DEFAULT_PAGE_LIMIT.
+"""
+
+import base64
+from typing import Any, Callable, List, Optional, Sequence, Tuple, Type
+
+from fastapi import HTTPException, Query, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from sqlalchemy import and_, inspect, or_, select
+from sqlalchemy.orm import Query as ORMQuery, load_only
+
+DEFAULT_PAGE_LIMIT = 100
+MAX_PAGE_LIMIT = 1000
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+class PageParams:
+    """Common pagination and projection query parameters."""
+
+    def __init__(
+        self,
+        limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_LIMIT,
+                                     description="Maximum number of rows to return; all rows when omitted"),
+        after: Optional[str] = Query(None, description="Cursor from the previous page's X-Next-Cursor header"),
+        fields: Optional[str] = Query(None, description="Comma-separated list of fields to include")
+    ):
+        self.limit = limit
+        self.after = after
+        self.fields = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+
+def encode_cursor(row_id: int) -> str:
+    """Encode a row id as an opaque cursor."""
+    return base64.urlsafe_b64encode(str(row_id).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    """Decode a cursor produced by encode_cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _row_id(row: Any) -> int:
+    # Rows are either entities or tuples whose first element is the entity
+    return row.id if hasattr(row, "id") else row[0].id
+
+def _load_fields(query: ORMQuery, fields: List[str]) -> ORMQuery:
+    # Only load the selected columns of a single-entity query; other queries, or
+    # fields that are not plain columns, load full rows
+    descriptions = query.column_descriptions
+    if len(descriptions) != 1 or descriptions[0]["expr"] is not descriptions[0]["type"]:
+        return query
+    entity = descriptions[0]["entity"]
+    columns = inspect(entity).column_attrs
+    if not all(f in columns for f in fields):
+        return query
+    return query.options(load_only(*[getattr(entity, f) for f in fields]))
+
+def paginate(
+    query: ORMQuery,
+    page: PageParams,
+    id_column,
+    sort_column=None,
+    descending: bool = False,
+    row_id: Callable[[Any], int] = _row_id
+) -> Tuple[List[Any], Optional[str]]:
+    """Apply keyset pagination to a query.
+
+    Rows are ordered by `sort_column` (if given) and then `id_column`. The
+    cursor only carries the last row's id; its sort key is looked up in the
+    database so comparisons always use stored values. With `fields`, a
+    single-entity query only loads the selected columns.
+    """
+    if page.fields:
+        query = _load_fields(query, page.fields)
+    if page.after:
+        after_id = decode_cursor(page.after)
+        if sort_column is None:
+            query = query.filter(id_column < after_id if descending else id_column > after_id)
+        else:
+            cursor_sort = select(sort_column).where(id_column == after_id).scalar_subquery()
+            if descending:
+                query = query.filter(or_(
+                    sort_column < cursor_sort,
+                    and_(sort_column == cursor_sort, id_column < after_id)
+                ))
+            else:
+                query = query.filter(or_(
+                    sort_column > cursor_sort,
+                    and_(sort_column == cursor_sort, id_column > after_id)
+                ))
+
+    order = [sort_column, id_column] if sort_column is not None else [id_column]
+    query = query.order_by(*[c.desc() if descending else c.asc() for c in order])
+
+    limit = page.limit if page.limit is not None or page.after is None else DEFAULT_PAGE_LIMIT
+    if limit is None:
+        return query.all(), None
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(row_id(rows[-1]))
+    return rows, next_cursor
+
+def page_response(
+    response: Response,
+    page: PageParams,
+    items: Sequence[Any],
+    schema: Type[BaseModel],
+    next_cursor: Optional[str]
+):
+    """Return a page of items, applying `fields` projection if requested."""
+    if page.fields is None:
+        if next_cursor:
+            response.headers[NEXT_CURSOR_HEADER] = next_cursor
+        return items
+
+    unknown = [f for f in page.fields if f not in schema.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    # Read only the selected attributes: the rest may not have been loaded
+    content = [jsonable_encoder({f: getattr(item, f) for f in page.fields}) for item in items]
+    headers = {NEXT_CURSOR_HEADER: next_cursor} if next_cursor else None
+    return JSONResponse(content=content, headers=headers)
@@ -0,0 +1,88 @@
+"""
+Bounded worker pool for password hashing and verification.
+
+Hashing is deliberately slow, so running it on the event loop (or on the
+shared request threadpool) stalls unrelated requests during a login burst.
+All hashing goes through a dedicated, size-limited thread pool; the hash
+functions release the GIL, so threads run them in parallel. When more than
+`max_queue` operations are waiting, new ones are rejected with 503 instead of
+queueing without bound.
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+from fastapi import HTTPException
+
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "256"))
+
+class PasswordHasherPool:
+    """Runs hash/verify calls on a bounded pool and tracks queue depth.
+
+    `max_workers=0` runs calls inline in the caller's thread (used by the
+    login benchmark to reproduce the unpooled behaviour).
+    """
+
+    def __init__(self, max_workers: int = PASSWORD_HASH_WORKERS, max_queue: int = PASSWORD_HASH_MAX_QUEUE):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hash") if max_workers else None
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._completed = 0
+        self._rejected = 0
+
+    def _submit(self, fn: Callable[..., Any], *args) -> Future:
+        with self._lock:
+            if self._executor is not None and self._in_flight >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise HTTPException(
+                    status_code=503,
+                    detail="Too many password operations in progress, please retry",
+                    headers={"Retry-After": "1"}
+                )
+            self._in_flight += 1
+
+        if self._executor is None:
+            future: Future = Future()
+            try:
+                future.set_result(fn(*args))
+            except Exception as e:
+                future.set_exception(e)
+            self._done(future)
+            return future
+
+        future = self._executor.submit(fn, *args)
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future: Future):
+        with self._lock:
+            self._in_flight -= 1
+            self._completed += 1
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        """Run fn on the pool without blocking the event loop."""
+        return await asyncio.wrap_future(self._submit(fn, *args))
+
+    def run_sync(self, fn: Callable[..., Any], *args) -> Any:
+        """Run fn on the pool from synchronous code, waiting for the result."""
+        return self._submit(fn, *args).result()
+
+    def stats(self) -> Dict[str, int]:
+        """Return pool size, queue depth and counters."""
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "in_flight": self._in_flight,
+                "queued": max(0, self._in_flight - self.max_workers),
+                "max_queue": self.max_queue,
+                "completed": self._completed,
+                "rejected": self._rejected
+            }
+
+password_pool = PasswordHasherPool()
@@ -0,0 +1,149 @@
+"""
+Precomputed next-question queues for the practice system.
+
+With PRACTICE_QUEUES=1, get_next_question serves practice questions from a
+per-student, per-scope queue of the next PRACTICE_QUEUE_SIZE picks of the
+question selector. A request with a ready queue pops its head; only a miss
+runs the selector on the request path, serving the first pick and queueing
+the rest. Every answer submission refills the student's queues in a
+background task after the response is sent, so the queue follows the
+student's mastery as it changes.
+
+A queue is dropped rather than served when it is older than
+PRACTICE_QUEUE_MAX_AGE_SECONDS, or when the question bank generation it was
+built from has changed. The generation changes on any committed write to
+questions or lessons, such as new questions added to a lesson, and on the
+bank's TTL when another process writes them. Queues are per process and are
+simply recomputed after a restart.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+
+from fastapi import BackgroundTasks
+from sqlalchemy.orm import Session, sessionmaker
+
+import adaptive
+from question_bank import QuestionEntry, question_bank
+
+PRACTICE_QUEUES = os.getenv("PRACTICE_QUEUES", "0") == "1"
+PRACTICE_QUEUE_SIZE = int(os.getenv("PRACTICE_QUEUE_SIZE", "5"))
+PRACTICE_QUEUE_MAX_AGE_SECONDS = float(os.getenv("PRACTICE_QUEUE_MAX_AGE_SECONDS", "60"))
+PRACTICE_QUEUE_MAX_STUDENTS = int(os.getenv("PRACTICE_QUEUE_MAX_STUDENTS", "50000"))
+
+@dataclass
+class _Queue:
+    """Questions to serve next in one scope, and what they were computed from."""
+    entries: Deque[QuestionEntry]
+    generation: int
+    built_at: float
+
+def _scope_filters(scope: Tuple[str, object]) -> dict:
+    kind, value = scope
+    return {"lesson": {"lesson_id": value}, "unit": {"unit_id": value},
+            "subject": {"subject": value}}.get(kind, {})
+
+class PracticeQueues:
+    """Per (student, question bank scope) queues of precomputed selector picks."""
+
+    def __init__(self, size: int = PRACTICE_QUEUE_SIZE, max_age_seconds: float = PRACTICE_QUEUE_MAX_AGE_SECONDS,
+                 max_students: int = PRACTICE_QUEUE_MAX_STUDENTS):
+        self.size = size
+        self.max_age_seconds = max_age_seconds
+        self.max_students = max_students
+        self._lock = threading.Lock()
+        # Least recently served students are evicted first
+        self._students: "OrderedDict[int, Dict[Tuple[str, object], _Queue]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def pop(self, user_id: int, scope: Tuple[str, object]) -> Optional[QuestionEntry]:
+        """Return the head of a fresh queue, or None if there is no fresh, non-empty one."""
+        generation = question_bank.current_generation()
+        with self._lock:
+            queues = self._students.get(user_id, {})
+            queue = queues.get(scope)
+            if queue is not None and (
+                queue.generation != generation or time.monotonic() - queue.built_at > self.max_age_seconds
+            ):
+                del queues[scope]
+                queue = None
+            if queue is None or not queue.entries:
+                self.misses += 1
+                return None
+            self._students.move_to_end(user_id)
+            self.hits += 1
+            return queue.entries.popleft()
+
+    def _store(self, user_id: int, scope: Tuple[str, object], entries: List[QuestionEntry], generation: int):
+        with self._lock:
+            self._students.setdefault(user_id, {})[scope] = _Queue(deque(entries), generation, time.monotonic())
+            self._students.move_to_end(user_id)
+            while len(self._students) > self.max_students:
+                self._students.popitem(last=False)
+
+    def _select(self, db: Session, user_id: int, scope: Tuple[str, object]) -> Tuple[List[QuestionEntry], int]:
+        # Read first: an invalidation while selecting leaves the queue stale
+        generation = question_bank.current_generation()
+        return adaptive.question_selector.select_many(db, user_id, self.size, **_scope_filters(scope)), generation
+
+    def fill(self, db: Session, user_id: int, scope: Tuple[str, object]):
+        """Recompute the student's queue for a scope."""
+        entries, generation = self._select(db, user_id, scope)
+        self._store(user_id, scope, entries, generation)
+
+    def next_question(self, db: Session, user_id: int, scope: Tuple[str, object]) -> Optional[QuestionEntry]:
+        """Pop the student's next question, computing the queue on a miss."""
+        entry = self.pop(user_id, scope)
+        if entry is not None:
+            return entry
+        entries, generation = self._select(db, user_id, scope)
+        if not entries:
+            return None
+        self._store(user_id, scope, entries[1:], generation)
+        return entries[0]
+
+    def scopes(self, user_id: int) -> List[Tuple[str, object]]:
+        """Return the scopes the student has a queue for."""
+        with self._lock:
+            return list(self._students.get(user_id, {}))
+
+    def refill(self, db: Session, user_id: int):
+        """Recompute every queue the student has."""
+        for scope in self.scopes(user_id):
+            self.fill(db, user_id, scope)
+
+    def clear(self):
+        """Drop every queue."""
+        with self._lock:
+            self._students.clear()
+
+    def stats(self) -> dict:
+        """Return hit/miss counters and the number of queues."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "students": len(self._students),
+                "queues": sum(len(queues) for queues in self._students.values()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+practice_queues = PracticeQueues()
+
+def _refill_in_background(bind, user_id: int):
+    db = sessionmaker(autocommit=False, autoflush=False, bind=bind)()
+    try:
+        practice_queues.refill(db, user_id)
+    finally:
+        db.close()
+
+def schedule_refill(db: Session, user_id: int, background_tasks: BackgroundTasks):
+    """Refill the student's queues after the response, if queues are enabled."""
+    if PRACTICE_QUEUES:
+        background_tasks.add_task(_refill_in_background, db.get_bind(), user_id)
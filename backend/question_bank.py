@@ -0,0 +1,166 @@
+"""
+Process-local question bank index for the practice system.
+
+Keeps per-lesson, per-unit and per-subject lists of question IDs together with
+the lightweight metadata needed to pick the next question, so that
+get_next_question does not have to scan the questions table on every call.
+Any committed write to questions or lessons invalidates the index.
+"""
+
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from database import Base
+from models import Lesson, Question
+
+# Upper bound on staleness when another process writes questions
+QUESTION_BANK_TTL_SECONDS = float(os.getenv("QUESTION_BANK_TTL_SECONDS", "300"))
+
+@dataclass(frozen=True)
+class QuestionEntry:
+    """Lightweight question metadata used for selection."""
+    id: int
+    lesson_id: int
+    question_type: str
+    difficulty: str
+    subject: str
+    options: Optional[Tuple[str, ...]]
+
+class QuestionBank:
+    """Lazily populated index of questions by lesson, unit and subject."""
+
+    def __init__(self, ttl_seconds: float = QUESTION_BANK_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._loaded_at = time.monotonic()
+        self._entries: Dict[int, QuestionEntry] = {}
+        self._scopes: Dict[Tuple[str, object], List[int]] = {}
+
+    def invalidate(self):
+        """Drop every cached scope."""
+        with self._lock:
+            self._generation += 1
+            self._loaded_at = time.monotonic()
+            self._entries.clear()
+            self._scopes.clear()
+
+    def current_generation(self) -> int:
+        """Return a number that changes whenever cached scopes are dropped.
+
+        Callers that derive their own per-scope state from get_questions can
+        read this first and rebuild when it changes.
+        """
+        if time.monotonic() - self._loaded_at > self.ttl_seconds:
+            self.invalidate()
+        with self._lock:
+            return self._generation
+
+    @staticmethod
+    def scope_key(
+        lesson_id: Optional[int] = None,
+        unit_id: Optional[int] = None,
+        subject: Optional[str] = None
+    ) -> Tuple[str, object]:
+        """Return the cache key of the most specific filter given."""
+        if lesson_id:
+            return ("lesson", lesson_id)
+        if unit_id:
+            return ("unit", unit_id)
+        if subject:
+            return ("subject", subject)
+        return ("all", None)
+
+    def get_questions(
+        self,
+        db: Session,
+        lesson_id: Optional[int] = None,
+        unit_id: Optional[int] = None,
+        subject: Optional[str] = None
+    ) -> List[QuestionEntry]:
+        """Return the questions matching the most specific filter given."""
+        key = self.scope_key(lesson_id, unit_id, subject)
+
+        if time.monotonic() - self._loaded_at > self.ttl_seconds:
+            self.invalidate()
+
+        with self._lock:
+            ids = self._scopes.get(key)
+            if ids is not None:
+                return [self._entries[question_id] for question_id in ids]
+            generation = self._generation
+
+        entries = self._load_scope(db, key)
+
+        with self._lock:
+            # Skip caching if an invalidation happened while we were loading
+            if generation == self._generation:
+                for entry in entries:
+                    self._entries[entry.id] = entry
+                self._scopes[key] = [entry.id for entry in entries]
+        return entries
+
+    def _load_scope(self, db: Session, key: Tuple[str, object]) -> List[QuestionEntry]:
+        scope, value = key
+        query = db.query(
+            Question.id,
+            Question.lesson_id,
+            Question.question_type,
+            Question.difficulty,
+            Question.subject,
+            Question.options
+        )
+        if scope == "lesson":
+            query = query.filter(Question.lesson_id == value)
+        elif scope == "unit":
+            query = query.join(Lesson, Lesson.id == Question.lesson_id).filter(Lesson.unit_id == value)
+        elif scope == "subject":
+            query = query.filter(Question.subject == value)
+
+        return [
+            QuestionEntry(
+                id=row.id,
+                lesson_id=row.lesson_id,
+                question_type=row.question_type,
+                difficulty=row.difficulty,
+                subject=row.subject,
+                options=tuple(json.loads(row.options)) if row.options else None
+            )
+            for row in query.order_by(Question.id).all()
+        ]
+
+question_bank = QuestionBank()
+
+# Invalidate on commit rather than flush so readers never cache uncommitted rows
+_TRACKED_MODELS = (Question, Lesson)
+
+@event.listens_for(Session, "after_flush")
+def _mark_question_writes(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, _TRACKED_MODELS):
+            session.info["question_bank_dirty"] = True
+            return
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_on_commit(session):
+    if session.info.pop("question_bank_dirty", False):
+        question_bank.invalidate()
+
+@event.listens_for(Session, "after_rollback")
+def _reset_on_rollback(session):
+    session.info.pop("question_bank_dirty", None)
+
+@event.listens_for(Base.metadata, "after_create")
+def _invalidate_on_create(target, connection, **kw):
+    question_bank.invalidate()
+
+@event.listens_for(Base.metadata, "after_drop")
+def _invalidate_on_drop(target, connection, **kw):
+    question_bank.invalidate()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Per-question mastery rules and backfill command.
+
+Each correct answer raises a student's mastery of a question by 20 points and
+each wrong answer lowers it by 10, clamped to 0-100, and moves the question's
+review schedule (see spaced_repetition.py). Answer submission applies the
+rules incrementally; run this module to rebuild the question_masteries table
+from the existing user_answers history:
+
+    python question_mastery.py
+"""
+
+import sys
+import os
+
+# Add the backend directory to the Python path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session, sessionmaker
+from database import engine
+from models import QuestionMastery, UserAnswer
+from counters import ClampedChange, insert_ignore
+from spaced_repetition import INITIAL_EASINESS, ReviewState, next_review, review_quality
+
+CORRECT_DELTA = 20
+WRONG_DELTA = 10
+MAX_SCORE = 100
+
+def next_score(score: int, is_correct: bool) -> int:
+    """Apply one answer to a question mastery score."""
+    if is_correct:
+        return min(MAX_SCORE, score + CORRECT_DELTA)
+    return max(0, score - WRONG_DELTA)
+
+def score_change(is_correct: bool) -> Tuple[int, int, int]:
+    """Return the (delta, low, high) clamped addition applied by one answer."""
+    return (CORRECT_DELTA if is_correct else -WRONG_DELTA), 0, MAX_SCORE
+
+def record_answers(db: Session, user_id: int, answers: Iterable[Tuple[int, bool, int, datetime]]):
+    """Apply (question_id, is_correct, review quality, answered_at) answers in order in the caller's transaction.
+
+    Each answered question gets one atomic UPDATE, so concurrent submissions
+    by the same student cannot lose updates. The review schedule is read
+    with FOR UPDATE (on SQLite the inserts already hold the write lock) and
+    folded in Python.
+    """
+    changes: Dict[int, ClampedChange] = {}
+    attempts: Dict[int, int] = {}
+    reviews: Dict[int, List[Tuple[int, datetime]]] = {}
+    for question_id, is_correct, quality, answered_at in answers:
+        changes[question_id] = changes.get(question_id, ClampedChange()).then(*score_change(is_correct))
+        attempts[question_id] = attempts.get(question_id, 0) + 1
+        reviews.setdefault(question_id, []).append((quality, answered_at))
+
+    for question_id in sorted(changes):
+        insert_ignore(db, QuestionMastery.__table__,
+                      {"user_id": user_id, "question_id": question_id, "score": 0, "attempts": 0},
+                      ("user_id", "question_id"))
+    schedules = {
+        row.question_id: ReviewState(row.easiness, row.interval_days, row.repetitions, row.due_at)
+        for row in db.query(
+            QuestionMastery.question_id,
+            QuestionMastery.easiness,
+            QuestionMastery.interval_days,
+            QuestionMastery.repetitions,
+            QuestionMastery.due_at
+        ).filter(
+            QuestionMastery.user_id == user_id,
+            QuestionMastery.question_id.in_(changes)
+        ).order_by(QuestionMastery.question_id).with_for_update()
+    }
+
+    for question_id in sorted(changes):
+        schedule = schedules[question_id]
+        for quality, answered_at in reviews[question_id]:
+            schedule = next_review(schedule, quality, answered_at)
+        db.execute(
+            update(QuestionMastery)
+            .where(QuestionMastery.user_id == user_id, QuestionMastery.question_id == question_id)
+            .values(
+                score=changes[question_id].expression(QuestionMastery.score),
+                attempts=QuestionMastery.attempts + attempts[question_id],
+                easiness=schedule.easiness,
+                interval_days=schedule.interval_days,
+                repetitions=schedule.repetitions,
+                due_at=schedule.due_at
+            )
+        )
+
+def backfill_question_masteries(db: Session, batch_size: int = 5000) -> int:
+    """Recompute question_masteries from user_answers, streaming in batches."""
+    db.query(QuestionMastery).delete()
+
+    answers = db.query(
+        UserAnswer.user_id,
+        UserAnswer.question_id,
+        UserAnswer.is_correct,
+        UserAnswer.time_taken,
+        UserAnswer.hints_used,
+        UserAnswer.created_at
+    ).order_by(
+        UserAnswer.user_id,
+        UserAnswer.question_id,
+        UserAnswer.created_at,
+        UserAnswer.id
+    ).yield_per(batch_size)
+
+    # Rows arrive grouped by (user, question); accumulate states in chunks
+    pending = []
+    current_key = None
+    state = None
+    written = 0
+
+    for answer in answers:
+        key = (answer.user_id, answer.question_id)
+        if key != current_key:
+            if state is not None:
+                pending.append(state)
+            current_key = key
+            state = {"user_id": answer.user_id, "question_id": answer.question_id, "score": 0, "attempts": 0,
+                     "easiness": INITIAL_EASINESS, "interval_days": 0, "repetitions": 0, "due_at": None}
+        state["score"] = next_score(state["score"], answer.is_correct)
+        state["attempts"] += 1
+        schedule = next_review(
+            ReviewState(state["easiness"], state["interval_days"], state["repetitions"], state["due_at"]),
+            review_quality(answer.is_correct, answer.time_taken, answer.hints_used),
+            answer.created_at
+        )
+        state.update(easiness=schedule.easiness, interval_days=schedule.interval_days,
+                     repetitions=schedule.repetitions, due_at=schedule.due_at)
+
+        if len(pending) >= batch_size:
+            db.execute(insert(QuestionMastery), pending)
+            written += len(pending)
+            pending = []
+
+    if state is not None:
+        pending.append(state)
+    if pending:
+        db.execute(insert(QuestionMastery), pending)
+        written += len(pending)
+
+    db.commit()
+    return written
+
+def main():
+    """Rebuild the question mastery table from answer history."""
+    print("Backfilling question masteries from user answers...")
+
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    db = SessionLocal()
+
+    try:
+        written = backfill_question_masteries(db)
+        print(f"Wrote {written} question mastery rows")
+    except Exception as e:
+        print(f"Error backfilling question masteries: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
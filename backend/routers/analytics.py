@@ -1,12 +1,16 @@
 from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status, Request, Response
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
+from sqlalchemy import and_, case, func, desc, select
 from pydantic import BaseModel
 from database import get_db
 from models import User, Class, Session as UserSession, Progress, Mastery, Gamification, Intervention, UserAnswer
-from routers.auth import get_current_user
+from routers.auth import CurrentUser, get_current_user
+from pagination import PageParams, paginate, page_response
+from export import EXPORT_BATCH_SIZE, EXPORT_RESPONSES, export_format, stream_export
+import class_rollups
+import json
 
 router = APIRouter()
 
@@ -18,6 +22,7 @@ class DashboardMetrics(BaseModel):
     total_questions_attempted: int
     completion_rate: float
     top_performing_students: List[Dict[str, Any]]
+    refreshed_at: Optional[datetime] = None  # When the oldest included class rollup was last recomputed
 
 class StudentInsight(BaseModel):
     student_id: int
@@ -65,6 +70,11 @@ class InterventionCreate(BaseModel):
     - **Completion Rate**: Percentage of students who completed lessons
     - **Top Performing Students**: Highest-scoring students with their mastery levels
 
+    Metrics are served from per-class rollups. Answer counts and mastery are
+    updated as answers are submitted; the remaining metrics are recomputed at
+    most `DASHBOARD_ROLLUP_TTL_SECONDS` apart. `refreshed_at` is the time of the
+    oldest recompute included in the response.
+
     **Note**: Only teachers can access this endpoint. Data aggregates across all classes owned by the teacher.
     """,
     responses={
@@ -72,14 +82,17 @@ class InterventionCreate(BaseModel):
         403: {"description": "Access denied - Only teachers can view dashboard"}
     }
 )
-def get_teacher_dashboard(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_teacher_dashboard(
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
     """Get dashboard metrics for teachers."""
     if current_user.role != "teacher":
         raise HTTPException(status_code=403, detail="Only teachers can access dashboard")
 
     # Get teacher's classes
-    teacher_classes = db.query(Class).filter(Class.teacher_id == current_user.id).all()
-    class_ids = [c.id for c in teacher_classes]
+    class_ids = [c.id for c in db.query(Class.id).filter(Class.teacher_id == current_user.id).all()]
 
     if not class_ids:
         return DashboardMetrics(
@@ -91,53 +104,23 @@ def get_teacher_dashboard(db: Session = Depends(get_db), current_user: User = De
             top_performing_students=[]
         )
 
-    # Get students in teacher's classes
-    students = db.query(User).filter(User.class_id.in_(class_ids)).all()
-    student_ids = [s.id for s in students]
+    # One precomputed row per class
+    rollups = class_rollups.load_class_rollups(db, class_ids, background_tasks)
 
-    # Total students
-    total_students = len(students)
-
-    # Active students today (students who had sessions today)
-    today = datetime.utcnow().date()
-    active_students_today = db.query(UserSession).filter(
-        UserSession.user_id.in_(student_ids),
-        func.date(UserSession.start_time) == today
-    ).distinct(UserSession.user_id).count()
-
-    # Average mastery score
-    avg_mastery = db.query(func.avg(Mastery.score)).filter(
-        Mastery.user_id.in_(student_ids)
-    ).scalar() or 0.0
-
-    # Total questions attempted
-    total_questions = db.query(func.count(UserAnswer.id)).filter(
-        UserAnswer.user_id.in_(student_ids)
-    ).scalar()
-
-    # Completion rate (students who completed at least one lesson)
-    completed_students = db.query(Progress).filter(
-        Progress.user_id.in_(student_ids),
-        Progress.status == "completed"
-    ).distinct(Progress.user_id).count()
+    total_students = sum(r.total_students for r in rollups)
+    active_students_today = sum(r.active_students_today for r in rollups)
+    mastery_count = sum(r.mastery_count for r in rollups)
+    avg_mastery = sum(r.mastery_sum for r in rollups) / mastery_count if mastery_count else 0.0
+    total_questions = sum(r.total_questions_attempted for r in rollups)
+    completed_students = sum(r.completed_students for r in rollups)
 
     completion_rate = (completed_students / total_students * 100) if total_students > 0 else 0.0
 
-    # Top performing students (by average mastery)
-    top_students = db.query(
-        User.id,
-        User.full_name,
-        func.avg(Mastery.score).label('avg_mastery')
-    ).join(Mastery).filter(
-        User.id.in_(student_ids)
-    ).group_by(User.id, User.full_name).order_by(
-        desc('avg_mastery')
-    ).limit(5).all()
-
-    top_performing_students = [
-        {"id": s.id, "name": s.full_name, "average_mastery": round(s.avg_mastery, 1)}
-        for s in top_students
-    ]
+    # Top performing students (by average mastery) across the per-class top lists
+    top_performing_students = sorted(
+        (student for r in rollups for student in json.loads(r.top_students)),
+        key=lambda s: (-s["average_mastery"], s["id"])
+    )[:class_rollups.TOP_STUDENTS]
 
     return DashboardMetrics(
         total_students=total_students,
@@ -145,7 +128,8 @@ def get_teacher_dashboard(db: Session = Depends(get_db), current_user: User = De
         average_mastery_score=round(avg_mastery, 1),
         total_questions_attempted=total_questions,
         completion_rate=round(completion_rate, 1),
-        top_performing_students=top_performing_students
+        top_performing_students=top_performing_students,
+        refreshed_at=min(r.refreshed_at for r in rollups)
     )
 
 @router.get(
@@ -177,7 +161,7 @@ def get_teacher_dashboard(db: Session = Depends(get_db), current_user: User = De
 def get_student_insights(
     student_id: int,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """Get detailed insights for a specific student."""
     if current_user.role != "teacher":
@@ -246,11 +230,22 @@ def get_student_insights(
         recommendations=recommendations
     )
 
-@router.get("/classes/{class_id}/progress", response_model=List[ClassProgress])
+@router.get(
+    "/classes/{class_id}/progress",
+    response_model=List[ClassProgress],
+    description="""
+    Get progress overview for all lessons in a class.
+
+    Send `Accept: application/x-ndjson` or `Accept: text/csv` to stream the
+    rows instead of returning a JSON list.
+    """,
+    responses={200: EXPORT_RESPONSES}
+)
 def get_class_progress(
     class_id: int,
+    request: Request,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """Get progress overview for all lessons in a class."""
     if current_user.role != "teacher":
@@ -264,81 +259,85 @@ def get_class_progress(
     if not class_obj:
         raise HTTPException(status_code=403, detail="Access denied")
 
-    # Get all lessons for this class's courses
+    # One grouped query: every lesson in the class with its students' progress aggregated
     from models import Course, Unit, Lesson
-    lessons = db.query(Lesson).join(Unit).join(Course).filter(
+    class_students = select(User.id).where(User.class_id == class_id)
+    progress_query = db.query(
+        Lesson.id,
+        Lesson.title,
+        func.avg(Progress.completion_percentage).label("average_completion"),
+        func.count(case((Progress.completion_percentage < 50, 1))).label("struggling_students"),
+        func.count(case((Progress.status == "completed", 1))).label("completed_students")
+    ).join(Unit, Unit.id == Lesson.unit_id).join(Course, Course.id == Unit.course_id).outerjoin(
+        Progress,
+        and_(Progress.lesson_id == Lesson.id, Progress.user_id.in_(class_students))
+    ).filter(
         Course.class_id == class_id
-    ).all()
-
-    progress_data = []
-    students_in_class = db.query(User).filter(User.class_id == class_id).all()
-
-    for lesson in lessons:
-        # Get progress for this lesson
-        progress_records = db.query(Progress).filter(
-            Progress.lesson_id == lesson.id,
-            Progress.user_id.in_([s.id for s in students_in_class])
-        ).all()
-
-        if progress_records:
-            avg_completion = sum(p.completion_percentage for p in progress_records) / len(progress_records)
-            struggling_students = sum(1 for p in progress_records if p.completion_percentage < 50)
-            completed_students = sum(1 for p in progress_records if p.status == "completed")
-        else:
-            avg_completion = 0.0
-            struggling_students = 0
-            completed_students = 0
-
-        progress_data.append(ClassProgress(
-            lesson_id=lesson.id,
-            lesson_title=lesson.title,
-            average_completion=round(avg_completion, 1),
-            struggling_students=struggling_students,
-            completed_students=completed_students
-        ))
-
-    return progress_data
+    ).group_by(Lesson.id, Lesson.title).order_by(Lesson.id)
+
+    def lesson_progress(row) -> ClassProgress:
+        return ClassProgress(
+            lesson_id=row.id,
+            lesson_title=row.title,
+            average_completion=round(row.average_completion or 0.0, 1),
+            struggling_students=row.struggling_students,
+            completed_students=row.completed_students
+        )
+
+    media_type = export_format(request)
+    if media_type:
+        rows = progress_query.yield_per(EXPORT_BATCH_SIZE)
+        return stream_export(media_type, rows, lesson_progress, ClassProgress, filename=f"class_{class_id}_progress")
+
+    return [lesson_progress(row) for row in progress_query.all()]
 
 @router.get("/interventions", response_model=List[InterventionSummary])
 def get_interventions(
+    response: Response,
     status_filter: Optional[str] = None,
     priority_filter: Optional[str] = None,
+    page: PageParams = Depends(),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """Get interventions for teacher's students."""
     if current_user.role != "teacher":
         raise HTTPException(status_code=403, detail="Only teachers can access interventions")
 
-    query = db.query(Intervention).filter(Intervention.teacher_id == current_user.id)
+    # Student names come from the same query rather than one lookup per intervention
+    query = db.query(Intervention, User.full_name).outerjoin(
+        User, User.id == Intervention.student_id
+    ).filter(Intervention.teacher_id == current_user.id)
 
     if status_filter:
         query = query.filter(Intervention.status == status_filter)
     if priority_filter:
         query = query.filter(Intervention.priority == priority_filter)
 
-    interventions = query.order_by(desc(Intervention.created_at)).all()
+    rows, next_cursor = paginate(
+        query, page, Intervention.id, sort_column=Intervention.created_at, descending=True
+    )
 
-    result = []
-    for intervention in interventions:
-        student = db.query(User).filter(User.id == intervention.student_id).first()
-        result.append(InterventionSummary(
+    result = [
+        InterventionSummary(
             id=intervention.id,
-            student_name=student.full_name if student else "Unknown",
+            student_name=student_name or "Unknown",
             intervention_type=intervention.intervention_type,
             priority=intervention.priority,
             status=intervention.status,
             description=intervention.description,
             created_at=intervention.created_at
-        ))
+        )
+        for intervention, student_name in rows
+    ]
 
-    return result
+    return page_response(response, page, result, InterventionSummary, next_cursor)
 
 @router.post("/interventions")
 def create_intervention(
     intervention_data: InterventionCreate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """Create a new intervention for a student."""
     if current_user.role != "teacher":
@@ -5,9 +5,14 @@ from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from pydantic import BaseModel
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from database import get_db
+from database import Base, get_db, get_async_db
 from models import User
+from cache import TTLCache
+from password_hashing import password_pool
+import os
 
 # Authentication configuration
 SECRET_KEY = "your-secret-key-here"  # TODO: Move to environment variable
@@ -17,6 +22,11 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Resolved identities keyed by token subject, so role checks skip the database
+USER_CACHE_TTL_SECONDS = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+USER_CACHE_MAX_SIZE = int(os.getenv("USER_CACHE_MAX_SIZE", "10000"))
+user_cache = TTLCache(maxsize=USER_CACHE_MAX_SIZE, ttl_seconds=USER_CACHE_TTL_SECONDS)
+
 router = APIRouter()
 
 # Pydantic models
@@ -47,6 +57,19 @@ class UserResponse(BaseModel):
     language: str
     class_id: Optional[int]
 
+class CurrentUser(BaseModel):
+    """Authenticated user identity returned by get_current_user (no credentials)."""
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
+    id: int
+    username: str
+    email: str
+    full_name: str
+    role: str
+    language: Optional[str] = "en"
+    class_id: Optional[int] = None
+    created_at: Optional[datetime] = None
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -63,12 +86,14 @@ def get_password_hash(password):
     # bcrypt has a 72 byte limit, truncate if necessary
     return pwd_context.hash(password[:72])
 
-def authenticate_user(db: Session, username: str, password: str):
-    """Authenticate a user."""
-    user = db.query(User).filter(User.username == username).first()
+async def authenticate_user(db: AsyncSession, username: str, password: str):
+    """Authenticate a user, verifying the password on the hashing pool."""
+    user = (await db.execute(select(User).where(User.username == username))).scalars().first()
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    # Return the connection to the pool while the hash is being checked
+    await db.close()
+    if not await password_pool.run(verify_password, password, user.hashed_password):
         return False
     return user
 
@@ -83,8 +108,18 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """Get current user from JWT token."""
+def cache_user(user: User) -> CurrentUser:
+    """Store a fresh identity snapshot for the user's token subject."""
+    current_user = CurrentUser.model_validate(user)
+    user_cache.set(user.username, current_user)
+    return current_user
+
+@event.listens_for(Base.metadata, "after_drop")
+def _clear_user_cache(target, connection, **kw):
+    user_cache.clear()
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> CurrentUser:
+    """Get current user from JWT token, served from the identity cache when possible."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -98,10 +133,13 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         token_data = TokenData(username=username)
     except JWTError:
         raise credentials_exception
-    user = db.query(User).filter(User.username == token_data.username).first()
+    cached_user = user_cache.get(token_data.username)
+    if cached_user is not None:
+        return cached_user
+    user = (await db.execute(select(User).where(User.username == token_data.username))).scalars().first()
     if user is None:
         raise credentials_exception
-    return user
+    return cache_user(user)
 
 @router.post(
     "/register",
@@ -127,7 +165,7 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
         raise HTTPException(status_code=400, detail="Username or email already registered")
 
     # Create new user
-    hashed_password = get_password_hash(user.password)
+    hashed_password = password_pool.run_sync(get_password_hash, user.password)
     db_user = User(
         username=user.username,
         email=user.email,
@@ -139,18 +177,20 @@ def register(user: UserCreate, db: Session = Depends(get_db)):
     db.add(db_user)
     db.commit()
     db.refresh(db_user)
+    user_cache.invalidate(db_user.username)
     return db_user
 
 @router.post("/token", response_model=Token)
-async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_db)):
     """Login and get access token."""
-    user = authenticate_user(db, form_data.username, form_data.password)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    cache_user(user)
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": user.username}, expires_delta=access_token_expires
@@ -158,7 +198,7 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/users/me", response_model=UserResponse)
-async def read_users_me(current_user: User = Depends(get_current_user)):
+async def read_users_me(current_user: CurrentUser = Depends(get_current_user)):
     """Get current user info."""
     return current_user
 
@@ -166,7 +206,7 @@ async def read_users_me(current_user: User = Depends(get_current_user)):
 def update_user_profile(
     user_update: UserUpdate,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """Update current user's profile."""
     # Check if username or email is already taken by another user
@@ -180,22 +220,26 @@ def update_user_profile(
         if existing_user:
             raise HTTPException(status_code=400, detail="Email already registered")
 
+    user = db.get(User, current_user.id)
+
     # Update user fields
-    current_user.username = user_update.username
-    current_user.email = user_update.email
-    current_user.full_name = user_update.full_name
+    user.username = user_update.username
+    user.email = user_update.email
+    user.full_name = user_update.full_name
     if user_update.language:
-        current_user.language = user_update.language
+        user.language = user_update.language
 
     db.commit()
-    db.refresh(current_user)
-    return current_user
+    db.refresh(user)
+    user_cache.invalidate(current_user.username)
+    user_cache.invalidate(user.username)
+    return user
 
 @router.put("/users/me/password")
 def update_user_password(
     password_data: dict,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """Update current user's password."""
     old_password = password_data.get("old_password")
@@ -204,10 +248,23 @@ def update_user_password(
     if not old_password or not new_password:
         raise HTTPException(status_code=400, detail="Both old and new passwords required")
 
-    if not verify_password(old_password, current_user.hashed_password):
+    user = db.get(User, current_user.id)
+    if not password_pool.run_sync(verify_password, old_password, user.hashed_password):
         raise HTTPException(status_code=400, detail="Incorrect old password")
 
-    current_user.hashed_password = get_password_hash(new_password)
+    user.hashed_password = password_pool.run_sync(get_password_hash, new_password)
     db.commit()
+    user_cache.invalidate(user.username)
 
     return {"message": "Password updated successfully"}
+
+@router.get("/metrics")
+def get_auth_metrics(current_user: CurrentUser = Depends(get_current_user)):
+    """Get identity cache and password hashing pool counters (managers only)."""
+    if current_user.role != "manager":
+        raise HTTPException(status_code=403, detail="Only managers can access auth metrics")
+
+    return {
+        "user_cache": user_cache.stats(),
+        "password_hasher": password_pool.stats()
+    }
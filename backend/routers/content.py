@@ -1,15 +1,17 @@
 from datetime import datetime
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
-from database import get_db
+from database import get_db, get_async_db
 from models import User, Class, Course, Unit, Lesson, Material
-from routers.auth import get_current_user
-import aiofiles
+from routers.auth import CurrentUser, get_current_user
+from pagination import PageParams, paginate, page_response
+from file_storage import acquire_blob, release_blob, stage_upload
+from downloads import material_file_response
+from ancestry import ancestry_resolver, check_read_access, check_write_access
 import os
-import uuid
 
 router = APIRouter()
 
@@ -71,13 +73,15 @@ class MaterialResponse(BaseModel):
     file_path: str
     content_type: str
     language: str
+    content_hash: Optional[str] = None
+    size: Optional[int] = None
 
     class Config:
         from_attributes = True
 
 # Course endpoints
 @router.post("/courses", response_model=CourseResponse)
-def create_course(course: CourseCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def create_course(course: CourseCreate, db: Session = Depends(get_db), current_user: CurrentUser = Depends(get_current_user)):
     """Create a new course."""
     # Verify user is a teacher and owns the class
     if current_user.role != "teacher":
@@ -94,7 +98,13 @@ def create_course(course: CourseCreate, db: Session = Depends(get_db), current_u
     return db_course
 
 @router.get("/courses", response_model=List[CourseResponse])
-def get_courses(class_id: Optional[int] = None, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_courses(
+    response: Response,
+    class_id: Optional[int] = None,
+    page: PageParams = Depends(),
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
     """Get courses for a class."""
     query = db.query(Course)
     if class_id:
@@ -109,40 +119,33 @@ def get_courses(class_id: Optional[int] = None, db: Session = Depends(get_db), c
         teacher_class_ids = [c.id for c in teacher_class_ids]
         query = query.filter(Course.class_id.in_(teacher_class_ids))
 
-    return query.all()
+    courses, next_cursor = paginate(query, page, Course.id)
+    return page_response(response, page, courses, CourseResponse, next_cursor)
 
 @router.get("/courses/{course_id}", response_model=CourseResponse)
-def get_course(course_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_course(course_id: int, db: Session = Depends(get_db), current_user: CurrentUser = Depends(get_current_user)):
     """Get a specific course."""
     course = db.query(Course).filter(Course.id == course_id).first()
     if not course:
         raise HTTPException(status_code=404, detail="Course not found")
 
     # Check permissions
-    if current_user.role == "student" and course.class_id != current_user.class_id:
-        raise HTTPException(status_code=403, detail="Access denied")
-    elif current_user.role == "teacher":
-        db_class = db.query(Class).filter(Class.id == course.class_id, Class.teacher_id == current_user.id).first()
-        if not db_class:
-            raise HTTPException(status_code=403, detail="Access denied")
+    check_read_access(ancestry_resolver.resolve(db, "course", course_id), current_user)
 
     return course
 
 # Unit endpoints
 @router.post("/units", response_model=UnitResponse)
-def create_unit(unit: UnitCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def create_unit(unit: UnitCreate, db: Session = Depends(get_db), current_user: CurrentUser = Depends(get_current_user)):
     """Create a new unit."""
     if current_user.role != "teacher":
         raise HTTPException(status_code=403, detail="Only teachers can create units")
 
     # Verify teacher owns the course's class
-    course = db.query(Course).filter(Course.id == unit.course_id).first()
-    if not course:
+    ancestry = ancestry_resolver.resolve(db, "course", unit.course_id)
+    if ancestry is None:
         raise HTTPException(status_code=404, detail="Course not found")
-
-    db_class = db.query(Class).filter(Class.id == course.class_id, Class.teacher_id == current_user.id).first()
-    if not db_class:
-        raise HTTPException(status_code=403, detail="Access denied")
+    check_write_access(ancestry, current_user)
 
     db_unit = Unit(**unit.dict())
     db.add(db_unit)
@@ -151,7 +154,13 @@ def create_unit(unit: UnitCreate, db: Session = Depends(get_db), current_user: U
     return db_unit
 
 @router.get("/units", response_model=List[UnitResponse])
-def get_units(course_id: Optional[int] = None, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_units(
+    response: Response,
+    course_id: Optional[int] = None,
+    page: PageParams = Depends(),
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
     """Get units for a course."""
     query = db.query(Unit)
     if course_id:
@@ -159,36 +168,25 @@ def get_units(course_id: Optional[int] = None, db: Session = Depends(get_db), cu
 
     # Check permissions based on course access
     if course_id:
-        course = db.query(Course).filter(Course.id == course_id).first()
-        if course is not None:
-            if current_user.role == "student" and course.class_id != current_user.class_id:
-                raise HTTPException(status_code=403, detail="Access denied")
-            elif current_user.role == "teacher":
-                db_class = db.query(Class).filter(Class.id == course.class_id, Class.teacher_id == current_user.id).first()
-                if db_class is None:
-                    raise HTTPException(status_code=403, detail="Access denied")
+        ancestry = ancestry_resolver.resolve(db, "course", course_id)
+        if ancestry is not None:
+            check_read_access(ancestry, current_user)
 
-    return query.all()
+    units, next_cursor = paginate(query, page, Unit.id)
+    return page_response(response, page, units, UnitResponse, next_cursor)
 
 # Lesson endpoints
 @router.post("/lessons", response_model=LessonResponse)
-def create_lesson(lesson: LessonCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def create_lesson(lesson: LessonCreate, db: Session = Depends(get_db), current_user: CurrentUser = Depends(get_current_user)):
     """Create a new lesson."""
     if current_user.role != "teacher":
         raise HTTPException(status_code=403, detail="Only teachers can create lessons")
 
     # Verify teacher owns the unit's course's class
-    unit = db.query(Unit).filter(Unit.id == lesson.unit_id).first()
-    if unit is None:
+    ancestry = ancestry_resolver.resolve(db, "unit", lesson.unit_id)
+    if ancestry is None:
         raise HTTPException(status_code=404, detail="Unit not found")
-
-    course = db.query(Course).filter(Course.id == unit.course_id).first()
-    if course is None:
-        raise HTTPException(status_code=404, detail="Course not found")
-
-    db_class = db.query(Class).filter(Class.id == course.class_id, Class.teacher_id == current_user.id).first()
-    if db_class is None:
-        raise HTTPException(status_code=403, detail="Access denied")
+    check_write_access(ancestry, current_user)
 
     db_lesson = Lesson(**lesson.dict())
     db.add(db_lesson)
@@ -197,7 +195,13 @@ def create_lesson(lesson: LessonCreate, db: Session = Depends(get_db), current_u
     return db_lesson
 
 @router.get("/lessons", response_model=List[LessonResponse])
-def get_lessons(unit_id: Optional[int] = None, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_lessons(
+    response: Response,
+    unit_id: Optional[int] = None,
+    page: PageParams = Depends(),
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
     """Get lessons for a unit."""
     query = db.query(Lesson)
     if unit_id:
@@ -205,18 +209,12 @@ def get_lessons(unit_id: Optional[int] = None, db: Session = Depends(get_db), cu
 
     # Check permissions based on unit/course access
     if unit_id:
-        unit = db.query(Unit).filter(Unit.id == unit_id).first()
-        if unit is not None:
-            course = db.query(Course).filter(Course.id == unit.course_id).first()
-            if course is not None:
-                if current_user.role == "student" and course.class_id != current_user.class_id:
-                    raise HTTPException(status_code=403, detail="Access denied")
-                elif current_user.role == "teacher":
-                    db_class = db.query(Class).filter(Class.id == course.class_id, Class.teacher_id == current_user.id).first()
-                    if db_class is None:
-                        raise HTTPException(status_code=403, detail="Access denied")
-
-    return query.all()
+        ancestry = ancestry_resolver.resolve(db, "unit", unit_id)
+        if ancestry is not None:
+            check_read_access(ancestry, current_user)
+
+    lessons, next_cursor = paginate(query, page, Lesson.id)
+    return page_response(response, page, lessons, LessonResponse, next_cursor)
 
 # Material endpoints
 @router.post("/materials/upload")
@@ -226,39 +224,22 @@ async def upload_material(
     content_type: str = Form(...),
     language: Optional[str] = Form("en"),
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """Upload a material file."""
     if current_user.role != "teacher":
         raise HTTPException(status_code=403, detail="Only teachers can upload materials")
 
     # Verify teacher owns the lesson's class
-    lesson = db.query(Lesson).filter(Lesson.id == lesson_id).first()
-    if lesson is None:
+    ancestry = await ancestry_resolver.resolve_async(db, "lesson", lesson_id)
+    if ancestry is None:
         raise HTTPException(status_code=404, detail="Lesson not found")
+    check_write_access(ancestry, current_user)
 
-    unit = db.query(Unit).filter(Unit.id == lesson.unit_id).first()
-    if unit is None:
-        raise HTTPException(status_code=404, detail="Unit not found")
-
-    course = db.query(Course).filter(Course.id == unit.course_id).first()
-    if course is None:
-        raise HTTPException(status_code=404, detail="Course not found")
-
-    db_class = db.query(Class).filter(Class.id == course.class_id, Class.teacher_id == current_user.id).first()
-    if db_class is None:
-        raise HTTPException(status_code=403, detail="Access denied")
-
-    # Generate unique filename
-    file_extension = os.path.splitext(file.filename)[1]
-    unique_filename = f"{uuid.uuid4()}{file_extension}"
-    file_path = os.path.join(UPLOAD_DIR, unique_filename)
-
-    # Save file
-    async with aiofiles.open(file_path, 'wb') as f:
-        content = await file.read()
-        await f.write(content)
+    # Stream the file to disk in chunks, hashing as it goes, then share any identical blob
+    stored = await stage_upload(file, UPLOAD_DIR, content_type)
+    file_path = await acquire_blob(db, stored, UPLOAD_DIR)
 
     # Create material record
     db_material = Material(
@@ -266,16 +247,28 @@ async def upload_material(
         name=name,
         file_path=file_path,
         content_type=content_type,
-        language=language
+        language=language,
+        content_hash=stored.content_hash,
+        size=stored.size
     )
     db.add(db_material)
-    db.commit()
-    db.refresh(db_material)
+    await db.commit()
 
-    return {"message": "Material uploaded successfully", "material_id": db_material.id}
+    return {
+        "message": "Material uploaded successfully",
+        "material_id": db_material.id,
+        "content_hash": stored.content_hash,
+        "size": stored.size
+    }
 
 @router.get("/materials", response_model=List[MaterialResponse])
-def get_materials(lesson_id: Optional[int] = None, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_materials(
+    response: Response,
+    lesson_id: Optional[int] = None,
+    page: PageParams = Depends(),
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
     """Get materials for a lesson."""
     query = db.query(Material)
     if lesson_id:
@@ -283,49 +276,71 @@ def get_materials(lesson_id: Optional[int] = None, db: Session = Depends(get_db)
 
     # Check permissions based on lesson access
     if lesson_id:
-        lesson = db.query(Lesson).filter(Lesson.id == lesson_id).first()
-        if lesson is not None:
-            unit = db.query(Unit).filter(Unit.id == lesson.unit_id).first()
-            if unit is not None:
-                course = db.query(Course).filter(Course.id == unit.course_id).first()
-                if course is not None:
-                    if current_user.role == "student" and course.class_id != current_user.class_id:
-                        raise HTTPException(status_code=403, detail="Access denied")
-                    elif current_user.role == "teacher":
-                        db_class = db.query(Class).filter(Class.id == course.class_id, Class.teacher_id == current_user.id).first()
-                        if db_class is None:
-                            raise HTTPException(status_code=403, detail="Access denied")
-
-    return query.all()
-
-@router.get("/materials/{material_id}/download")
-def download_material(material_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+        ancestry = ancestry_resolver.resolve(db, "lesson", lesson_id)
+        if ancestry is not None:
+            check_read_access(ancestry, current_user)
+
+    materials, next_cursor = paginate(query, page, Material.id)
+    return page_response(response, page, materials, MaterialResponse, next_cursor)
+
+@router.get(
+    "/materials/{material_id}/download",
+    summary="Download Material",
+    description="""
+    Download a material file.
+
+    Supports byte ranges (`Range`, `If-Range`) with `206 Partial Content`, and
+    conditional requests: the response carries `Last-Modified` and an `ETag`
+    derived from the file's content hash (a weak size/mtime tag for files
+    uploaded before content hashing), and `If-None-Match` /
+    `If-Modified-Since` return `304 Not Modified` when the cached copy is
+    current. `Cache-Control` depends on the material's content type.
+    """,
+    responses={
+        206: {"description": "Requested byte range"},
+        304: {"description": "Cached copy is still current"},
+        416: {"description": "Requested range not satisfiable"}
+    }
+)
+def download_material(
+    material_id: int,
+    request: Request,
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
     """Download a material file."""
     material = db.query(Material).filter(Material.id == material_id).first()
     if not material:
         raise HTTPException(status_code=404, detail="Material not found")
 
     # Check permissions
-    lesson = db.query(Lesson).filter(Lesson.id == material.lesson_id).first()
-    if lesson is None:
+    ancestry = ancestry_resolver.resolve(db, "lesson", material.lesson_id)
+    if ancestry is None:
         raise HTTPException(status_code=404, detail="Lesson not found")
+    check_read_access(ancestry, current_user)
 
-    unit = db.query(Unit).filter(Unit.id == lesson.unit_id).first()
-    if unit is None:
-        raise HTTPException(status_code=404, detail="Unit not found")
+    if not os.path.exists(str(material.file_path)):
+        raise HTTPException(status_code=404, detail="File not found")
 
-    course = db.query(Course).filter(Course.id == unit.course_id).first()
-    if course is None:
-        raise HTTPException(status_code=404, detail="Course not found")
+    return material_file_response(request, material)
 
-    if current_user.role == "student" and course.class_id != current_user.class_id:
-        raise HTTPException(status_code=403, detail="Access denied")
-    elif current_user.role == "teacher":
-        db_class = db.query(Class).filter(Class.id == course.class_id, Class.teacher_id == current_user.id).first()
-        if db_class is None:
-            raise HTTPException(status_code=403, detail="Access denied")
+@router.delete("/materials/{material_id}")
+def delete_material(material_id: int, db: Session = Depends(get_db), current_user: CurrentUser = Depends(get_current_user)):
+    """Delete a material, releasing its stored file."""
+    if current_user.role != "teacher":
+        raise HTTPException(status_code=403, detail="Only teachers can delete materials")
 
-    if not os.path.exists(str(material.file_path)):
-        raise HTTPException(status_code=404, detail="File not found")
+    material = db.query(Material).filter(Material.id == material_id).first()
+    if not material:
+        raise HTTPException(status_code=404, detail="Material not found")
+
+    ancestry = ancestry_resolver.resolve(db, "lesson", material.lesson_id)
+    if ancestry is None:
+        raise HTTPException(status_code=404, detail="Lesson not found")
+    check_write_access(ancestry, current_user)
+
+    release_blob(db, material.content_hash)
+    db.delete(material)
+    db.commit()
 
-    return FileResponse(material.file_path, filename=material.name)
+    return {"message": "Material deleted successfully"}
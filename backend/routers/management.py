@@ -1,11 +1,14 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from sqlalchemy import func
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy import func, select
 from pydantic import BaseModel
 from database import get_db
-from models import User, Class, Course, Unit, Lesson, Mastery, Session as UserSession
-from routers.auth import get_current_user
+from models import User, Class, Course, Unit, Lesson, Mastery
+from daily_activity import count_active_users
+from routers.auth import CurrentUser, get_current_user
+from pagination import PageParams, paginate, page_response
+from export import EXPORT_RESPONSES, export_format, export_rows, stream_export
 
 router = APIRouter()
 
@@ -78,7 +81,7 @@ class ManagementOverview(BaseModel):
         403: {"description": "Access denied - Only managers can view overview"}
     }
 )
-def get_management_overview(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_management_overview(db: Session = Depends(get_db), current_user: CurrentUser = Depends(get_current_user)):
     """Get comprehensive overview for managers."""
     if current_user.role != "manager":
         raise HTTPException(status_code=403, detail="Only managers can access management overview")
@@ -93,10 +96,7 @@ def get_management_overview(db: Session = Depends(get_db), current_user: User =
     from datetime import datetime, timedelta
     today = datetime.utcnow().date()
     student_ids_subquery = db.query(User.id).filter(User.role == "student").subquery()
-    active_students_today = db.query(func.count(func.distinct(UserSession.user_id))).filter(
-        UserSession.user_id.in_(student_ids_subquery),
-        func.date(UserSession.start_time) == today
-    ).scalar()
+    active_students_today = count_active_users(db, today, student_ids_subquery)
 
     # Average mastery score across all students
     avg_mastery = db.query(func.avg(Mastery.score)).filter(
@@ -130,22 +130,40 @@ def get_management_overview(db: Session = Depends(get_db), current_user: User =
         403: {"description": "Access denied - Only managers can view teachers"}
     }
 )
-def get_all_teachers(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_all_teachers(
+    response: Response,
+    page: PageParams = Depends(),
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
     """Get list of all teachers with their statistics."""
     if current_user.role != "manager":
         raise HTTPException(status_code=403, detail="Only managers can access teachers list")
 
-    teachers = db.query(User).filter(User.role == "teacher").all()
-    result = []
-
-    for teacher in teachers:
-        # Count classes taught by this teacher
-        class_count = db.query(func.count(Class.id)).filter(Class.teacher_id == teacher.id).scalar()
-
-        # Count students in those classes
-        teacher_class_ids = [c.id for c in db.query(Class.id).filter(Class.teacher_id == teacher.id).all()]
-        student_count = db.query(func.count(User.id)).filter(User.class_id.in_(teacher_class_ids)).scalar() if teacher_class_ids else 0
+    # Aggregate class and student counts per teacher in grouped subqueries
+    class_counts = db.query(
+        Class.teacher_id,
+        func.count(Class.id).label("class_count")
+    ).group_by(Class.teacher_id).subquery()
+
+    student_counts = db.query(
+        Class.teacher_id,
+        func.count(User.id).label("student_count")
+    ).join(User, User.class_id == Class.id).group_by(Class.teacher_id).subquery()
+
+    query = db.query(
+        User,
+        func.coalesce(class_counts.c.class_count, 0),
+        func.coalesce(student_counts.c.student_count, 0)
+    ).outerjoin(
+        class_counts, class_counts.c.teacher_id == User.id
+    ).outerjoin(
+        student_counts, student_counts.c.teacher_id == User.id
+    ).filter(User.role == "teacher")
+    rows, next_cursor = paginate(query, page, User.id)
 
+    result = []
+    for teacher, class_count, student_count in rows:
         result.append(TeacherSummary(
             id=teacher.id,
             username=teacher.username,
@@ -156,7 +174,20 @@ def get_all_teachers(db: Session = Depends(get_db), current_user: User = Depends
             created_at=teacher.created_at.isoformat()
         ))
 
-    return result
+    return page_response(response, page, result, TeacherSummary, next_cursor)
+
+def _student_summary(row) -> StudentSummary:
+    student, class_name, teacher_name, avg_score = row
+    return StudentSummary(
+        id=student.id,
+        username=student.username,
+        full_name=student.full_name,
+        email=student.email,
+        class_name=class_name,
+        teacher_name=teacher_name,
+        mastery_score=round(avg_score or 0.0, 1),
+        created_at=student.created_at.isoformat()
+    )
 
 @router.get(
     "/students",
@@ -169,46 +200,54 @@ def get_all_teachers(db: Session = Depends(get_db), current_user: User = Depends
     - **Class & Teacher**: Their assigned class and teacher
     - **Mastery Score**: Average performance across all topics
 
+    Send `Accept: application/x-ndjson` or `Accept: text/csv` to stream the
+    full roster instead of a paginated JSON list.
+
     **Note**: Only managers can access this endpoint.
     """,
     responses={
-        200: {"description": "Students list retrieved successfully"},
+        200: {"description": "Students list retrieved successfully", **EXPORT_RESPONSES},
         403: {"description": "Access denied - Only managers can view students"}
     }
 )
-def get_all_students(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_all_students(
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(),
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
     """Get list of all students with their assignments and performance."""
     if current_user.role != "manager":
         raise HTTPException(status_code=403, detail="Only managers can access students list")
 
-    students = db.query(User).filter(User.role == "student").all()
-    result = []
-
-    for student in students:
-        # Get class and teacher info
-        class_name = None
-        teacher_name = None
-        if student.student_class:
-            class_name = student.student_class.name
-            teacher_name = student.student_class.teacher.full_name
-
-        # Get average mastery score
-        avg_mastery = db.query(func.avg(Mastery.score)).filter(
-            Mastery.user_id == student.id
-        ).scalar() or 0.0
-
-        result.append(StudentSummary(
-            id=student.id,
-            username=student.username,
-            full_name=student.full_name,
-            email=student.email,
-            class_name=class_name,
-            teacher_name=teacher_name,
-            mastery_score=round(avg_mastery, 1),
-            created_at=student.created_at.isoformat()
-        ))
-
-    return result
+    # Join class and teacher instead of loading them per row; the mastery average
+    # is looked up per returned student through the masteries index, not grouped
+    # over the whole table
+    teacher = aliased(User)
+    avg_mastery = select(func.avg(Mastery.score)).where(
+        Mastery.user_id == User.id
+    ).correlate(User).scalar_subquery()
+
+    query = db.query(
+        User,
+        Class.name,
+        teacher.full_name,
+        avg_mastery
+    ).outerjoin(
+        Class, Class.id == User.class_id
+    ).outerjoin(
+        teacher, teacher.id == Class.teacher_id
+    ).filter(User.role == "student")
+
+    media_type = export_format(request)
+    if media_type:
+        rows = export_rows(query, page, User.id)
+        return stream_export(media_type, rows, _student_summary, StudentSummary, page.fields, "students")
+
+    rows, next_cursor = paginate(query, page, User.id)
+    result = [_student_summary(row) for row in rows]
+    return page_response(response, page, result, StudentSummary, next_cursor)
 
 @router.get(
     "/classes",
@@ -229,32 +268,67 @@ def get_all_students(db: Session = Depends(get_db), current_user: User = Depends
         403: {"description": "Access denied - Only managers can view classes"}
     }
 )
-def get_all_classes(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_all_classes(
+    response: Response,
+    page: PageParams = Depends(),
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
     """Get list of all classes with their statistics."""
     if current_user.role != "manager":
         raise HTTPException(status_code=403, detail="Only managers can access classes list")
 
-    classes = db.query(Class).all()
-    result = []
-
-    for class_obj in classes:
-        # Count students in this class
-        student_count = db.query(func.count(User.id)).filter(User.class_id == class_obj.id).scalar()
-
-        # Count courses in this class
-        course_count = db.query(func.count(Course.id)).filter(Course.class_id == class_obj.id).scalar()
+    teacher = aliased(User)
+    student_counts = db.query(
+        User.class_id,
+        func.count(User.id).label("student_count")
+    ).filter(User.class_id.isnot(None)).group_by(User.class_id).subquery()
+
+    course_counts = db.query(
+        Course.class_id,
+        func.count(Course.id).label("course_count")
+    ).group_by(Course.class_id).subquery()
+
+    query = db.query(
+        Class,
+        teacher.full_name,
+        func.coalesce(student_counts.c.student_count, 0),
+        func.coalesce(course_counts.c.course_count, 0)
+    ).join(
+        teacher, teacher.id == Class.teacher_id
+    ).outerjoin(
+        student_counts, student_counts.c.class_id == Class.id
+    ).outerjoin(
+        course_counts, course_counts.c.class_id == Class.id
+    )
+    rows, next_cursor = paginate(query, page, Class.id)
 
+    result = []
+    for class_obj, teacher_name, student_count, course_count in rows:
         result.append(ClassSummary(
             id=class_obj.id,
             name=class_obj.name,
             subject=class_obj.subject,
-            teacher_name=class_obj.teacher.full_name,
+            teacher_name=teacher_name,
             student_count=student_count,
             course_count=course_count,
             created_at=class_obj.created_at.isoformat()
         ))
 
-    return result
+    return page_response(response, page, result, ClassSummary, next_cursor)
+
+def _lesson_summary(row) -> LessonSummary:
+    lesson, unit_name, course_name, class_name, teacher_name, question_count = row
+    return LessonSummary(
+        id=lesson.id,
+        title=lesson.title,
+        unit_name=unit_name,
+        course_name=course_name,
+        class_name=class_name,
+        teacher_name=teacher_name,
+        question_count=question_count,
+        created_at=lesson.created_at.isoformat()
+    )
 
 @router.get(
     "/lessons",
@@ -267,40 +341,56 @@ def get_all_classes(db: Session = Depends(get_db), current_user: User = Depends(
     - **Hierarchy**: Unit → Course → Class → Teacher
     - **Content**: Number of questions in the lesson
 
+    Send `Accept: application/x-ndjson` or `Accept: text/csv` to stream every
+    lesson instead of a paginated JSON list.
+
     **Note**: Only managers can access this endpoint.
     """,
     responses={
-        200: {"description": "Lessons list retrieved successfully"},
+        200: {"description": "Lessons list retrieved successfully", **EXPORT_RESPONSES},
         403: {"description": "Access denied - Only managers can view lessons"}
     }
 )
-def get_all_lessons(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_all_lessons(
+    request: Request,
+    response: Response,
+    page: PageParams = Depends(),
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
     """Get list of all lessons with their relationships."""
     if current_user.role != "manager":
         raise HTTPException(status_code=403, detail="Only managers can access lessons list")
 
     from models import Question
-    lessons = db.query(Lesson).join(Unit).join(Course).join(Class).all()
-    result = []
+    teacher = aliased(User)
+    # Counted per returned lesson through the lesson_id index
+    question_count = select(func.count(Question.id)).where(
+        Question.lesson_id == Lesson.id
+    ).correlate(Lesson).scalar_subquery()
+
+    query = db.query(
+        Lesson,
+        Unit.name,
+        Course.name,
+        Class.name,
+        teacher.full_name,
+        question_count
+    ).join(
+        Unit, Unit.id == Lesson.unit_id
+    ).join(
+        Course, Course.id == Unit.course_id
+    ).join(
+        Class, Class.id == Course.class_id
+    ).join(
+        teacher, teacher.id == Class.teacher_id
+    )
 
-    for lesson in lessons:
-        # Count questions in this lesson
-        question_count = db.query(func.count(Question.id)).filter(Question.lesson_id == lesson.id).scalar()
-
-        # Get hierarchical info
-        unit = lesson.unit
-        course = unit.course
-        class_obj = course.class_
-
-        result.append(LessonSummary(
-            id=lesson.id,
-            title=lesson.title,
-            unit_name=unit.name,
-            course_name=course.name,
-            class_name=class_obj.name,
-            teacher_name=class_obj.teacher.full_name,
-            question_count=question_count,
-            created_at=lesson.created_at.isoformat()
-        ))
+    media_type = export_format(request)
+    if media_type:
+        rows = export_rows(query, page, Lesson.id)
+        return stream_export(media_type, rows, _lesson_summary, LessonSummary, page.fields, "lessons")
 
-    return result
+    rows, next_cursor = paginate(query, page, Lesson.id)
+    result = [_lesson_summary(row) for row in rows]
+    return page_response(response, page, result, LessonSummary, next_cursor)
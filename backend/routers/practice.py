@@ -1,16 +1,33 @@
+from dataclasses import dataclass
 from datetime import datetime
-from typing import List, Optional, Dict, Any
-from fastapi import APIRouter, Depends, HTTPException, status
+from typing import List, Optional, Dict, Any, Tuple
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Response, status
+from sqlalchemy import event
 from sqlalchemy.orm import Session
-from pydantic import BaseModel
-from database import get_db
-from models import User, Question, UserAnswer, Mastery, Gamification
-from routers.auth import get_current_user
+from pydantic import BaseModel, Field
+from cache import TTLCache
+from database import Base, get_db
+from models import User, Question, Mastery, Gamification
+from routers.auth import CurrentUser, get_current_user
+from question_bank import question_bank
+from answers import AnswerInput, AnswerOutcome, apply_answers
+import adaptive
+import practice_queues
+import spaced_repetition
+import write_behind
 import json
-import random
+import os
 
 router = APIRouter()
 
+# Largest offline queue accepted by one bulk submission
+MAX_BULK_ANSWERS = int(os.getenv("MAX_BULK_ANSWERS", "500"))
+
+# Serialized question payloads, keyed by (question id, version)
+QUESTION_PAYLOAD_CACHE_TTL_SECONDS = float(os.getenv("QUESTION_PAYLOAD_CACHE_TTL_SECONDS", "3600"))
+QUESTION_PAYLOAD_CACHE_MAX_SIZE = int(os.getenv("QUESTION_PAYLOAD_CACHE_MAX_SIZE", "20000"))
+question_payloads = TTLCache(maxsize=QUESTION_PAYLOAD_CACHE_MAX_SIZE, ttl_seconds=QUESTION_PAYLOAD_CACHE_TTL_SECONDS)
+
 # Pydantic models
 class QuestionResponse(BaseModel):
     id: int
@@ -35,6 +52,18 @@ class AnswerResponse(BaseModel):
     points_earned: int
     mastery_increased: bool
 
+class BulkAnswerItem(AnswerSubmit):
+    question_id: int
+    answered_at: Optional[datetime] = None  # Client timestamp of the answer
+
+class BulkAnswerSubmit(BaseModel):
+    answers: List[BulkAnswerItem] = Field(..., min_length=1, max_length=MAX_BULK_ANSWERS)
+
+class BulkAnswerResult(BaseModel):
+    question_id: int
+    status: str  # "applied" or "not_found"
+    result: Optional[AnswerResponse] = None
+
 class HintResponse(BaseModel):
     hint: str
     hint_level: int
@@ -45,183 +74,227 @@ class MasteryResponse(BaseModel):
     score: float
     level: str
 
+@dataclass(frozen=True)
+class QuestionPayload:
+    """What the practice endpoints serve for one version of a question."""
+    body: bytes  # JSON-encoded QuestionResponse
+    hints: Tuple[str, str, str]
+
+def _question_hints(question: Question) -> Tuple[str, str, str]:
+    if question.question_type == "mcq":
+        first = "Look at the options carefully and eliminate obviously wrong answers."
+        second = "Consider which answer relates most directly to the question."
+    else:
+        first = "Think about the key concepts covered in this lesson."
+        second = "Recall the main formula or principle that applies here."
+    return first, second, f"The answer involves: {question.correct_answer[:10]}..."
+
+def _cached_payload(question: Question) -> QuestionPayload:
+    """Return the payload of a loaded question, serializing it on a cache miss."""
+    key = (question.id, question.version)
+    payload = question_payloads.get(key)
+    if payload is None:
+        payload = QuestionPayload(
+            body=QuestionResponse(
+                id=question.id,
+                question_text=question.question_text,
+                question_type=question.question_type,
+                difficulty=question.difficulty,
+                subject=question.subject,
+                options=json.loads(question.options) if question.options else None
+            ).model_dump_json().encode(),
+            hints=_question_hints(question)
+        )
+        question_payloads.set(key, payload)
+    return payload
+
+def _load_payload(db: Session, question_id: int) -> Optional[QuestionPayload]:
+    """Return a question's payload, reading only its version on a cache hit; None if it does not exist."""
+    version = db.query(Question.version).filter(Question.id == question_id).scalar()
+    if version is None:
+        return None
+    payload = question_payloads.get((question_id, version))
+    if payload is None:
+        question = db.query(Question).filter(Question.id == question_id).first()
+        if question is None:
+            return None
+        payload = _cached_payload(question)
+    return payload
+
+@event.listens_for(Base.metadata, "after_drop")
+def _clear_question_payloads(target, connection, **kw):
+    # Recreated tables reuse ids and versions
+    question_payloads.clear()
+
+def _answer_response(outcome: AnswerOutcome) -> AnswerResponse:
+    return AnswerResponse(
+        is_correct=outcome.is_correct,
+        correct_answer=outcome.question.correct_answer,
+        explanation="Great job!" if outcome.is_correct else "Keep practicing!",
+        points_earned=outcome.points_earned,
+        mastery_increased=outcome.mastery_increased
+    )
+
 # Practice endpoints
 @router.get("/questions/next", response_model=QuestionResponse)
 def get_next_question(
     lesson_id: Optional[int] = None,
     unit_id: Optional[int] = None,
     subject: Optional[str] = None,
+    mode: str = Query("practice", pattern="^(practice|review)$",
+                      description="practice: chosen by the question selector; review: the most overdue review"),
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
-    """Get the next question for practice based on user's mastery level."""
+    """Get the next question for practice, or in review mode the question that has been due longest."""
     if current_user.role != "student":
         raise HTTPException(status_code=403, detail="Only students can access practice questions")
 
-    # Build query based on filters
-    query = db.query(Question)
-
-    if lesson_id:
-        query = query.filter(Question.lesson_id == lesson_id)
-    elif unit_id:
-        # Get all lessons in the unit
-        from models import Lesson
-        lesson_ids = db.query(Lesson.id).filter(Lesson.unit_id == unit_id).all()
-        lesson_ids = [l.id for l in lesson_ids]
-        if lesson_ids:
-            query = query.filter(Question.lesson_id.in_(lesson_ids))
-    elif subject:
-        query = query.filter(Question.subject == subject)
-
-    questions = query.all()
-    if not questions:
+    if mode == "review":
+        question = spaced_repetition.most_overdue(
+            db, current_user.id, datetime.utcnow(), lesson_id=lesson_id, unit_id=unit_id, subject=subject
+        )
+        if question is None:
+            raise HTTPException(status_code=404, detail="No questions due for review")
+        return Response(content=_cached_payload(question).body, media_type="application/json")
+
+    # Selectors pick from the in-memory question index instead of a table scan
+    if practice_queues.PRACTICE_QUEUES:
+        selected = practice_queues.practice_queues.next_question(
+            db, current_user.id, question_bank.scope_key(lesson_id, unit_id, subject)
+        )
+    else:
+        selected = adaptive.question_selector.select(
+            db, current_user.id, lesson_id=lesson_id, unit_id=unit_id, subject=subject
+        )
+    if selected is None:
         raise HTTPException(status_code=404, detail="No questions available for the specified criteria")
 
-    # Get user's mastery levels for these questions
-    question_ids = [q.id for q in questions]
-    user_answers = db.query(UserAnswer).filter(
-        UserAnswer.user_id == current_user.id,
-        UserAnswer.question_id.in_(question_ids)
-    ).all()
-
-    # Calculate mastery scores
-    question_mastery = {}
-    for answer in user_answers:
-        if answer.is_correct:
-            question_mastery[answer.question_id] = min(100, (question_mastery.get(answer.question_id, 0) + 20))
-        else:
-            question_mastery[answer.question_id] = max(0, question_mastery.get(answer.question_id, 0) - 10)
-
-    # Select question with lowest mastery or random if all equal
-    min_mastery = min(question_mastery.values()) if question_mastery else 0
-    candidates = [q for q in questions if question_mastery.get(q.id, 0) == min_mastery]
-
-    selected_question = random.choice(candidates)
-
-    # Prepare response data
-    response_data = {
-        "id": selected_question.id,
-        "question_text": selected_question.question_text,
-        "question_type": selected_question.question_type,
-        "difficulty": selected_question.difficulty,
-        "subject": selected_question.subject,
-        "options": json.loads(selected_question.options) if selected_question.options else None
-    }
+    payload = _load_payload(db, selected.id)
+    if payload is None:
+        # Index was stale (question removed by another process)
+        question_bank.invalidate()
+        raise HTTPException(status_code=404, detail="No questions available for the specified criteria")
 
-    return QuestionResponse(**response_data)
+    # Already serialized: skip response model validation and encoding
+    return Response(content=payload.body, media_type="application/json")
 
 @router.post("/questions/{question_id}/answer", response_model=AnswerResponse)
 def submit_answer(
     question_id: int,
     answer_data: AnswerSubmit,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """Submit an answer to a question and get feedback."""
     if current_user.role != "student":
         raise HTTPException(status_code=403, detail="Only students can submit answers")
 
-    # Get the question
-    question = db.query(Question).filter(Question.id == question_id).first()
-    if not question:
-        raise HTTPException(status_code=404, detail="Question not found")
-
-    # Check if answer is correct
-    is_correct = answer_data.answer.strip().lower() == question.correct_answer.strip().lower()
+    journal = write_behind.answer_journal
+    if journal is not None:
+        # Write-behind: journal the answer and respond; it is committed with the next group
+        question = db.query(Question).filter(Question.id == question_id).first()
+        if not question:
+            raise HTTPException(status_code=404, detail="Question not found")
+        is_correct, points_earned = journal.append(
+            current_user.id, current_user.class_id, question,
+            answer_data.answer, answer_data.time_taken, answer_data.hints_used
+        )
+        adaptive.question_selector.record_answer(
+            db, current_user.id, question, is_correct, answer_data.time_taken, answer_data.hints_used
+        )
+        practice_queues.schedule_refill(db, current_user.id, background_tasks)
+        return _answer_response(AnswerOutcome(
+            question=question, is_correct=is_correct, points_earned=points_earned, mastery_increased=is_correct
+        ))
 
-    # Create user answer record
-    user_answer = UserAnswer(
-        user_id=current_user.id,
+    outcome = apply_answers(db, current_user.id, current_user.class_id, [AnswerInput(
         question_id=question_id,
         answer=answer_data.answer,
-        is_correct=is_correct,
         time_taken=answer_data.time_taken,
-        hints_used=answer_data.hints_used or 0
-    )
-    db.add(user_answer)
-
-    # Update mastery
-    mastery_topic = f"{question.subject}_{question.difficulty}"
-    mastery = db.query(Mastery).filter(
-        Mastery.user_id == current_user.id,
-        Mastery.topic == mastery_topic
-    ).first()
-
-    if mastery:
-        if is_correct:
-            mastery.score = min(100, mastery.score + 5)
-        else:
-            mastery.score = max(0, mastery.score - 2)
-        mastery.updated_at = datetime.utcnow()
-    else:
-        mastery = Mastery(
-            user_id=current_user.id,
-            topic=mastery_topic,
-            score=5 if is_correct else 0
-        )
-        db.add(mastery)
-
-    # Update gamification
-    gamification = db.query(Gamification).filter(Gamification.user_id == current_user.id).first()
-    if not gamification:
-        gamification = Gamification(user_id=current_user.id, points=0, streak=0)
-        db.add(gamification)
-
-    points_earned = 0
-    if is_correct:
-        points_earned = 10 + (5 if answer_data.time_taken and answer_data.time_taken < 60 else 0)  # Bonus for quick answers
-        gamification.points += points_earned
-        gamification.streak += 1
-    else:
-        gamification.streak = 0
-
-    gamification.updated_at = datetime.utcnow()
+        hints_used=answer_data.hints_used
+    )])[0]
+    if outcome.question is None:
+        raise HTTPException(status_code=404, detail="Question not found")
 
     db.commit()
-
-    # Generate response
-    mastery_increased = is_correct and mastery.score > (mastery.score - 5)
-
-    return AnswerResponse(
-        is_correct=is_correct,
-        correct_answer=question.correct_answer,
-        explanation="Great job!" if is_correct else "Keep practicing!",
-        points_earned=points_earned,
-        mastery_increased=mastery_increased
+    adaptive.question_selector.record_answer(
+        db, current_user.id, outcome.question, outcome.is_correct, answer_data.time_taken, answer_data.hints_used
     )
+    practice_queues.schedule_refill(db, current_user.id, background_tasks)
+
+    return _answer_response(outcome)
+
+@router.post(
+    "/answers/bulk",
+    response_model=List[BulkAnswerResult],
+    summary="Submit Answers in Bulk",
+    description=f"""
+    Submit a queue of answers recorded offline, in the order they were given.
+
+    All answers are applied in one transaction, exactly as if they had been
+    submitted one by one, and a result is returned for each in request order.
+    `answered_at` is the client's timestamp for the answer (clamped to the
+    server's current time). Answers to questions that no longer exist are
+    skipped and reported with `status: "not_found"`. At most
+    {MAX_BULK_ANSWERS} answers per request.
+    """
+)
+def submit_answers_bulk(
+    submission: BulkAnswerSubmit,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    """Submit several answers in one transaction."""
+    if current_user.role != "student":
+        raise HTTPException(status_code=403, detail="Only students can submit answers")
+
+    outcomes = apply_answers(db, current_user.id, current_user.class_id, [
+        AnswerInput(
+            question_id=item.question_id,
+            answer=item.answer,
+            time_taken=item.time_taken,
+            hints_used=item.hints_used,
+            answered_at=item.answered_at
+        )
+        for item in submission.answers
+    ])
+    db.commit()
+    for item, outcome in zip(submission.answers, outcomes):
+        if outcome.question is not None:
+            adaptive.question_selector.record_answer(
+                db, current_user.id, outcome.question, outcome.is_correct, item.time_taken, item.hints_used
+            )
+    practice_queues.schedule_refill(db, current_user.id, background_tasks)
+
+    return [
+        BulkAnswerResult(question_id=item.question_id, status="not_found")
+        if outcome.question is None else
+        BulkAnswerResult(question_id=item.question_id, status="applied", result=_answer_response(outcome))
+        for item, outcome in zip(submission.answers, outcomes)
+    ]
 
 @router.get("/questions/{question_id}/hints", response_model=HintResponse)
 def get_hint(
     question_id: int,
     hint_level: int = 1,
     db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    current_user: CurrentUser = Depends(get_current_user)
 ):
     """Get a hint for a question."""
     if current_user.role != "student":
         raise HTTPException(status_code=403, detail="Only students can request hints")
 
-    question = db.query(Question).filter(Question.id == question_id).first()
-    if not question:
+    payload = _load_payload(db, question_id)
+    if payload is None:
         raise HTTPException(status_code=404, detail="Question not found")
 
-    # Generate hints based on question type and level
-    total_hints = 3  # Default number of hints
-
-    if hint_level == 1:
-        if question.question_type == "mcq":
-            hint = "Look at the options carefully and eliminate obviously wrong answers."
-        else:
-            hint = "Think about the key concepts covered in this lesson."
-    elif hint_level == 2:
-        if question.question_type == "mcq":
-            hint = "Consider which answer relates most directly to the question."
-        else:
-            hint = "Recall the main formula or principle that applies here."
-    elif hint_level == 3:
-        hint = f"The answer involves: {question.correct_answer[:10]}..."
-    else:
+    total_hints = len(payload.hints)
+    if not 1 <= hint_level <= total_hints:
         raise HTTPException(status_code=400, detail="Invalid hint level")
+    hint = payload.hints[hint_level - 1]
 
     return HintResponse(
         hint=hint,
@@ -230,47 +303,55 @@ def get_hint(
     )
 
 @router.get("/mastery", response_model=List[MasteryResponse])
-def get_mastery_scores(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_mastery_scores(db: Session = Depends(get_db), current_user: CurrentUser = Depends(get_current_user)):
     """Get user's mastery scores for all topics."""
     if current_user.role != "student":
         raise HTTPException(status_code=403, detail="Only students have mastery scores")
 
-    masteries = db.query(Mastery).filter(Mastery.user_id == current_user.id).all()
+    with write_behind.pending_answers(current_user.id) as pending:
+        masteries = db.query(Mastery).filter(Mastery.user_id == current_user.id).all()
+    scores = write_behind.overlay_masteries({m.topic: m.score for m in masteries}, pending)
 
     response = []
-    for mastery in masteries:
+    for topic, score in scores.items():
         level = "Beginner"
-        if mastery.score >= 80:
+        if score >= 80:
             level = "Expert"
-        elif mastery.score >= 60:
+        elif score >= 60:
             level = "Advanced"
-        elif mastery.score >= 40:
+        elif score >= 40:
             level = "Intermediate"
 
         response.append(MasteryResponse(
-            topic=mastery.topic,
-            score=mastery.score,
+            topic=topic,
+            score=score,
             level=level
         ))
 
     return response
 
 @router.get("/gamification")
-def get_gamification_data(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_gamification_data(db: Session = Depends(get_db), current_user: CurrentUser = Depends(get_current_user)):
     """Get user's gamification data."""
     if current_user.role != "student":
         raise HTTPException(status_code=403, detail="Only students have gamification data")
 
-    gamification = db.query(Gamification).filter(Gamification.user_id == current_user.id).first()
-    if not gamification:
+    with write_behind.pending_answers(current_user.id) as pending:
+        gamification = db.query(Gamification).filter(Gamification.user_id == current_user.id).first()
+    if not gamification and not pending:
         return {
             "points": 0,
             "badges": [],
             "streak": 0
         }
 
+    points, streak = write_behind.overlay_gamification(
+        gamification.points if gamification else 0,
+        gamification.streak if gamification else 0,
+        pending
+    )
     return {
-        "points": gamification.points,
-        "badges": json.loads(gamification.badges) if gamification.badges else [],
-        "streak": gamification.streak
+        "points": points,
+        "badges": json.loads(gamification.badges) if gamification and gamification.badges else [],
+        "streak": streak
     }
@@ -0,0 +1,95 @@
+"""
+SM-2 spaced-repetition scheduling of practice questions.
+
+Every answer grades a review from 0-5 and moves the question's schedule for
+that student: a passing review (3 or more) multiplies the interval by the
+question's easiness factor (1, then 6 days, then interval * EF), a failed one
+brings the question back the next day, and the easiness factor is raised or
+lowered by how easy the review was. Passing a question again before it is
+due leaves its schedule alone. The state lives on question_masteries,
+next to the mastery score, with the next due time indexed by
+(user_id, due_at), so the most overdue question is the first index entry at
+or before now rather than a scan of the student's answers.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from database import naive_utc
+from models import Lesson, Question, QuestionMastery
+
+INITIAL_EASINESS = 2.5
+MIN_EASINESS = 1.3
+PASSING_QUALITY = 3
+FIRST_INTERVAL_DAYS = 1
+SECOND_INTERVAL_DAYS = 6
+LAPSE_INTERVAL_DAYS = 1
+MAX_INTERVAL_DAYS = 365
+# A correct answer this slow, or with a hint, is a harder review
+SLOW_REVIEW_SECONDS = 60
+
+@dataclass(frozen=True)
+class ReviewState:
+    """SM-2 state of one question for one student."""
+    easiness: float = INITIAL_EASINESS
+    interval_days: float = 0
+    repetitions: int = 0
+    due_at: Optional[datetime] = None
+
+def review_quality(is_correct: bool, time_taken: Optional[float], hints_used: Optional[int]) -> int:
+    """Grade an answer as an SM-2 review: 5 easy recall down to 1 for a wrong answer."""
+    if not is_correct:
+        return 1
+    if (hints_used or 0) >= 2:
+        return 3
+    if hints_used or (time_taken is not None and time_taken >= SLOW_REVIEW_SECONDS):
+        return 4
+    return 5
+
+def next_review(state: ReviewState, quality: int, reviewed_at: datetime) -> ReviewState:
+    """Apply one graded review at `reviewed_at` to a schedule."""
+    if quality < PASSING_QUALITY:
+        repetitions = 0
+        interval_days = LAPSE_INTERVAL_DAYS
+    elif state.due_at is not None and reviewed_at < naive_utc(state.due_at):
+        # Passing an item again before it is due (e.g. repeated in one session) does not lengthen its interval
+        return state
+    else:
+        if state.repetitions == 0:
+            interval_days = FIRST_INTERVAL_DAYS
+        elif state.repetitions == 1:
+            interval_days = SECOND_INTERVAL_DAYS
+        else:
+            interval_days = min(MAX_INTERVAL_DAYS, round(state.interval_days * state.easiness))
+        repetitions = state.repetitions + 1
+    easiness = state.easiness + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02)
+    return ReviewState(
+        easiness=max(MIN_EASINESS, easiness),
+        interval_days=interval_days,
+        repetitions=repetitions,
+        due_at=reviewed_at + timedelta(days=interval_days)
+    )
+
+def most_overdue(
+    db: Session,
+    user_id: int,
+    now: datetime,
+    lesson_id: Optional[int] = None,
+    unit_id: Optional[int] = None,
+    subject: Optional[str] = None
+) -> Optional[Question]:
+    """Return the student's question that has been due the longest, within the most specific scope given."""
+    query = db.query(Question).join(QuestionMastery, QuestionMastery.question_id == Question.id).filter(
+        QuestionMastery.user_id == user_id,
+        QuestionMastery.due_at <= now
+    )
+    if lesson_id:
+        query = query.filter(Question.lesson_id == lesson_id)
+    elif unit_id:
+        query = query.join(Lesson, Lesson.id == Question.lesson_id).filter(Lesson.unit_id == unit_id)
+    elif subject:
+        query = query.filter(Question.subject == subject)
+    return query.order_by(QuestionMastery.due_at).first()
@@ -8,17 +8,20 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from database import Base, get_db
+from sqlalchemy.pool import NullPool
+from database import Base, get_db, get_async_db, make_async_url
 from models import (
     User, Class, Course, Unit, Lesson, Material, Question, UserAnswer,
-    Mastery, Gamification, Session as UserSession, Progress, Intervention
+    Mastery, Gamification, Session as UserSession, Progress, Intervention, ClassRollup
 )
+import class_rollups
 
 # Import the app components
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from routers import auth, analytics
+from routers import auth, analytics, practice
 
 # Create a test app
 app = FastAPI()
@@ -31,11 +34,15 @@ app.add_middleware(
 )
 app.include_router(auth.router, prefix="/auth", tags=["authentication"])
 app.include_router(analytics.router, prefix="/api/analytics", tags=["analytics"])
+app.include_router(practice.router, prefix="/api/practice", tags=["practice"])
 
 # Test database
 TEST_DATABASE_URL = "sqlite:///./test_analytics.db"
 engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# NullPool: TestClient may run each request on a fresh event loop
+async_engine = create_async_engine(make_async_url(TEST_DATABASE_URL), poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
 
 def override_get_db():
     """Override get_db for testing."""
@@ -47,6 +54,13 @@ def override_get_db():
 
 app.dependency_overrides[get_db] = override_get_db
 
+async def override_get_async_db():
+    """Override get_async_db for testing."""
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
+app.dependency_overrides[get_async_db] = override_get_async_db
+
 client = TestClient(app)
 
 @pytest.fixture(scope="function", autouse=True)
@@ -322,6 +336,19 @@ def test_class_progress(teacher_token, setup_test_data):
     assert "struggling_students" in lesson_data
     assert "completed_students" in lesson_data
 
+def test_class_progress_csv_export(teacher_token, setup_test_data):
+    """Test streaming class progress as CSV."""
+    import csv
+    class_id = setup_test_data["class_id"]
+    headers = {"Authorization": f"Bearer {teacher_token}", "Accept": "text/csv"}
+
+    response = client.get(f"/api/analytics/classes/{class_id}/progress", headers=headers)
+    assert response.status_code == 200
+    rows = list(csv.DictReader(response.text.splitlines()))
+    assert len(rows) == 1
+    assert rows[0]["lesson_title"] == "Solving Equations"
+    assert float(rows[0]["average_completion"]) == 75.0
+
 def test_class_progress_unauthorized(teacher_token):
     """Test accessing progress for class not owned by teacher."""
     # Try to access class that doesn't exist or isn't owned
@@ -434,6 +461,124 @@ def test_interventions_filtering(teacher_token, setup_test_data):
         if item["priority"] == "high":
             assert item["description"] == "High priority intervention"
 
+def test_interventions_paginated(teacher_token, setup_test_data):
+    """Test that intervention pages follow created_at order without gaps or repeats."""
+    student_id = setup_test_data["student_ids"][0]
+    headers = {"Authorization": f"Bearer {teacher_token}"}
+
+    created_ids = []
+    for i in range(3):
+        response = client.post("/api/analytics/interventions", json={
+            "student_id": student_id,
+            "intervention_type": "remedial",
+            "description": f"Intervention {i}"
+        }, headers=headers)
+        created_ids.append(response.json()["intervention_id"])
+
+    seen = []
+    cursor = None
+    while True:
+        path = "/api/analytics/interventions?limit=1" + (f"&after={cursor}" if cursor else "")
+        response = client.get(path, headers=headers)
+        assert response.status_code == 200
+        seen.extend(item["id"] for item in response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+
+    assert seen == sorted(created_ids, reverse=True)
+
+def test_dashboard_matches_raw_tables(teacher_token, setup_test_data):
+    """Test that rollup-backed dashboard metrics match the underlying tables."""
+    data = client.get("/api/analytics/dashboard", headers={"Authorization": f"Bearer {teacher_token}"}).json()
+
+    db = TestingSessionLocal()
+    try:
+        student_ids = setup_test_data["student_ids"]
+        scores = [m.score for m in db.query(Mastery).filter(Mastery.user_id.in_(student_ids))]
+        assert data["average_mastery_score"] == round(sum(scores) / len(scores), 1)
+        assert data["total_questions_attempted"] == db.query(UserAnswer).filter(UserAnswer.user_id.in_(student_ids)).count()
+        assert data["active_students_today"] == 5
+        assert len(data["top_performing_students"]) == 5
+        assert data["refreshed_at"] is not None
+    finally:
+        db.close()
+
+def test_dashboard_rollup_updated_by_answers(teacher_token, setup_test_data):
+    """Test that submitting an answer updates the class rollup without a recompute."""
+    headers = {"Authorization": f"Bearer {teacher_token}"}
+    before = client.get("/api/analytics/dashboard", headers=headers).json()
+
+    db = TestingSessionLocal()
+    try:
+        student = db.query(User).filter(User.id == setup_test_data["student_ids"][0]).one()
+        question = db.query(Question).first()
+        student_headers = {"Authorization": f"Bearer {auth.create_access_token({'sub': student.username})}"}
+    finally:
+        db.close()
+
+    response = client.post(f"/api/practice/questions/{question.id}/answer", json={"answer": "4"}, headers=student_headers)
+    assert response.status_code == 200
+
+    after = client.get("/api/analytics/dashboard", headers=headers).json()
+    assert after["total_questions_attempted"] == before["total_questions_attempted"] + 1
+    assert after["refreshed_at"] == before["refreshed_at"]
+
+    # A full recompute agrees with the incrementally maintained values
+    db = TestingSessionLocal()
+    try:
+        class_rollups.refresh_class_rollups(db, [setup_test_data["class_id"]])
+    finally:
+        db.close()
+    recomputed = client.get("/api/analytics/dashboard", headers=headers).json()
+    assert recomputed["total_questions_attempted"] == after["total_questions_attempted"]
+    assert recomputed["average_mastery_score"] == after["average_mastery_score"]
+
+def test_dashboard_refreshes_stale_rollups(teacher_token, setup_test_data, monkeypatch):
+    """Test that stale rollups are served and then refreshed in the background."""
+    headers = {"Authorization": f"Bearer {teacher_token}"}
+    client.get("/api/analytics/dashboard", headers=headers)
+    monkeypatch.setattr(class_rollups, "DASHBOARD_ROLLUP_TTL_SECONDS", 0)
+
+    db = TestingSessionLocal()
+    try:
+        rollup = db.get(ClassRollup, setup_test_data["class_id"])
+        rollup.total_students = 99
+        db.commit()
+    finally:
+        db.close()
+
+    stale = client.get("/api/analytics/dashboard", headers=headers).json()
+    assert stale["total_students"] == 99
+
+    fresh = client.get("/api/analytics/dashboard", headers=headers).json()
+    assert fresh["total_students"] == 5
+    assert fresh["refreshed_at"] > stale["refreshed_at"]
+
+def test_rollup_freshness_with_aware_timestamps(teacher_token, setup_test_data):
+    """Test that rollup times read back timezone-aware (as on PostgreSQL) are compared as UTC."""
+    from datetime import timezone
+    from fastapi import BackgroundTasks
+    headers = {"Authorization": f"Bearer {teacher_token}"}
+    client.get("/api/analytics/dashboard", headers=headers)
+    class_id = setup_test_data["class_id"]
+    # UTC+2, so the local date may differ from the UTC date
+    plus_two = timezone(timedelta(hours=2))
+
+    db = TestingSessionLocal()
+    try:
+        rollup = db.get(ClassRollup, class_id)
+        rollup.refreshed_at = datetime.now(plus_two)
+        tasks = BackgroundTasks()
+        assert class_rollups.load_class_rollups(db, [class_id], tasks) == [rollup]
+        assert tasks.tasks == []
+
+        rollup.refreshed_at = datetime.now(plus_two) - timedelta(seconds=class_rollups.DASHBOARD_ROLLUP_TTL_SECONDS + 60)
+        class_rollups.load_class_rollups(db, [class_id], tasks)
+        assert len(tasks.tasks) == 1
+    finally:
+        db.close()
+
 def test_dashboard_empty_teacher():
     """Test dashboard for teacher with no classes/students."""
     # Register teacher with no classes
@@ -6,9 +6,11 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from database import Base, get_db
+from sqlalchemy.pool import NullPool
+from database import Base, get_db, get_async_db, make_async_url
 from models import User, Class, Course, Unit, Lesson, Material, Question, UserAnswer, Mastery, Gamification  # Import all models to register them
 from routers.auth import get_password_hash
 
@@ -32,6 +34,9 @@ app.include_router(auth.router, prefix="/auth", tags=["authentication"])
 TEST_DATABASE_URL = "sqlite:///./test.db"
 engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# NullPool: TestClient may run each request on a fresh event loop
+async_engine = create_async_engine(make_async_url(TEST_DATABASE_URL), poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
 
 def override_get_db():
     """Override get_db for testing."""
@@ -43,6 +48,13 @@ def override_get_db():
 
 app.dependency_overrides[get_db] = override_get_db
 
+async def override_get_async_db():
+    """Override get_async_db for testing."""
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
+app.dependency_overrides[get_async_db] = override_get_async_db
+
 client = TestClient(app)
 
 @pytest.fixture(scope="function", autouse=True)
@@ -366,6 +378,134 @@ def test_update_password_missing_fields():
     assert response.status_code == 400
     assert "Both old and new passwords required" in response.json()["detail"]
 
+def register_and_login(username, role="student"):
+    client.post("/auth/register", json={
+        "username": username,
+        "email": f"{username}@example.com",
+        "password": "testpass123",
+        "full_name": username.title(),
+        "role": role
+    })
+    response = client.post("/auth/token", data={"username": username, "password": "testpass123"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def test_current_user_served_from_cache():
+    """Test that authenticated requests resolve the user without querying the database."""
+    headers = register_and_login("cacheduser")
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    for bind in (engine, async_engine.sync_engine):
+        event.listen(bind, "before_cursor_execute", before_cursor_execute)
+    try:
+        for _ in range(3):
+            response = client.get("/auth/users/me", headers=headers)
+            assert response.status_code == 200
+    finally:
+        for bind in (engine, async_engine.sync_engine):
+            event.remove(bind, "before_cursor_execute", before_cursor_execute)
+
+    assert statements == []
+    assert response.json()["username"] == "cacheduser"
+
+def test_current_user_lookup_uses_async_engine():
+    """Test that a cache miss in get_current_user queries through the async engine only."""
+    headers = register_and_login("asyncuser")
+    auth.user_cache.clear()
+    sync_statements, async_statements = [], []
+
+    def on_sync(conn, cursor, statement, parameters, context, executemany):
+        sync_statements.append(statement)
+
+    def on_async(conn, cursor, statement, parameters, context, executemany):
+        async_statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", on_sync)
+    event.listen(async_engine.sync_engine, "before_cursor_execute", on_async)
+    try:
+        response = client.get("/auth/users/me", headers=headers)
+    finally:
+        event.remove(engine, "before_cursor_execute", on_sync)
+        event.remove(async_engine.sync_engine, "before_cursor_execute", on_async)
+
+    assert response.status_code == 200
+    assert sync_statements == []
+    assert len(async_statements) == 1
+
+def test_make_async_url():
+    """Test mapping sync database URLs to async drivers."""
+    assert make_async_url("sqlite:///./edufix.db") == "sqlite+aiosqlite:///./edufix.db"
+    assert make_async_url("postgresql://u:p@db/edufix") == "postgresql+asyncpg://u:p@db/edufix"
+    assert make_async_url("postgresql+psycopg2://u:p@db/edufix") == "postgresql+asyncpg://u:p@db/edufix"
+
+def test_profile_update_invalidates_cached_user():
+    """Test that renaming a user drops the cached identity for the old token subject."""
+    headers = register_and_login("renameduser")
+    assert client.get("/auth/users/me", headers=headers).status_code == 200
+
+    response = client.put("/auth/users/me", json={
+        "username": "renameduser2",
+        "email": "renameduser@example.com",
+        "full_name": "Renamed User"
+    }, headers=headers)
+    assert response.status_code == 200
+
+    # The old token's subject no longer exists
+    assert client.get("/auth/users/me", headers=headers).status_code == 401
+
+    response = client.post("/auth/token", data={"username": "renameduser2", "password": "testpass123"})
+    new_headers = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    assert client.get("/auth/users/me", headers=new_headers).json()["full_name"] == "Renamed User"
+
+def test_auth_metrics():
+    """Test that cache hit/miss counters are exposed to managers only."""
+    student_headers = register_and_login("metricsstudent")
+    assert client.get("/auth/metrics", headers=student_headers).status_code == 403
+
+    manager_headers = register_and_login("metricsmanager", role="manager")
+    stats = client.get("/auth/metrics", headers=manager_headers).json()["user_cache"]
+    before = stats["hits"]
+    stats = client.get("/auth/metrics", headers=manager_headers).json()["user_cache"]
+    assert stats["hits"] == before + 1
+    assert {"size", "maxsize", "misses", "hit_rate"} <= set(stats)
+
+def test_password_pool_metrics():
+    """Test that logins run on the hashing pool and are counted."""
+    manager_headers = register_and_login("poolmanager", role="manager")
+    before = client.get("/auth/metrics", headers=manager_headers).json()["password_hasher"]
+
+    response = client.post("/auth/token", data={"username": "poolmanager", "password": "testpass123"})
+    assert response.status_code == 200
+
+    stats = client.get("/auth/metrics", headers=manager_headers).json()["password_hasher"]
+    assert stats["completed"] == before["completed"] + 1
+    assert stats["in_flight"] == 0
+    assert stats["queued"] == 0
+
+def test_password_pool_rejects_when_saturated():
+    """Test that logins are shed with 503 once the hashing queue is full."""
+    import threading
+    from password_hashing import PasswordHasherPool
+
+    register_and_login("saturateduser")
+    release = threading.Event()
+    saturated_pool = PasswordHasherPool(max_workers=1, max_queue=0)
+    blocked = saturated_pool._submit(release.wait)
+
+    original_pool = auth.password_pool
+    auth.password_pool = saturated_pool
+    try:
+        response = client.post("/auth/token", data={"username": "saturateduser", "password": "testpass123"})
+        assert response.status_code == 503
+        assert response.headers["Retry-After"] == "1"
+        assert saturated_pool.stats()["rejected"] == 1
+    finally:
+        auth.password_pool = original_pool
+        release.set()
+        blocked.result()
+
 @pytest.mark.skip(reason="bcrypt backend detection issue")
 def test_password_hashing():
     """Test password hashing functionality."""
@@ -1,15 +1,20 @@
 import pytest
 import sys
 import os
+import hashlib
+import time
+from email.utils import parsedate_to_datetime
 
 # Add the parent directory to the path so we can import modules
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from database import Base, get_db
-from models import User, Class, Course, Unit, Lesson, Material, Question, UserAnswer, Mastery, Gamification  # Import all models to register them
+from sqlalchemy.pool import NullPool
+from database import Base, get_db, get_async_db, make_async_url
+from models import User, Class, Course, Unit, Lesson, Material, Blob, Question, UserAnswer, Mastery, Gamification  # Import all models to register them
 
 # Import the app components separately to avoid full app import issues
 from fastapi import FastAPI
@@ -32,6 +37,9 @@ app.include_router(content.router, prefix="/api", tags=["content"])
 TEST_DATABASE_URL = "sqlite:///./test_content.db"
 engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# NullPool: TestClient may run each request on a fresh event loop
+async_engine = create_async_engine(make_async_url(TEST_DATABASE_URL), poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
 
 def override_get_db():
     """Override get_db for testing."""
@@ -43,6 +51,13 @@ def override_get_db():
 
 app.dependency_overrides[get_db] = override_get_db
 
+async def override_get_async_db():
+    """Override get_async_db for testing."""
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
+app.dependency_overrides[get_async_db] = override_get_async_db
+
 client = TestClient(app)
 
 @pytest.fixture(scope="function", autouse=True)
@@ -208,5 +223,428 @@ def test_create_and_get_lessons(teacher_token):
     assert data[0]["title"] == "Introduction to Atoms"
     assert data[1]["title"] == "Electron Configuration"
 
+def test_get_courses_paginated(teacher_token):
+    """Test keyset pagination over courses using the X-Next-Cursor header."""
+    headers = {"Authorization": f"Bearer {teacher_token}"}
+    for i in range(5):
+        client.post("/api/courses", json={"name": f"Course {i}", "subject": "Chemistry", "class_id": 1}, headers=headers)
+
+    names = []
+    cursor = None
+    pages = 0
+    while True:
+        path = "/api/courses?limit=2" + (f"&after={cursor}" if cursor else "")
+        response = client.get(path, headers=headers)
+        assert response.status_code == 200
+        names.extend(c["name"] for c in response.json())
+        pages += 1
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+
+    assert pages == 3
+    assert names == [f"Course {i}" for i in range(5)]
+
+    # Without limit or cursor every course is returned, without a next cursor
+    response = client.get("/api/courses", headers=headers)
+    assert [c["name"] for c in response.json()] == names
+    assert "X-Next-Cursor" not in response.headers
+
+def test_get_courses_field_selection(teacher_token):
+    """Test that fields= limits the serialized attributes."""
+    headers = {"Authorization": f"Bearer {teacher_token}"}
+    client.post("/api/courses", json={"name": "Chemistry Basics", "subject": "Chemistry", "class_id": 1}, headers=headers)
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = client.get("/api/courses?fields=id,name", headers=headers)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    assert response.status_code == 200
+    assert response.json() == [{"id": 1, "name": "Chemistry Basics"}]
+    # Only the selected columns are read from the database
+    (listing,) = [s for s in statements if "FROM courses" in s]
+    assert "courses.name" in listing and "courses.description" not in listing
+
+    response = client.get("/api/courses?fields=id,secret", headers=headers)
+    assert response.status_code == 400
+
+    response = client.get("/api/courses?after=not-a-cursor", headers=headers)
+    assert response.status_code == 400
+
+def create_lesson(headers):
+    course = client.post("/api/courses", json={"name": "Chemistry Basics", "subject": "Chemistry", "class_id": 1}, headers=headers)
+    unit = client.post("/api/units", json={"name": "Atomic Structure", "course_id": course.json()["id"]}, headers=headers)
+    lesson = client.post("/api/lessons", json={"title": "Introduction to Atoms", "unit_id": unit.json()["id"]}, headers=headers)
+    return lesson.json()["id"]
+
+def test_upload_material(teacher_token, tmp_path, monkeypatch):
+    """Test uploading a material through the async session."""
+    monkeypatch.setattr(content, "UPLOAD_DIR", str(tmp_path))
+    headers = {"Authorization": f"Bearer {teacher_token}"}
+    lesson_id = create_lesson(headers)
+
+    response = client.post("/api/materials/upload", data={
+        "lesson_id": lesson_id,
+        "name": "Atoms slides",
+        "content_type": "pdf"
+    }, files={"file": ("atoms.pdf", b"%PDF-1.4 atoms", "application/pdf")}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["size"] == len(b"%PDF-1.4 atoms")
+    assert response.json()["content_hash"] == hashlib.sha256(b"%PDF-1.4 atoms").hexdigest()
+
+    db = TestingSessionLocal()
+    try:
+        material = db.get(Material, response.json()["material_id"])
+        assert material.lesson_id == lesson_id
+        assert material.content_hash == response.json()["content_hash"]
+        with open(material.file_path, "rb") as f:
+            assert f.read() == b"%PDF-1.4 atoms"
+    finally:
+        db.close()
+
+    response = client.post("/api/materials/upload", data={
+        "lesson_id": 999,
+        "name": "Missing",
+        "content_type": "pdf"
+    }, files={"file": ("missing.pdf", b"x", "application/pdf")}, headers=headers)
+    assert response.status_code == 404
+
+def test_upload_material_streams_in_chunks(teacher_token, tmp_path, monkeypatch):
+    """Test that large uploads are hashed across chunks and renamed into place."""
+    import file_storage
+    monkeypatch.setattr(content, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(file_storage, "UPLOAD_CHUNK_SIZE", 1024)
+    headers = {"Authorization": f"Bearer {teacher_token}"}
+    lesson_id = create_lesson(headers)
+    payload = os.urandom(10 * 1024 + 7)
+
+    response = client.post("/api/materials/upload", data={
+        "lesson_id": lesson_id,
+        "name": "Lecture",
+        "content_type": "video"
+    }, files={"file": ("lecture.mp4", payload, "video/mp4")}, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["size"] == len(payload)
+    assert response.json()["content_hash"] == hashlib.sha256(payload).hexdigest()
+    stored = [p for p in tmp_path.rglob("*") if p.is_file()]
+    assert [p.name for p in stored] == [response.json()["content_hash"]]
+
+def test_upload_material_size_limit(teacher_token, tmp_path, monkeypatch):
+    """Test that uploads over the per-type cap are rejected without leaving files behind."""
+    import file_storage
+    monkeypatch.setattr(content, "UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(file_storage, "UPLOAD_CHUNK_SIZE", 1024)
+    monkeypatch.setenv("MAX_FILE_SIZE_PDF", "4096")
+    headers = {"Authorization": f"Bearer {teacher_token}"}
+    lesson_id = create_lesson(headers)
+
+    response = client.post("/api/materials/upload", data={
+        "lesson_id": lesson_id,
+        "name": "Too big",
+        "content_type": "pdf"
+    }, files={"file": ("big.pdf", b"x" * 5000, "application/pdf")}, headers=headers)
+    assert response.status_code == 413
+    assert list(tmp_path.iterdir()) == []
+
+    # The cap only applies to its own content type
+    response = client.post("/api/materials/upload", data={
+        "lesson_id": lesson_id,
+        "name": "Slides",
+        "content_type": "slide"
+    }, files={"file": ("big.pptx", b"x" * 5000, "application/octet-stream")}, headers=headers)
+    assert response.status_code == 200
+
+    # Labelling a file as video does not raise its cap; only actual video content does
+    monkeypatch.setattr(file_storage, "MAX_FILE_SIZE", 4096)
+    for payload, status_code in [(b"x" * 5000, 413), (b"\x00\x00\x00\x18ftypmp42" + b"x" * 5000, 200)]:
+        response = client.post("/api/materials/upload", data={
+            "lesson_id": lesson_id,
+            "name": "Lecture",
+            "content_type": "video"
+        }, files={"file": ("lecture.mp4", payload, "video/mp4")}, headers=headers)
+        assert response.status_code == status_code
+
+    db = TestingSessionLocal()
+    try:
+        assert db.query(Material).count() == 2
+    finally:
+        db.close()
+
+def upload(headers, lesson_id, filename, payload):
+    return client.post("/api/materials/upload", data={
+        "lesson_id": lesson_id,
+        "name": filename,
+        "content_type": "pdf"
+    }, files={"file": (filename, payload, "application/pdf")}, headers=headers)
+
+def test_identical_uploads_share_blob(teacher_token, tmp_path, monkeypatch):
+    """Test that identical uploads share one reference-counted blob."""
+    monkeypatch.setattr(content, "UPLOAD_DIR", str(tmp_path))
+    headers = {"Authorization": f"Bearer {teacher_token}"}
+    lesson_id = create_lesson(headers)
+
+    first = upload(headers, lesson_id, "deck.pdf", b"same deck").json()["material_id"]
+    second = upload(headers, lesson_id, "deck-copy.pdf", b"same deck").json()["material_id"]
+    upload(headers, lesson_id, "other.pdf", b"other deck")
+
+    db = TestingSessionLocal()
+    try:
+        paths = {m.id: m.file_path for m in db.query(Material).all()}
+        assert paths[first] == paths[second]
+        blob = db.query(Blob).filter(Blob.file_path == paths[first]).one()
+        assert blob.ref_count == 2
+    finally:
+        db.close()
+    assert len([p for p in tmp_path.rglob("*") if p.is_file()]) == 2
+
+    assert client.delete(f"/api/materials/{first}", headers=headers).status_code == 200
+    assert os.path.exists(paths[first])
+    assert client.delete(f"/api/materials/{second}", headers=headers).status_code == 200
+    assert not os.path.exists(paths[second])
+
+    db = TestingSessionLocal()
+    try:
+        assert db.query(Blob).count() == 1
+    finally:
+        db.close()
+
+def test_blob_files_follow_committed_references(teacher_token, tmp_path, monkeypatch):
+    """Test that blob files are only placed or removed with the transaction that changes their row."""
+    import asyncio
+    from file_storage import StoredFile, acquire_blob, release_blob
+    monkeypatch.setattr(content, "UPLOAD_DIR", str(tmp_path))
+    headers = {"Authorization": f"Bearer {teacher_token}"}
+    lesson_id = create_lesson(headers)
+    upload(headers, lesson_id, "deck.pdf", b"same deck")
+    upload(headers, lesson_id, "deck-copy.pdf", b"same deck")
+    content_hash = hashlib.sha256(b"same deck").hexdigest()
+
+    def stored_files():
+        return sorted(p.name for p in tmp_path.rglob("*") if p.is_file())
+
+    db = TestingSessionLocal()
+    try:
+        path = db.query(Blob.file_path).filter(Blob.content_hash == content_hash).scalar()
+        release_blob(db, content_hash)
+        assert db.query(Blob.ref_count).filter(Blob.content_hash == content_hash).scalar() == 1
+        release_blob(db, content_hash)
+        assert db.query(Blob).filter(Blob.content_hash == content_hash).count() == 0
+        # Moved aside until the release commits; a rollback puts it back
+        assert not os.path.exists(path)
+        db.rollback()
+        assert stored_files() == [content_hash]
+        assert db.query(Blob.ref_count).filter(Blob.content_hash == content_hash).scalar() == 2
+
+        release_blob(db, content_hash)
+        release_blob(db, content_hash)
+        db.commit()
+        assert stored_files() == []
+        release_blob(db, content_hash)  # Already gone: nothing to do
+        db.commit()
+    finally:
+        db.close()
+
+    # Uploading the file again after the release places a new copy
+    upload(headers, lesson_id, "deck-again.pdf", b"same deck")
+    assert stored_files() == [content_hash]
+
+    # An upload whose transaction does not commit leaves neither a blob row nor a file
+    staged = tmp_path / ".upload-test.part"
+    staged.write_bytes(b"new deck")
+    stored = StoredFile(path=str(staged), size=8, content_hash=hashlib.sha256(b"new deck").hexdigest())
+
+    async def acquire_and_roll_back():
+        async with TestingAsyncSessionLocal() as session:
+            await acquire_blob(session, stored, str(tmp_path))
+            await session.rollback()
+
+    asyncio.run(acquire_and_roll_back())
+    assert stored_files() == [content_hash]
+    db = TestingSessionLocal()
+    try:
+        assert db.query(Blob).filter(Blob.content_hash == stored.content_hash).count() == 0
+    finally:
+        db.close()
+
+def test_dedupe_existing_uploads(teacher_token, tmp_path):
+    """Test that the migration tool moves legacy files into the blob store."""
+    from file_storage import blob_path, dedupe_uploads
+    headers = {"Authorization": f"Bearer {teacher_token}"}
+    lesson_id = create_lesson(headers)
+
+    legacy = {"a.pdf": b"shared", "b.pdf": b"shared", "c.pdf": b"unique"}
+    db = TestingSessionLocal()
+    try:
+        for filename, payload in legacy.items():
+            path = tmp_path / filename
+            path.write_bytes(payload)
+            db.add(Material(lesson_id=lesson_id, name=filename, file_path=str(path), content_type="pdf"))
+        db.add(Material(lesson_id=lesson_id, name="gone.pdf", file_path=str(tmp_path / "gone.pdf"), content_type="pdf"))
+        db.commit()
+
+        stats = dedupe_uploads(db, str(tmp_path))
+        assert stats["duplicates"] == 1
+        assert stats["moved"] == 2
+        assert stats["missing"] == 1
+        assert stats["bytes_reclaimed"] == len(b"shared")
+
+        shared = hashlib.sha256(b"shared").hexdigest()
+        materials = {m.name: m for m in db.query(Material).all()}
+        assert materials["a.pdf"].file_path == materials["b.pdf"].file_path == blob_path(str(tmp_path), shared)
+        assert db.query(Blob).filter(Blob.content_hash == shared).one().ref_count == 2
+        assert sorted(p.name for p in tmp_path.iterdir() if p.is_file()) == []
+
+        # Running again changes nothing
+        assert dedupe_uploads(db, str(tmp_path))["moved"] == 0
+        assert db.query(Blob).count() == 2
+    finally:
+        db.close()
+
+def test_download_material_caching_and_ranges(teacher_token, tmp_path, monkeypatch):
+    """Test ETag, conditional requests, Cache-Control and byte ranges on download."""
+    monkeypatch.setattr(content, "UPLOAD_DIR", str(tmp_path))
+    headers = {"Authorization": f"Bearer {teacher_token}"}
+    lesson_id = create_lesson(headers)
+    payload = b"0123456789" * 10
+    material_id = upload(headers, lesson_id, "deck.pdf", payload).json()["material_id"]
+    url = f"/api/materials/{material_id}/download"
+
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    assert response.content == payload
+    etag = response.headers["etag"]
+    assert etag == f'"{hashlib.sha256(payload).hexdigest()}"'
+    assert response.headers["cache-control"] == "private, max-age=86400"
+    assert response.headers["accept-ranges"] == "bytes"
+
+    response = client.get(url, headers={**headers, "Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.content == b"0123456789"
+    assert response.headers["content-range"] == f"bytes 10-19/{len(payload)}"
+
+    # A stale If-Range validator gets the full file
+    response = client.get(url, headers={**headers, "Range": "bytes=10-19", "If-Range": '"stale"'})
+    assert response.status_code == 200
+
+    response = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    response = client.get(url, headers={**headers, "If-None-Match": '"stale"'})
+    assert response.status_code == 200
+
+    last_modified = client.get(url, headers=headers).headers["last-modified"]
+    response = client.get(url, headers={**headers, "If-Modified-Since": last_modified})
+    assert response.status_code == 304
+    # Dates without a zone, such as the asctime form, are GMT whatever the server's local time
+    asctime = parsedate_to_datetime(last_modified).strftime("%a %b %d %H:%M:%S %Y")
+    local_tz = os.environ.get("TZ")
+    os.environ["TZ"] = "Asia/Tokyo"
+    time.tzset()
+    try:
+        response = client.get(url, headers={**headers, "If-Modified-Since": asctime})
+        assert response.status_code == 304
+    finally:
+        if local_tz is None:
+            del os.environ["TZ"]
+        else:
+            os.environ["TZ"] = local_tz
+        time.tzset()
+    response = client.get(url, headers={**headers, "If-Modified-Since": "Mon, 01 Jan 2001 00:00:00 GMT"})
+    assert response.status_code == 200
+
+def test_download_legacy_material_weak_etag(teacher_token, tmp_path):
+    """Test that materials stored before content hashing still answer conditional requests."""
+    headers = {"Authorization": f"Bearer {teacher_token}"}
+    lesson_id = create_lesson(headers)
+    path = tmp_path / "legacy.pdf"
+    path.write_bytes(b"legacy deck")
+    db = TestingSessionLocal()
+    try:
+        material = Material(lesson_id=lesson_id, name="legacy.pdf", file_path=str(path), content_type="pdf")
+        db.add(material)
+        db.commit()
+        url = f"/api/materials/{material.id}/download"
+    finally:
+        db.close()
+
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+    assert etag.startswith('W/"')
+    assert client.get(url, headers={**headers, "If-None-Match": etag}).status_code == 304
+    assert client.get(url, headers={**headers, "If-None-Match": etag[2:]}).status_code == 304
+
+    # A newer modification time changes the tag
+    os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 1_000_000_000))
+    response = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+def test_download_cache_control_by_content_type():
+    """Test the Cache-Control policy per material content type."""
+    from downloads import cache_control
+    assert "immutable" in cache_control("video")
+    assert cache_control("unknown") == "private, no-cache"
+
+def test_content_permission_checks_use_cached_ancestry(teacher_token, tmp_path, monkeypatch):
+    """Test that repeated permission checks resolve ownership without walking the hierarchy."""
+    monkeypatch.setattr(content, "UPLOAD_DIR", str(tmp_path))
+    headers = {"Authorization": f"Bearer {teacher_token}"}
+    lesson_id = create_lesson(headers)
+    material_id = upload(headers, lesson_id, "deck.pdf", b"deck").json()["material_id"]
+    url = f"/api/materials/{material_id}/download"
+    assert client.get(url, headers=headers).status_code == 200
+
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        assert client.get(url, headers=headers).status_code == 200
+        assert client.get(f"/api/materials?lesson_id={lesson_id}", headers=headers).status_code == 200
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+    # One material lookup for the download, one page query for the listing
+    assert len(statements) == 2
+    assert not any("FROM units" in s or "FROM classes" in s for s in statements)
+
+def test_content_access_revoked_when_class_changes_teacher(teacher_token, tmp_path, monkeypatch):
+    """Test that reassigning a class invalidates cached ownership."""
+    monkeypatch.setattr(content, "UPLOAD_DIR", str(tmp_path))
+    headers = {"Authorization": f"Bearer {teacher_token}"}
+    lesson_id = create_lesson(headers)
+    material_id = upload(headers, lesson_id, "deck.pdf", b"deck").json()["material_id"]
+    assert client.get(f"/api/materials/{material_id}/download", headers=headers).status_code == 200
+
+    client.post("/auth/register", json={
+        "username": "teacher2",
+        "email": "teacher2@example.com",
+        "password": "testpass123",
+        "full_name": "Other Teacher",
+        "role": "teacher"
+    })
+    db = TestingSessionLocal()
+    try:
+        other = db.query(User).filter(User.username == "teacher2").one()
+        db.query(Class).filter(Class.id == 1).one().teacher_id = other.id
+        db.commit()
+    finally:
+        db.close()
+
+    assert client.get(f"/api/materials/{material_id}/download", headers=headers).status_code == 403
+    assert client.get("/api/lessons?unit_id=1", headers=headers).status_code == 403
+    assert client.post("/api/lessons", json={"title": "More", "unit_id": 1}, headers=headers).status_code == 403
+
 if __name__ == "__main__":
     pytest.main([__file__])
@@ -6,9 +6,11 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from database import Base, get_db
+from sqlalchemy.pool import NullPool
+from database import Base, get_db, get_async_db, make_async_url
 from models import User, Class, Course, Unit, Lesson, Question, Mastery, Session as UserSession
 
 # Import the app components separately to avoid full app import issues
@@ -32,6 +34,9 @@ app.include_router(management.router, prefix="/api/management", tags=["managemen
 TEST_DATABASE_URL = "sqlite:///./test_management.db"
 engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# NullPool: TestClient may run each request on a fresh event loop
+async_engine = create_async_engine(make_async_url(TEST_DATABASE_URL), poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
 
 def override_get_db():
     """Override get_db for testing."""
@@ -43,6 +48,13 @@ def override_get_db():
 
 app.dependency_overrides[get_db] = override_get_db
 
+async def override_get_async_db():
+    """Override get_async_db for testing."""
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
+app.dependency_overrides[get_async_db] = override_get_async_db
+
 client = TestClient(app)
 
 @pytest.fixture(scope="function", autouse=True)
@@ -341,5 +353,175 @@ def test_management_data_with_demo_setup(manager_token):
     assert lessons[0]["teacher_name"] == "Demo Teacher"
     assert lessons[0]["question_count"] == 1
 
+def seed_classes(count, offset=0):
+    """Create `count` teachers, each with a class, two students and one lesson."""
+    db = TestingSessionLocal()
+    try:
+        for i in range(offset, offset + count):
+            teacher = User(username=f"n1_teacher{i}", email=f"n1_teacher{i}@test.com",
+                           hashed_password="hashed", full_name=f"Teacher {i}", role="teacher")
+            db.add(teacher)
+            db.flush()
+
+            class_obj = Class(name=f"Class {i}", subject="Physics", teacher_id=teacher.id)
+            db.add(class_obj)
+            db.flush()
+
+            for j in range(2):
+                student = User(username=f"n1_student{i}_{j}", email=f"n1_student{i}_{j}@test.com",
+                               hashed_password="hashed", full_name=f"Student {i}.{j}",
+                               role="student", class_id=class_obj.id)
+                db.add(student)
+                db.flush()
+                db.add(Mastery(user_id=student.id, topic="Physics", score=50.0 + j))
+
+            course = Course(name=f"Course {i}", subject="Physics", class_id=class_obj.id)
+            db.add(course)
+            db.flush()
+            unit = Unit(name=f"Unit {i}", course_id=course.id)
+            db.add(unit)
+            db.flush()
+            lesson = Lesson(title=f"Lesson {i}", unit_id=unit.id)
+            db.add(lesson)
+            db.flush()
+            db.add(Question(lesson_id=lesson.id, question_text="Q?", question_type="short_answer",
+                            correct_answer="A", subject="Physics"))
+        db.commit()
+    finally:
+        db.close()
+
+def count_queries(path, token):
+    """Return the number of SQL statements issued while serving a request."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = client.get(path, headers={"Authorization": f"Bearer {token}"})
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    assert response.status_code == 200
+    return len(statements), response.json()
+
+@pytest.mark.parametrize("path", [
+    "/api/management/teachers",
+    "/api/management/students",
+    "/api/management/classes",
+    "/api/management/lessons",
+])
+def test_listing_query_count_is_constant(manager_token, path):
+    """Test that listing endpoints issue the same number of queries regardless of row count."""
+    seed_classes(3)
+    small_count, small_rows = count_queries(path, manager_token)
+
+    seed_classes(9, offset=3)
+    large_count, large_rows = count_queries(path, manager_token)
+
+    assert len(large_rows) == 4 * len(small_rows)
+    assert large_count == small_count
+
+def test_listing_aggregates(manager_token):
+    """Test that grouped aggregates match per-row expectations."""
+    seed_classes(2)
+    headers = {"Authorization": f"Bearer {manager_token}"}
+
+    teachers = client.get("/api/management/teachers", headers=headers).json()
+    assert [(t["class_count"], t["student_count"]) for t in teachers] == [(1, 2), (1, 2)]
+
+    students = client.get("/api/management/students", headers=headers).json()
+    assert [s["mastery_score"] for s in students] == [50.0, 51.0, 50.0, 51.0]
+    assert students[0]["class_name"] == "Class 0"
+    assert students[0]["teacher_name"] == "Teacher 0"
+
+    classes = client.get("/api/management/classes", headers=headers).json()
+    assert [(c["student_count"], c["course_count"]) for c in classes] == [(2, 1), (2, 1)]
+
+    lessons = client.get("/api/management/lessons", headers=headers).json()
+    assert [(l["class_name"], l["question_count"]) for l in lessons] == [("Class 0", 1), ("Class 1", 1)]
+
+def test_students_pagination_and_fields(manager_token):
+    """Test keyset pagination and field selection on the students listing."""
+    seed_classes(3)
+    headers = {"Authorization": f"Bearer {manager_token}"}
+
+    response = client.get("/api/management/students?limit=4&fields=username,mastery_score", headers=headers)
+    assert response.status_code == 200
+    first_page = response.json()
+    assert len(first_page) == 4
+    assert set(first_page[0]) == {"username", "mastery_score"}
+
+    cursor = response.headers["X-Next-Cursor"]
+    response = client.get(f"/api/management/students?limit=4&after={cursor}", headers=headers)
+    second_page = response.json()
+    assert [s["username"] for s in second_page] == ["n1_student2_0", "n1_student2_1"]
+    assert "X-Next-Cursor" not in response.headers
+
+def test_students_ndjson_export(manager_token):
+    """Test streaming the full student roster as NDJSON, ignoring the page limit."""
+    import json
+    seed_classes(3)
+    headers = {"Authorization": f"Bearer {manager_token}", "Accept": "application/x-ndjson"}
+
+    response = client.get("/api/management/students?limit=2", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == 6
+    assert rows[0]["class_name"] == "Class 0"
+
+def test_lessons_csv_export(manager_token):
+    """Test streaming the lesson listing as CSV with a field projection."""
+    import csv
+    seed_classes(2)
+    headers = {"Authorization": f"Bearer {manager_token}", "Accept": "text/csv"}
+
+    response = client.get("/api/management/lessons?fields=id,title,question_count", headers=headers)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.reader(response.text.splitlines()))
+    assert rows[0] == ["id", "title", "question_count"]
+    assert rows[1:] == [["1", "Lesson 0", "1"], ["2", "Lesson 1", "1"]]
+
+def test_active_students_counts_users_not_sessions(manager_token):
+    """Test that active students today counts each student once, from daily_active_users."""
+    from datetime import datetime, timedelta
+    from models import DailyActiveUser
+    from daily_activity import count_active_from_sessions, rebuild_daily_active_users
+
+    db = TestingSessionLocal()
+    now = datetime.utcnow()
+    today = now.date()
+    students = [
+        User(username=f"active{i}", email=f"active{i}@test.com", hashed_password="hashed",
+             full_name=f"Active {i}", role="student")
+        for i in range(3)
+    ]
+    db.add_all(students)
+    db.commit()
+
+    # Several sessions each today for two students, only an old session for the third
+    for student in students[:2]:
+        for minutes in (1, 2, 3):
+            db.add(UserSession(user_id=student.id, session_type="practice",
+                               start_time=now.replace(hour=0, minute=minutes)))
+    db.add(UserSession(user_id=students[2].id, session_type="practice", start_time=now - timedelta(days=2)))
+    db.commit()
+
+    assert db.query(DailyActiveUser).filter(DailyActiveUser.day == today).count() == 2
+    assert db.query(DailyActiveUser).count() == 3
+    student_ids = db.query(User.id).filter(User.role == "student")
+    assert count_active_from_sessions(db, today, student_ids) == 2
+
+    response = client.get("/api/management/overview", headers={"Authorization": f"Bearer {manager_token}"})
+    assert response.status_code == 200
+    assert response.json()["active_students_today"] == 2
+
+    # Rebuilding from history produces the same rows
+    assert rebuild_daily_active_users(db) == 3
+    assert db.query(DailyActiveUser).filter(DailyActiveUser.day == today).count() == 2
+    db.close()
+
 if __name__ == "__main__":
     pytest.main([__file__])
@@ -2,15 +2,18 @@ import pytest
 import sys
 import os
 import json
+from datetime import datetime
 
 # Add the parent directory to the path so we can import modules
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
 from fastapi.testclient import TestClient
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker
-from database import Base, get_db
-from models import User, Class, Course, Unit, Lesson, Question, UserAnswer, Mastery, Gamification  # Import all models to register them
+from sqlalchemy.pool import NullPool
+from database import Base, get_db, get_async_db, make_async_url
+from models import User, Class, Course, Unit, Lesson, Question, UserAnswer, Mastery, Gamification, QuestionMastery  # Import all models to register them
 
 # Import the app components separately to avoid full app import issues
 from fastapi import FastAPI
@@ -34,6 +37,9 @@ app.include_router(practice.router, prefix="/api/practice", tags=["practice"])
 TEST_DATABASE_URL = "sqlite:///./test_practice.db"
 engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# NullPool: TestClient may run each request on a fresh event loop
+async_engine = create_async_engine(make_async_url(TEST_DATABASE_URL), poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
 
 def override_get_db():
     """Override get_db for testing."""
@@ -45,6 +51,13 @@ def override_get_db():
 
 app.dependency_overrides[get_db] = override_get_db
 
+async def override_get_async_db():
+    """Override get_async_db for testing."""
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
+app.dependency_overrides[get_async_db] = override_get_async_db
+
 client = TestClient(app)
 
 @pytest.fixture(scope="function", autouse=True)
@@ -201,6 +214,47 @@ def test_get_next_question(setup_test_data, student_token):
     assert "subject" in data
     assert data["subject"] == "Chemistry"
 
+def test_get_next_question_by_unit(setup_test_data, student_token):
+    """Test that unit filtering only serves questions from the unit's lessons."""
+    test_data = setup_test_data
+
+    response = client.get(f"/api/practice/questions/next?unit_id={test_data['unit_id']}",
+                         headers={"Authorization": f"Bearer {student_token}"})
+    assert response.status_code == 200
+    assert response.json()["id"] in test_data["question_ids"]
+
+    response = client.get("/api/practice/questions/next?unit_id=999",
+                         headers={"Authorization": f"Bearer {student_token}"})
+    assert response.status_code == 404
+
+def test_question_bank_invalidated_on_question_write(setup_test_data):
+    """Test that the question bank index sees questions committed after it was built."""
+    from question_bank import question_bank
+    test_data = setup_test_data
+
+    db = TestingSessionLocal()
+    try:
+        entries = question_bank.get_questions(db, lesson_id=test_data["lesson_id"])
+        assert sorted(e.id for e in entries) == sorted(test_data["question_ids"])
+        assert entries[0].options == ("1", "2", "3", "4")
+
+        question = Question(
+            lesson_id=test_data["lesson_id"],
+            question_text="How many protons does helium have?",
+            question_type="short_answer",
+            correct_answer="2",
+            difficulty="easy",
+            subject="Chemistry"
+        )
+        db.add(question)
+        db.commit()
+
+        entries = question_bank.get_questions(db, lesson_id=test_data["lesson_id"])
+        assert question.id in [e.id for e in entries]
+        assert len(entries) == 4
+    finally:
+        db.close()
+
 def test_submit_correct_answer(setup_test_data, student_token):
     """Test submitting a correct answer."""
     test_data = setup_test_data
@@ -243,6 +297,55 @@ def test_submit_incorrect_answer(setup_test_data, student_token):
     assert data["points_earned"] == 0
     assert "explanation" in data
 
+def test_question_mastery_updated_on_submit(setup_test_data, student_token):
+    """Test that submitting answers maintains the per-question mastery state."""
+    test_data = setup_test_data
+    question_id = test_data["question_ids"][0]
+    headers = {"Authorization": f"Bearer {student_token}"}
+
+    for answer in ["1", "1", "2"]:
+        client.post(f"/api/practice/questions/{question_id}/answer", json={"answer": answer}, headers=headers)
+
+    db = TestingSessionLocal()
+    try:
+        mastery = db.query(QuestionMastery).filter(QuestionMastery.question_id == question_id).one()
+        assert mastery.score == 30  # +20, +20, -10
+        assert mastery.attempts == 3
+    finally:
+        db.close()
+
+    # The mastered question is no longer the weakest, so it should not be served
+    for _ in range(5):
+        response = client.get(f"/api/practice/questions/next?lesson_id={test_data['lesson_id']}", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["id"] != question_id
+
+def test_backfill_question_masteries(setup_test_data, student_token):
+    """Test that the backfill reproduces the incrementally maintained state."""
+    from question_mastery import backfill_question_masteries
+    test_data = setup_test_data
+    headers = {"Authorization": f"Bearer {student_token}"}
+
+    answers = [(0, "1"), (0, "2"), (1, "H2O"), (2, "+1"), (2, "-1"), (2, "-1")]
+    for index, answer in answers:
+        question_id = test_data["question_ids"][index]
+        client.post(f"/api/practice/questions/{question_id}/answer", json={"answer": answer}, headers=headers)
+
+    db = TestingSessionLocal()
+    try:
+        def snapshot():
+            return sorted(
+                (m.user_id, m.question_id, m.score, m.attempts, m.easiness, m.interval_days, m.repetitions)
+                for m in db.query(QuestionMastery).all()
+            )
+
+        incremental = snapshot()
+        assert backfill_question_masteries(db, batch_size=2) == 3
+        db.expire_all()
+        assert snapshot() == incremental
+    finally:
+        db.close()
+
 def test_get_hint(setup_test_data, student_token):
     """Test getting a hint for a question."""
     test_data = setup_test_data
@@ -294,5 +397,580 @@ def test_invalid_hint_level(setup_test_data, student_token):
     assert response.status_code == 400
     assert "Invalid hint level" in response.json()["detail"]
 
+def student_state(username):
+    """Return a student's stored answers, masteries and gamification."""
+    db = TestingSessionLocal()
+    try:
+        user_id = db.query(User.id).filter(User.username == username).scalar()
+        return {
+            "answers": [
+                (a.question_id, a.answer, a.is_correct, a.time_taken, a.hints_used)
+                for a in db.query(UserAnswer).filter(UserAnswer.user_id == user_id).order_by(UserAnswer.id)
+            ],
+            "masteries": sorted((m.topic, m.score) for m in db.query(Mastery).filter(Mastery.user_id == user_id)),
+            "question_masteries": sorted(
+                (m.question_id, m.score, m.attempts)
+                for m in db.query(QuestionMastery).filter(QuestionMastery.user_id == user_id)
+            ),
+            "gamification": [(g.points, g.streak) for g in db.query(Gamification).filter(Gamification.user_id == user_id)]
+        }
+    finally:
+        db.close()
+
+def test_bulk_answers_match_sequential_submits(setup_test_data, student_token):
+    """Test that a bulk submission has the same results and effects as sequential submits."""
+    question_ids = setup_test_data["question_ids"]
+    answers = [
+        {"question_id": question_ids[0], "answer": "1", "time_taken": 20},
+        {"question_id": question_ids[1], "answer": "h2o", "time_taken": 90},
+        {"question_id": question_ids[2], "answer": "+1"},
+        {"question_id": question_ids[0], "answer": "1", "time_taken": 10},
+        {"question_id": question_ids[2], "answer": "-1", "hints_used": 2},
+    ]
+
+    sequential = []
+    for item in answers:
+        body = {key: value for key, value in item.items() if key != "question_id"}
+        response = client.post(f"/api/practice/questions/{item['question_id']}/answer", json=body,
+                               headers={"Authorization": f"Bearer {student_token}"})
+        assert response.status_code == 200
+        sequential.append(response.json())
+
+    # A second student replays the same queue in one request
+    client.post("/auth/register", json={
+        "username": "student2", "email": "student2@example.com", "password": "testpass123",
+        "full_name": "Offline Student", "role": "student", "class_id": 1
+    })
+    token = client.post("/auth/token", data={"username": "student2", "password": "testpass123"}).json()["access_token"]
+    response = client.post("/api/practice/answers/bulk", json={"answers": answers},
+                           headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    results = response.json()
+    assert [r["status"] for r in results] == ["applied"] * len(answers)
+    assert [r["result"] for r in results] == sequential
+    assert student_state("student2") == student_state("student1")
+
+def test_bulk_answers_unknown_question_and_client_time(setup_test_data, student_token):
+    """Test that unknown questions are reported per answer and client timestamps are kept."""
+    question_id = setup_test_data["question_ids"][0]
+    answered_at = "2026-01-05T09:30:00+02:00"
+    response = client.post("/api/practice/answers/bulk", json={"answers": [
+        {"question_id": 9999, "answer": "1"},
+        {"question_id": question_id, "answer": "1", "answered_at": answered_at},
+    ]}, headers={"Authorization": f"Bearer {student_token}"})
+    assert response.status_code == 200
+    results = response.json()
+    assert results[0] == {"question_id": 9999, "status": "not_found", "result": None}
+    assert results[1]["status"] == "applied"
+    assert results[1]["result"]["is_correct"] is True
+
+    db = TestingSessionLocal()
+    try:
+        answer = db.query(UserAnswer).one()
+        assert answer.created_at.replace(tzinfo=None) == datetime(2026, 1, 5, 7, 30)
+    finally:
+        db.close()
+
+    response = client.post("/api/practice/answers/bulk", json={"answers": []},
+                           headers={"Authorization": f"Bearer {student_token}"})
+    assert response.status_code == 422
+
+def test_concurrent_submits_keep_exact_counts(setup_test_data, student_token):
+    """Test that parallel single and bulk submits from one student lose no updates."""
+    from concurrent.futures import ThreadPoolExecutor
+    easy_id, _, medium_id = setup_test_data["question_ids"]
+    headers = {"Authorization": f"Bearer {student_token}"}
+
+    def submit(index):
+        if index % 2:
+            return client.post(f"/api/practice/questions/{easy_id}/answer",
+                               json={"answer": "1", "time_taken": 30}, headers=headers)
+        return client.post("/api/practice/answers/bulk", json={"answers": [
+            {"question_id": easy_id, "answer": "1", "time_taken": 30},
+            {"question_id": medium_id, "answer": "-1", "time_taken": 30},
+            {"question_id": medium_id, "answer": "-1", "time_taken": 30},
+        ]}, headers=headers)
+
+    # 8 single and 8 bulk submits: 16 easy and 16 medium answers, all correct
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        responses = list(pool.map(submit, range(16)))
+    assert all(r.status_code == 200 for r in responses), [r.text for r in responses if r.status_code != 200]
+
+    db = TestingSessionLocal()
+    try:
+        assert db.query(UserAnswer).count() == 32
+        gamification = db.query(Gamification).one()
+        assert gamification.points == 32 * 15
+        assert gamification.streak == 32
+        assert sorted((m.topic, m.score) for m in db.query(Mastery)) == [
+            ("Chemistry_easy", 80.0), ("Chemistry_medium", 80.0)
+        ]
+        assert sorted((m.question_id, m.score, m.attempts) for m in db.query(QuestionMastery)) == [
+            (easy_id, 100, 16), (medium_id, 100, 16)
+        ]
+    finally:
+        db.close()
+
+def test_write_behind_submit_and_group_commit(setup_test_data, student_token, tmp_path, monkeypatch):
+    """Test that write-behind submits respond from the journal and are committed in one flush."""
+    import write_behind
+    journal = write_behind.AnswerJournal(str(tmp_path), session_factory=TestingSessionLocal)
+    monkeypatch.setattr(write_behind, "answer_journal", journal)
+    question_ids = setup_test_data["question_ids"]
+    headers = {"Authorization": f"Bearer {student_token}"}
+
+    for question_id, answer in [(question_ids[0], "1"), (question_ids[1], "H2O"), (question_ids[2], "0")]:
+        response = client.post(f"/api/practice/questions/{question_id}/answer",
+                               json={"answer": answer, "time_taken": 20}, headers=headers)
+        assert response.status_code == 200
+    assert response.json()["is_correct"] is False
+
+    # Nothing is committed yet, but the student's own reads include the journaled answers
+    db = TestingSessionLocal()
+    try:
+        assert db.query(UserAnswer).count() == 0
+    finally:
+        db.close()
+    expected_gamification = {"points": 30, "badges": [], "streak": 0}
+    expected_mastery = [("Chemistry_easy", 10.0), ("Chemistry_medium", 0.0)]
+    assert client.get("/api/practice/gamification", headers=headers).json() == expected_gamification
+    mastery = client.get("/api/practice/mastery", headers=headers).json()
+    assert [(m["topic"], m["score"]) for m in mastery] == expected_mastery
+
+    assert journal.flush() == 3
+    db = TestingSessionLocal()
+    try:
+        answers = db.query(UserAnswer).order_by(UserAnswer.id).all()
+        assert [a.answer for a in answers] == ["1", "H2O", "0"]
+        assert all(a.submission_id for a in answers)
+    finally:
+        db.close()
+    assert client.get("/api/practice/gamification", headers=headers).json() == expected_gamification
+    mastery = client.get("/api/practice/mastery", headers=headers).json()
+    assert [(m["topic"], m["score"]) for m in mastery] == expected_mastery
+    assert not any(name.endswith(".log") for name in os.listdir(tmp_path))
+    journal.close()
+
+def test_write_behind_crash_replay(setup_test_data, student_token, tmp_path, monkeypatch):
+    """Test that journaled answers survive a crash and are applied exactly once on replay."""
+    import shutil
+    import write_behind
+    question_ids = setup_test_data["question_ids"]
+    headers = {"Authorization": f"Bearer {student_token}"}
+
+    # Crash before any flush, in the middle of writing a third answer
+    journal = write_behind.AnswerJournal(str(tmp_path), session_factory=TestingSessionLocal)
+    monkeypatch.setattr(write_behind, "answer_journal", journal)
+    for question_id, answer in [(question_ids[0], "1"), (question_ids[2], "-1")]:
+        response = client.post(f"/api/practice/questions/{question_id}/answer",
+                               json={"answer": answer, "time_taken": 90}, headers=headers)
+        assert response.status_code == 200
+    (segment,) = [name for name in os.listdir(tmp_path) if name.endswith(".log")]
+    with open(tmp_path / segment, "a") as f:
+        f.write('{"submission_id": "torn", "user_id"')
+    monkeypatch.setattr(write_behind, "answer_journal", None)
+    journal.close()  # The crashed process releases its lock
+
+    def stored_state():
+        db = TestingSessionLocal()
+        try:
+            gamification = db.query(Gamification).one()
+            return (
+                db.query(UserAnswer).count(),
+                gamification.points,
+                gamification.streak,
+                sorted((m.topic, m.score) for m in db.query(Mastery))
+            )
+        finally:
+            db.close()
+
+    # Restart: the two acknowledged answers are replayed, the torn one dropped
+    saved = tmp_path.parent / "saved_segment"
+    shutil.copy(tmp_path / segment, saved)
+    recovered = write_behind.AnswerJournal(str(tmp_path), session_factory=TestingSessionLocal)
+    assert recovered.flush() == 2
+    assert not any(name.endswith(".log") for name in os.listdir(tmp_path))
+    recovered.close()
+    expected = (2, 20, 2, [("Chemistry_easy", 5.0), ("Chemistry_medium", 5.0)])
+    assert stored_state() == expected
+
+    # Crash after the commit but before the segment was deleted: replay applies nothing
+    shutil.copy(saved, tmp_path / segment)
+    replayed = write_behind.AnswerJournal(str(tmp_path), session_factory=TestingSessionLocal)
+    assert replayed.flush() == 0
+    assert stored_state() == expected
+    replayed.close()
+
+def test_write_behind_journals_are_per_process(setup_test_data, student_token, tmp_path):
+    """Test that a locked journal directory is refused and each process journal gets its own slot."""
+    import write_behind
+    from models import Question
+    first = write_behind.open_process_journal(str(tmp_path), session_factory=TestingSessionLocal)
+    second = write_behind.open_process_journal(str(tmp_path), session_factory=TestingSessionLocal)
+    assert (first.directory, second.directory) == (str(tmp_path / "0"), str(tmp_path / "1"))
+    with pytest.raises(RuntimeError):
+        write_behind.AnswerJournal(str(tmp_path / "0"), session_factory=TestingSessionLocal)
+
+    db = TestingSessionLocal()
+    try:
+        question = db.get(Question, setup_test_data["question_ids"][0])
+        student_id = db.query(User.id).filter(User.username == "student1").scalar()
+        first.append(student_id, 1, question, "1", 10, 0)
+        second.append(student_id, 1, question, "2", 10, 0)
+    finally:
+        db.close()
+
+    # Flushing one journal leaves the other's acknowledged answer alone
+    assert first.flush() == 1
+    assert [name for name in os.listdir(tmp_path / "1") if name.endswith(".log")] == ["000000000000.log"]
+    first.close()
+    second.close()
+
+    # A restarted process takes the free slot 0, then slot 1 replays the other answer
+    restarted = write_behind.open_process_journal(str(tmp_path), session_factory=TestingSessionLocal)
+    other = write_behind.open_process_journal(str(tmp_path), session_factory=TestingSessionLocal)
+    assert (restarted.flush(), other.flush()) == (0, 1)
+    restarted.close()
+    other.close()
+    db = TestingSessionLocal()
+    try:
+        assert sorted(a.answer for a in db.query(UserAnswer)) == ["1", "2"]
+    finally:
+        db.close()
+
+def test_write_behind_dead_letters_failing_records(setup_test_data, student_token, tmp_path):
+    """Test that a record that cannot be applied is dead-lettered instead of blocking the others."""
+    import json
+    import write_behind
+    from models import Question
+    journal = write_behind.AnswerJournal(str(tmp_path), session_factory=TestingSessionLocal)
+    db = TestingSessionLocal()
+    try:
+        question = db.get(Question, setup_test_data["question_ids"][0])
+        student_id = db.query(User.id).filter(User.username == "student1").scalar()
+        for answer in ["1", "2", "3"]:
+            journal.append(student_id, 1, question, answer, 10, 0)
+    finally:
+        db.close()
+    poison = journal._pending[1]
+    poison["answered_at"] = "not a timestamp"
+
+    assert journal.flush() == 2
+    with journal.pending_answers(student_id) as pending:
+        assert pending == []
+    assert not any(name.endswith(".log") for name in os.listdir(tmp_path))
+    with open(tmp_path / write_behind.DEAD_LETTER_FILE) as f:
+        (dead,) = [json.loads(line) for line in f]
+    assert dead["submission_id"] == poison["submission_id"]
+    assert "not a timestamp" in dead["error"]
+    journal.close()
+    db = TestingSessionLocal()
+    try:
+        assert sorted(a.answer for a in db.query(UserAnswer)) == ["1", "3"]
+    finally:
+        db.close()
+
+def test_elo_selector_follows_ability(setup_test_data, student_token, monkeypatch):
+    """Test that the Elo selector moves to harder questions as a student answers correctly."""
+    import math
+    import random
+    import adaptive
+    selector = adaptive.EloSelector(rng=random.Random(0))
+    monkeypatch.setattr(adaptive, "question_selector", selector)
+    headers = {"Authorization": f"Bearer {student_token}"}
+
+    db = TestingSessionLocal()
+    try:
+        for i in range(60):
+            db.add(Question(lesson_id=setup_test_data["lesson_id"], question_text=f"Question {i}",
+                            question_type="short_answer", correct_answer=str(i),
+                            difficulty=["easy", "medium", "hard"][i % 3], subject="Chemistry"))
+        db.commit()
+        correct_answers = dict(db.query(Question.id, Question.correct_answer))
+        student_id = db.query(User.id).filter(User.username == "student1").scalar()
+    finally:
+        db.close()
+
+    served = []
+    for _ in range(25):
+        response = client.get(f"/api/practice/questions/next?lesson_id={setup_test_data['lesson_id']}",
+                              headers=headers)
+        assert response.status_code == 200
+        question = response.json()
+        served.append(question)
+        response = client.post(f"/api/practice/questions/{question['id']}/answer",
+                               json={"answer": correct_answers[question["id"]], "time_taken": 10},
+                               headers=headers)
+        assert response.json()["is_correct"] is True
+
+    # A new student starts around easy questions; correct answers lead to hard ones
+    assert served[0]["difficulty"] == "easy"
+    assert all(q["difficulty"] == "hard" for q in served[-5:])
+    ids = [q["id"] for q in served]
+    for i, question_id in enumerate(ids):
+        assert question_id not in ids[max(0, i - adaptive.RECENT_QUESTIONS):i]
+    assert selector.ability(student_id) > 2
+    assert selector.difficulty(served[-1]["id"]) < adaptive.DIFFICULTY_PRIORS["hard"]
+
+    # A wrong answer costs ability; a restarted selector seeds it from the success rate
+    before = selector.ability(student_id)
+    client.post(f"/api/practice/questions/{served[-1]['id']}/answer", json={"answer": "wrong"}, headers=headers)
+    assert selector.ability(student_id) < before
+    restarted = adaptive.EloSelector()
+    db = TestingSessionLocal()
+    try:
+        restarted.select(db, student_id, lesson_id=setup_test_data["lesson_id"])
+    finally:
+        db.close()
+    assert restarted.ability(student_id) == pytest.approx(math.log(26 / 2))
+
+def test_irt_spool_skips_questions_missing_from_snapshot(setup_test_data, student_token, tmp_path):
+    """Test that answers to questions outside the calibrated id snapshot are not spooled."""
+    import numpy as np
+    import irt_calibration
+    question_ids = setup_test_data["question_ids"]
+    headers = {"Authorization": f"Bearer {student_token}"}
+    for question_id, answer in [(question_ids[0], "1"), (question_ids[1], "H2O"), (question_ids[2], "0")]:
+        client.post(f"/api/practice/questions/{question_id}/answer", json={"answer": answer}, headers=headers)
+
+    # The middle question falls between two snapshot ids
+    path = str(tmp_path / "answers.bin")
+    snapshot = np.array([question_ids[0], question_ids[2]], dtype=np.int64)
+    assert irt_calibration._spool(TEST_DATABASE_URL, snapshot, (None, None), path, 2) == 2
+    spooled = np.fromfile(path, dtype=irt_calibration.SPOOL_DTYPE)
+    assert spooled["item"].tolist() == [0, 1]
+    assert spooled["correct"].tolist() == [1, 0]
+
+    # The later questions come after every snapshot id
+    snapshot = np.array([question_ids[0]], dtype=np.int64)
+    assert irt_calibration._spool(TEST_DATABASE_URL, snapshot, (None, None), path, 2) == 1
+    assert np.fromfile(path, dtype=irt_calibration.SPOOL_DTYPE)["item"].tolist() == [0]
+
+def test_question_selector_interface_is_enforced():
+    """Test that incomplete selectors and unknown QUESTION_SELECTOR values fail up front."""
+    import subprocess
+    import adaptive
+
+    class SelectOnly(adaptive.QuestionSelector):
+        def select(self, db, user_id, lesson_id=None, unit_id=None, subject=None):
+            return None
+
+    with pytest.raises(TypeError):
+        SelectOnly()
+
+    result = subprocess.run(
+        [sys.executable, "-c", "import adaptive"], capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.dirname(__file__)), env={**os.environ, "QUESTION_SELECTOR": "bogus"}
+    )
+    assert result.returncode != 0
+    assert "ValueError: Unknown QUESTION_SELECTOR 'bogus'; choose one of: mastery, elo" in result.stderr
+
+def test_irt_calibration_recovers_question_parameters(setup_test_data, student_token):
+    """Test that calibration fits simulated 2PL answers the same way in chunks and in parallel."""
+    import numpy as np
+    import irt_calibration
+    import adaptive
+    from sqlalchemy import insert
+    from models import ItemParameter
+
+    rng = np.random.default_rng(7)
+    true_difficulty = np.linspace(-2, 2, 12)
+    db = TestingSessionLocal()
+    try:
+        db.execute(insert(User), [
+            {"username": f"sim{i}", "email": f"sim{i}@example.com", "hashed_password": "x",
+             "full_name": f"Sim {i}", "role": "student", "class_id": 1}
+            for i in range(400)
+        ])
+        db.execute(insert(Question), [
+            {"lesson_id": setup_test_data["lesson_id"], "question_text": f"Q{j}", "question_type": "short_answer",
+             "correct_answer": "a", "difficulty": "medium", "subject": "Chemistry"}
+            for j in range(len(true_difficulty))
+        ])
+        user_ids = [u for (u,) in db.query(User.id).filter(User.username.like("sim%")).order_by(User.id)]
+        question_ids = [q for (q,) in db.query(Question.id).filter(Question.question_text.like("Q%")).order_by(Question.id)]
+        ability = rng.normal(0, 1, len(user_ids))
+        correct = rng.random((len(user_ids), len(question_ids))) < 1 / (1 + np.exp(-(ability[:, None] - true_difficulty)))
+        db.execute(insert(UserAnswer), [
+            {"user_id": user_id, "question_id": question_id, "answer": "a", "is_correct": bool(correct[i, j])}
+            for i, user_id in enumerate(user_ids) for j, question_id in enumerate(question_ids)
+        ])
+        db.commit()
+
+        fits = []
+        for chunk_size, workers in [(100_000, 1), (7, 1), (7, 2)]:
+            stats = irt_calibration.calibrate(db, chunk_size=chunk_size, workers=workers)
+            assert stats["answers"] == len(user_ids) * len(question_ids)
+            fits.append({p.question_id: (p.difficulty, p.discrimination, p.answers) for p in db.query(ItemParameter)})
+    finally:
+        db.close()
+
+    # Only answered questions are written; students split across chunks and workers give the same fit
+    assert sorted(fits[0]) == question_ids
+    for fit in fits[1:]:
+        for question_id in question_ids:
+            assert fit[question_id] == pytest.approx(fits[0][question_id], rel=1e-6)
+    difficulty = np.array([fits[0][q][0] for q in question_ids])
+    assert np.corrcoef(difficulty, true_difficulty)[0, 1] > 0.98
+    assert all(fits[0][q][2] == len(user_ids) for q in question_ids)
+
+    # The Elo selector starts from the calibrated parameters
+    selector = adaptive.EloSelector()
+    db = TestingSessionLocal()
+    try:
+        selector.select(db, user_ids[0], lesson_id=setup_test_data["lesson_id"])
+    finally:
+        db.close()
+    assert selector.difficulty(question_ids[-1]) == pytest.approx(fits[0][question_ids[-1]][0])
+
+def test_review_mode_serves_most_overdue_question(setup_test_data, student_token):
+    """Test that review mode serves due questions most overdue first and reschedules them with SM-2."""
+    from datetime import timedelta
+    test_data = setup_test_data
+    question_ids = test_data["question_ids"]
+    headers = {"Authorization": f"Bearer {student_token}"}
+    review_url = f"/api/practice/questions/next?mode=review&lesson_id={test_data['lesson_id']}"
+
+    for question_id, answer in [(question_ids[0], "1"), (question_ids[1], "wrong"), (question_ids[2], "-1")]:
+        client.post(f"/api/practice/questions/{question_id}/answer", json={"answer": answer, "time_taken": 10},
+                    headers=headers)
+
+    # Everything was just answered, so nothing is due yet
+    response = client.get(review_url, headers=headers)
+    assert response.status_code == 404
+    assert client.get("/api/practice/questions/next?mode=cram", headers=headers).status_code == 422
+
+    db = TestingSessionLocal()
+    try:
+        masteries = {m.question_id: m for m in db.query(QuestionMastery)}
+        assert (masteries[question_ids[0]].repetitions, masteries[question_ids[0]].interval_days) == (1, 1)
+        assert (masteries[question_ids[1]].repetitions, masteries[question_ids[1]].interval_days) == (0, 1)
+        assert masteries[question_ids[1]].easiness == pytest.approx(1.96)
+        # Two days pass; the second question is made the most overdue
+        for question_id, mastery in masteries.items():
+            mastery.due_at -= timedelta(days=2 if question_id != question_ids[1] else 3)
+        db.commit()
+    finally:
+        db.close()
+
+    response = client.get(review_url, headers=headers)
+    assert response.status_code == 200
+    assert response.json()["id"] == question_ids[1]
+    assert response.json()["question_text"] == "What is the chemical symbol for water?"
+    client.post(f"/api/practice/questions/{question_ids[1]}/answer", json={"answer": "H2O", "time_taken": 10},
+                headers=headers)
+
+    response = client.get(review_url, headers=headers)
+    assert response.json()["id"] == question_ids[0]
+    assert response.json()["options"] == ["1", "2", "3", "4"]
+    client.post(f"/api/practice/questions/{question_ids[0]}/answer", json={"answer": "1", "time_taken": 10},
+                headers=headers)
+    assert client.get(review_url, headers=headers).json()["id"] == question_ids[2]
+
+    db = TestingSessionLocal()
+    try:
+        mastery = db.query(QuestionMastery).filter(QuestionMastery.question_id == question_ids[0]).one()
+        assert (mastery.repetitions, mastery.interval_days) == (2, 6)
+    finally:
+        db.close()
+    assert client.get(f"/api/practice/questions/next?mode=review&lesson_id=999", headers=headers).status_code == 404
+
+def test_practice_queue_served_and_refilled(setup_test_data, student_token, monkeypatch):
+    """Test that queued questions are popped without selecting, refilled after answers and dropped when stale."""
+    import adaptive
+    import practice_queues
+    queues = practice_queues.PracticeQueues(size=5, max_age_seconds=60)
+    monkeypatch.setattr(practice_queues, "PRACTICE_QUEUES", True)
+    monkeypatch.setattr(practice_queues, "practice_queues", queues)
+    selections = []
+    select_many = adaptive.question_selector.select_many
+    monkeypatch.setattr(adaptive.question_selector, "select_many",
+                        lambda *args, **kwargs: selections.append(args) or select_many(*args, **kwargs))
+    test_data = setup_test_data
+    headers = {"Authorization": f"Bearer {student_token}"}
+    next_url = f"/api/practice/questions/next?lesson_id={test_data['lesson_id']}"
+
+    # A miss selects once; the rest of the lesson is served from the queue
+    served = [client.get(next_url, headers=headers).json()["id"] for _ in range(3)]
+    assert sorted(served) == sorted(test_data["question_ids"])
+    assert len(selections) == 1
+    assert queues.stats()["hits"] == 2
+
+    # Answering refills the queue in the background, lowest mastery first
+    answered = test_data["question_ids"][0]
+    client.post(f"/api/practice/questions/{answered}/answer", json={"answer": "1"}, headers=headers)
+    assert len(selections) == 2
+    served = [client.get(next_url, headers=headers).json()["id"] for _ in range(3)]
+    assert served[-1] == answered
+    assert len(selections) == 2
+
+    # A question added to the lesson invalidates the queue
+    db = TestingSessionLocal()
+    try:
+        question = Question(lesson_id=test_data["lesson_id"], question_text="How many protons does helium have?",
+                            question_type="short_answer", correct_answer="2", difficulty="easy", subject="Chemistry")
+        db.add(question)
+        db.commit()
+        new_id = question.id
+    finally:
+        db.close()
+    served = [client.get(next_url, headers=headers).json()["id"] for _ in range(4)]
+    assert new_id in served
+    assert len(selections) == 3
+
+    # Queues older than the freshness bound are recomputed
+    queues.max_age_seconds = 0
+    client.get(next_url, headers=headers)
+    assert len(selections) == 4
+
+def test_question_payloads_cached_until_edited(setup_test_data, student_token):
+    """Test that question payloads and hints are served from the cache until the question is edited."""
+    from routers.practice import question_payloads
+    question_ids = setup_test_data["question_ids"]
+    headers = {"Authorization": f"Bearer {student_token}"}
+    next_url = f"/api/practice/questions/next?lesson_id={setup_test_data['lesson_id']}"
+    hint_url = f"/api/practice/questions/{question_ids[0]}/hints?hint_level=3"
+
+    # With the other questions mastered, the first is served next
+    client.post(f"/api/practice/questions/{question_ids[1]}/answer", json={"answer": "H2O"}, headers=headers)
+    client.post(f"/api/practice/questions/{question_ids[2]}/answer", json={"answer": "-1"}, headers=headers)
+    assert client.get(hint_url, headers=headers).json()["hint"] == "The answer involves: 1..."
+    hits = question_payloads.hits
+    response = client.get(next_url, headers=headers)
+    assert response.headers["content-type"] == "application/json"
+    assert response.json() == {
+        "id": question_ids[0], "question_text": "What is the atomic number of hydrogen?", "question_type": "mcq",
+        "options": ["1", "2", "3", "4"], "difficulty": "easy", "subject": "Chemistry"
+    }
+    assert question_payloads.hits == hits + 1
+
+    db = TestingSessionLocal()
+    try:
+        question = db.query(Question).filter(Question.id == question_ids[0]).one()
+        question.question_text = "What is the atomic number of helium?"
+        question.correct_answer = "2"
+        db.commit()
+        assert question.version == 2
+    finally:
+        db.close()
+
+    assert client.get(next_url, headers=headers).json()["question_text"] == "What is the atomic number of helium?"
+    assert client.get(hint_url, headers=headers).json()["hint"] == "The answer involves: 2..."
+
+    # Concurrent edits do not conflict; each gets its own version
+    first, second = TestingSessionLocal(), TestingSessionLocal()
+    try:
+        first.get(Question, question_ids[0]).question_text = "What is the atomic number of lithium?"
+        second.get(Question, question_ids[0]).question_type = "short_answer"
+        first.commit()
+        second.commit()
+        assert second.get(Question, question_ids[0]).version == 4
+    finally:
+        first.close()
+        second.close()
+    served = client.get(next_url, headers=headers).json()
+    assert (served["question_text"], served["question_type"]) == ("What is the atomic number of lithium?", "short_answer")
+    assert client.get(f"/api/practice/questions/999/hints", headers=headers).status_code == 404
+
 if __name__ == "__main__":
     pytest.main([__file__])
@@ -0,0 +1,257 @@
+import pytest
+import sys
+import os
+import re
+import random
+from datetime import datetime, timedelta
+
+# Add the parent directory to the path so we can import modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from database import Base, get_db, get_async_db, make_async_url
+from models import User, Class, Course, Unit, Lesson, Progress, Question, QuestionMastery
+import demo_data
+
+from fastapi import FastAPI
+from routers import auth, practice, analytics, management
+from routers.auth import get_password_hash
+
+# Create a test app with every router whose queries we inspect
+app = FastAPI()
+app.include_router(auth.router, prefix="/auth", tags=["authentication"])
+app.include_router(practice.router, prefix="/api/practice", tags=["practice"])
+app.include_router(analytics.router, prefix="/api/analytics", tags=["analytics"])
+app.include_router(management.router, prefix="/api/management", tags=["management"])
+
+# Test database
+TEST_DATABASE_URL = "sqlite:///./test_query_plans.db"
+engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
+TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# NullPool: TestClient may run each request on a fresh event loop
+async_engine = create_async_engine(make_async_url(TEST_DATABASE_URL), poolclass=NullPool)
+TestingAsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+
+def override_get_db():
+    """Override get_db for testing."""
+    try:
+        db = TestingSessionLocal()
+        yield db
+    finally:
+        db.close()
+
+app.dependency_overrides[get_db] = override_get_db
+
+async def override_get_async_db():
+    """Override get_async_db for testing."""
+    async with TestingAsyncSessionLocal() as db:
+        yield db
+
+app.dependency_overrides[get_async_db] = override_get_async_db
+
+client = TestClient(app)
+
+# Tables that grow with usage and must never be read with a full scan
+HOT_TABLES = {
+    "user_answers", "masteries", "sessions", "progress",
+    "questions", "question_masteries", "gamifications", "users", "interventions"
+}
+
+# Plan steps that may read a hot table without a search, such as
+# "SCAN questions USING COVERING INDEX ix_questions_lesson_id". Any other SCAN,
+# including full index scans, fails the test
+PERMITTED_SCANS = set()
+
+@pytest.fixture(scope="module", autouse=True)
+def demo_dataset():
+    """Load the demo dataset into the test database."""
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    random.seed(42)
+    db = TestingSessionLocal()
+
+    try:
+        password = get_password_hash("password123")
+        teachers = [
+            User(username=f"teacher{i}", email=f"teacher{i}@edufix.edu", hashed_password=password,
+                 full_name=f"Teacher {i}", role="teacher")
+            for i in range(1, 4)
+        ]
+        students = [
+            User(username=f"student{i}", email=f"student{i}@edufix.edu", hashed_password=password,
+                 full_name=f"Student {i}", role="student")
+            for i in range(1, 31)
+        ]
+        manager = User(username="manager1", email="manager1@edufix.edu", hashed_password=password,
+                       full_name="Manager", role="manager")
+        db.add_all(teachers + students + [manager])
+        db.commit()
+
+        classes = demo_data.create_demo_classes(db, teachers, students)
+        courses = demo_data.create_demo_courses(db, classes)
+        lessons = demo_data.create_demo_units_and_lessons(db, courses)
+        questions = demo_data.create_demo_questions(db, lessons)
+        demo_data.create_demo_user_answers_and_mastery(db, questions, students)
+        demo_data.create_demo_gamification(db, students)
+        demo_data.create_demo_sessions(db, students, lessons)
+        demo_data.create_demo_progress(db, students, lessons)
+        demo_data.create_demo_interventions(db, students, teachers, lessons)
+    finally:
+        db.close()
+
+    yield
+    Base.metadata.drop_all(bind=engine)
+
+def login(username):
+    response = client.post("/auth/token", data={"username": username, "password": "password123"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+def capture_selects(call):
+    """Run call() and return every SELECT it issued with its parameters."""
+    statements = []
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        response = call()
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    assert response.status_code == 200, response.text
+    return statements
+
+def full_scans(statement, parameters):
+    """Return the plan steps that scan a hot table instead of searching an index."""
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+    scans = set()
+    for row in plan:
+        match = re.match(r"SCAN (\w+)", row[-1])
+        if match and match.group(1) in HOT_TABLES and row[-1] not in PERMITTED_SCANS:
+            scans.add(row[-1])
+    return scans
+
+def assert_indexed(call):
+    statements = capture_selects(call)
+    assert statements
+    for statement, parameters in statements:
+        scans = full_scans(statement, parameters)
+        assert not scans, f"Full scan of {sorted(scans)} in:\n{statement}"
+
+def test_practice_queries_use_indexes():
+    """Test that practice endpoints only read hot tables through indexes."""
+    headers = login("student1")
+    db = TestingSessionLocal()
+    try:
+        question = db.query(Question).first()
+    finally:
+        db.close()
+
+    assert_indexed(lambda: client.get(f"/api/practice/questions/next?lesson_id={question.lesson_id}", headers=headers))
+    assert_indexed(lambda: client.get(f"/api/practice/questions/next?subject={question.subject}", headers=headers))
+    db = TestingSessionLocal()
+    try:
+        student = db.query(User).filter(User.username == "student1").one()
+        db.add(QuestionMastery(user_id=student.id, question_id=question.id, score=0, attempts=1,
+                               due_at=datetime.utcnow() - timedelta(days=1)))
+        db.commit()
+    finally:
+        db.close()
+    for scope in ["", f"&lesson_id={question.lesson_id}", f"&subject={question.subject}"]:
+        call = lambda: client.get(f"/api/practice/questions/next?mode=review{scope}", headers=headers)
+        assert_indexed(call)
+        for statement, parameters in capture_selects(call):
+            with engine.connect() as conn:
+                plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+            assert not any("TEMP B-TREE" in row[-1] for row in plan), plan
+    assert_indexed(lambda: client.post(f"/api/practice/questions/{question.id}/answer",
+                                       json={"answer": question.correct_answer}, headers=headers))
+    assert_indexed(lambda: client.get("/api/practice/mastery", headers=headers))
+    assert_indexed(lambda: client.get("/api/practice/gamification", headers=headers))
+
+def test_analytics_queries_use_indexes():
+    """Test that analytics endpoints only read hot tables through indexes."""
+    db = TestingSessionLocal()
+    try:
+        class_obj = db.query(Class).first()
+        teacher = db.query(User).filter(User.id == class_obj.teacher_id).one()
+        student = db.query(User).filter(User.class_id == class_obj.id).first()
+    finally:
+        db.close()
+
+    headers = login(teacher.username)
+    assert_indexed(lambda: client.get("/api/analytics/dashboard", headers=headers))
+    assert_indexed(lambda: client.get(f"/api/analytics/students/{student.id}/insights", headers=headers))
+    assert_indexed(lambda: client.get(f"/api/analytics/classes/{class_obj.id}/progress", headers=headers))
+
+def test_management_queries_use_indexes():
+    """Test that management endpoints only read hot tables through indexes."""
+    headers = login("manager1")
+    for path in ["overview", "teachers", "students", "classes", "lessons"]:
+        assert_indexed(lambda: client.get(f"/api/management/{path}", headers=headers))
+
+def test_class_progress_matches_per_lesson_computation():
+    """Test that the grouped class progress query matches per-lesson aggregation on the demo dataset."""
+    db = TestingSessionLocal()
+    try:
+        classes = db.query(Class).order_by(Class.id).all()
+        expected = {}
+        for class_obj in classes:
+            student_ids = [s.id for s in db.query(User).filter(User.class_id == class_obj.id)]
+            lessons = db.query(Lesson).join(Unit).join(Course).filter(
+                Course.class_id == class_obj.id
+            ).order_by(Lesson.id).all()
+            rows = []
+            for lesson in lessons:
+                records = db.query(Progress).filter(
+                    Progress.lesson_id == lesson.id, Progress.user_id.in_(student_ids)
+                ).all()
+                average = sum(p.completion_percentage for p in records) / len(records) if records else 0.0
+                rows.append({
+                    "lesson_id": lesson.id,
+                    "lesson_title": lesson.title,
+                    "average_completion": round(average, 1),
+                    "struggling_students": sum(1 for p in records if p.completion_percentage < 50),
+                    "completed_students": sum(1 for p in records if p.status == "completed")
+                })
+            expected[class_obj.id] = (class_obj.teacher_id, rows)
+        teachers = {t.id: t.username for t in db.query(User).filter(User.role == "teacher")}
+    finally:
+        db.close()
+
+    assert any(rows for _, rows in expected.values())
+    for class_id, (teacher_id, rows) in expected.items():
+        headers = login(teachers[teacher_id])
+        path = f"/api/analytics/classes/{class_id}/progress"
+        response = client.get(path, headers=headers)
+        assert response.status_code == 200
+        assert response.json() == rows
+
+        # One query reads progress, however many lessons the class has
+        statements = capture_selects(lambda: client.get(path, headers=headers))
+        assert sum(1 for statement, _ in statements if "progress" in statement) == 1
+
+def test_interventions_listing_is_one_indexed_query():
+    """Test that the filtered intervention listing is a single query ordered by the composite index."""
+    db = TestingSessionLocal()
+    try:
+        teacher = db.query(User).filter(User.role == "teacher").order_by(User.id).first()
+    finally:
+        db.close()
+
+    headers = login(teacher.username)
+    for query in ["", "?status_filter=pending&priority_filter=high", "?limit=2"]:
+        statements = capture_selects(lambda: client.get(f"/api/analytics/interventions{query}", headers=headers))
+        # Student names are joined in, not looked up per row
+        assert len(statements) == 1, [statement for statement, _ in statements]
+        with engine.connect() as conn:
+            plan = [row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statements[0][0]}", statements[0][1])]
+        assert any("ix_interventions_teacher_id_status_priority_created_at" in step for step in plan), plan
+        if "status_filter" in query:
+            assert not any("TEMP B-TREE" in step for step in plan), plan
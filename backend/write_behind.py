@@ -0,0 +1,328 @@
+"""
+Write-behind journal for submitted answers.
+
+With ANSWER_WRITE_BEHIND=1, submit_answer grades the answer, appends it to
+a local append-only journal (fsynced before responding) and returns, and a
+background thread group-commits the journaled answers to the database every
+ANSWER_FLUSH_INTERVAL_MS: one transaction per flush instead of one per
+answer.
+
+The journal is a directory of segment files holding one JSON record per
+line. A flush seals the current segment (new answers go to a fresh one),
+applies every record in the sealed segments and deletes them only after the
+commit. On startup the remaining segments are replayed. Each record carries a
+submission_id that is stored on its UserAnswer, so a record that was
+committed just before a crash is not applied twice; a torn final line is an
+answer that was never acknowledged and is dropped. If a group fails to
+commit, its records are retried one by one; a record that still fails with
+anything but an OperationalError (the database being unavailable or locked,
+retried on the next flush) is logged and moved to a dead-letter file in the
+journal directory, so it cannot hold up the answers behind it.
+
+Until it is committed, an answer is visible to the same process through
+pending_answers(), which the mastery and gamification endpoints overlay on
+the database rows.
+
+A journal holds an exclusive lock on its directory for as long as it is
+open, and only replays and deletes the segments in it. Each app process
+takes the first numbered slot under ANSWER_JOURNAL_DIR (0, 1, ...) that no
+live process has locked, so workers never touch each other's answers and a
+restarted worker replays the slot a crashed one left behind.
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import Session
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from answers import AnswerInput, apply_answers, grade_answer, mastery_change, mastery_topic
+from counters import ClampedChange
+from database import SessionLocal
+from models import UserAnswer
+
+logger = logging.getLogger(__name__)
+
+ANSWER_WRITE_BEHIND = os.getenv("ANSWER_WRITE_BEHIND", "0") == "1"
+ANSWER_JOURNAL_DIR = os.getenv("ANSWER_JOURNAL_DIR", "answer_journal")
+ANSWER_FLUSH_INTERVAL_MS = float(os.getenv("ANSWER_FLUSH_INTERVAL_MS", "50"))
+ANSWER_FLUSH_MAX_BATCH = int(os.getenv("ANSWER_FLUSH_MAX_BATCH", "1000"))
+
+SEGMENT_SUFFIX = ".log"
+LOCK_FILE = ".lock"
+# Records that failed on their own; not replayed (see flush)
+DEAD_LETTER_FILE = "dead_letter.jsonl"
+
+def _lock_directory(directory: str):
+    """Return the open lock file of `directory`, or None if another process holds it."""
+    lock_file = open(os.path.join(directory, LOCK_FILE), "a+b")
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+class AnswerJournal:
+    """Durable local log of answers awaiting a group commit."""
+
+    def __init__(
+        self,
+        directory: str = ANSWER_JOURNAL_DIR,
+        session_factory: Callable[[], Session] = SessionLocal,
+        flush_interval_ms: float = ANSWER_FLUSH_INTERVAL_MS,
+        max_batch: int = ANSWER_FLUSH_MAX_BATCH
+    ):
+        self.directory = directory
+        self.session_factory = session_factory
+        self.flush_interval_ms = flush_interval_ms
+        self.max_batch = max_batch
+        self._lock = threading.Lock()  # Orders journal writes with the pending list
+        self._commit_lock = threading.Lock()  # Held while committing and while reading pending
+        self._flush_lock = threading.Lock()  # One flush at a time
+        self._pending: List[Dict] = []
+        self._segment = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        os.makedirs(directory, exist_ok=True)
+        self._lock_file = _lock_directory(directory)
+        if self._lock_file is None:
+            raise RuntimeError(f"Answer journal {directory} is in use by another process")
+        # Segments written by this journal, or left by the crashed process it replaces
+        self._segments = sorted(name for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX))
+        self._next_segment = int(self._segments[-1][:-len(SEGMENT_SUFFIX)]) + 1 if self._segments else 0
+        for name in self._segments:
+            self._pending.extend(self._read_segment(os.path.join(directory, name)))
+
+    @staticmethod
+    def _read_segment(path: str) -> List[Dict]:
+        records = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # Torn write at the end of the segment: never acknowledged
+                    break
+        return records
+
+    def append(self, user_id: int, class_id: Optional[int], question, answer: str,
+               time_taken: Optional[float], hints_used: Optional[int]) -> Tuple[bool, int]:
+        """Grade an answer and durably journal it; return (is_correct, points_earned)."""
+        is_correct, points_earned = grade_answer(question, answer, time_taken)
+        record = {
+            "submission_id": str(uuid.uuid4()),
+            "user_id": user_id,
+            "class_id": class_id,
+            "question_id": question.id,
+            "answer": answer,
+            "time_taken": time_taken,
+            "hints_used": hints_used,
+            "answered_at": datetime.utcnow().isoformat(),
+            # Grading results, used to overlay uncommitted answers on reads
+            "topic": mastery_topic(question),
+            "is_correct": is_correct,
+            "points_earned": points_earned
+        }
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            if self._segment is None:
+                name = f"{self._next_segment:012d}{SEGMENT_SUFFIX}"
+                self._next_segment += 1
+                self._segment = open(os.path.join(self.directory, name), "a", encoding="utf-8")
+                self._segments.append(name)
+            self._segment.write(line)
+            self._segment.flush()
+            os.fsync(self._segment.fileno())
+            self._pending.append(record)
+        return is_correct, points_earned
+
+    def flush(self) -> int:
+        """Commit every journaled answer to the database; return how many were applied."""
+        with self._flush_lock:
+            with self._lock:
+                # Seal the open segment so answers arriving during the flush go to a new one
+                if self._segment is not None:
+                    self._segment.close()
+                    self._segment = None
+                sealed = list(self._segments)
+                batch = list(self._pending)
+
+            applied = 0
+            for start in range(0, len(batch), self.max_batch):
+                chunk = batch[start:start + self.max_batch]
+                try:
+                    applied += self._commit(chunk)
+                except OperationalError:
+                    raise  # Database unavailable or locked: retry the whole chunk next time
+                except Exception:
+                    # Commit the chunk record by record so one bad record cannot block the rest
+                    for record in chunk:
+                        try:
+                            applied += self._commit([record])
+                        except OperationalError:
+                            raise
+                        except Exception as exc:
+                            self._dead_letter(record, exc)
+
+            for name in sealed:
+                os.remove(os.path.join(self.directory, name))
+            with self._lock:
+                del self._segments[:len(sealed)]
+            return applied
+
+    def _commit(self, records: List[Dict]) -> int:
+        """Apply and commit the records at the head of pending; return how many were applied."""
+        db = self.session_factory()
+        try:
+            applied = self._apply(db, records)
+            with self._commit_lock:
+                # Commit and drop from pending together, so pending_answers()
+                # readers never see an answer both committed and pending
+                db.commit()
+                del self._pending[:len(records)]
+            return applied
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _dead_letter(self, record: Dict, error: Exception):
+        """Move a record that cannot be applied out of pending into the dead-letter file."""
+        logger.error("Answer %s cannot be committed, moved to %s: %r",
+                     record.get("submission_id"), DEAD_LETTER_FILE, error)
+        with open(os.path.join(self.directory, DEAD_LETTER_FILE), "a", encoding="utf-8") as f:
+            f.write(json.dumps(dict(record, error=repr(error))) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        with self._commit_lock:
+            del self._pending[:1]
+
+    @staticmethod
+    def _apply(db: Session, records: List[Dict]) -> int:
+        committed = {
+            row.submission_id for row in db.query(UserAnswer.submission_id).filter(
+                UserAnswer.submission_id.in_([r["submission_id"] for r in records])
+            )
+        }
+        by_student: Dict[Tuple[int, Optional[int]], List[AnswerInput]] = {}
+        for r in records:
+            if r["submission_id"] in committed:
+                continue
+            by_student.setdefault((r["user_id"], r["class_id"]), []).append(AnswerInput(
+                question_id=r["question_id"],
+                answer=r["answer"],
+                time_taken=r["time_taken"],
+                hints_used=r["hints_used"],
+                answered_at=datetime.fromisoformat(r["answered_at"]),
+                submission_id=r["submission_id"]
+            ))
+        for (user_id, class_id), inputs in by_student.items():
+            apply_answers(db, user_id, class_id, inputs)
+        return sum(len(inputs) for inputs in by_student.values())
+
+    @contextmanager
+    def pending_answers(self, user_id: int) -> Iterator[List[Dict]]:
+        """Yield the student's uncommitted answers, holding off commits until the block exits.
+
+        Read the database rows inside the block so that each answer is counted
+        either in the rows or in the yielded records, never both or neither.
+        """
+        with self._commit_lock:
+            yield [r for r in self._pending if r["user_id"] == user_id]
+
+    def start(self):
+        """Start the background flusher (and flush any replayed answers)."""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="answer-journal", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background flusher, commit what is left and release the directory."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        try:
+            self.flush()
+        finally:
+            self.close()
+
+    def close(self):
+        """Release the directory without flushing; unflushed answers are replayed by the next journal."""
+        with self._lock:
+            if self._segment is not None:
+                self._segment.close()
+                self._segment = None
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval_ms / 1000):
+            try:
+                self.flush()
+            except Exception:
+                # Answers stay journaled and are retried on the next interval
+                logger.exception("Answer journal flush failed")
+
+def overlay_gamification(points: int, streak: int, records: List[Dict]) -> Tuple[int, int]:
+    """Apply uncommitted answers to committed points and streak."""
+    for r in records:
+        points += r["points_earned"]
+        streak = streak + 1 if r["is_correct"] else 0
+    return points, streak
+
+def overlay_masteries(scores: Dict[str, float], records: List[Dict]) -> Dict[str, float]:
+    """Apply uncommitted answers to committed topic mastery scores."""
+    changes: Dict[str, ClampedChange] = {}
+    for r in records:
+        changes[r["topic"]] = changes.get(r["topic"], ClampedChange()).then(*mastery_change(r["is_correct"]))
+    scores = dict(scores)
+    for topic, change in changes.items():
+        scores[topic] = change.apply(scores.get(topic, 0.0))
+    return scores
+
+def open_process_journal(base_directory: str = ANSWER_JOURNAL_DIR, **kwargs) -> AnswerJournal:
+    """Open a journal in the first slot directory under `base_directory` that no live process holds."""
+    slot = 0
+    while True:
+        try:
+            return AnswerJournal(os.path.join(base_directory, str(slot)), **kwargs)
+        except RuntimeError:
+            slot += 1
+
+answer_journal: Optional[AnswerJournal] = None
+if ANSWER_WRITE_BEHIND:
+    answer_journal = open_process_journal()
+    answer_journal.start()
+    atexit.register(answer_journal.stop)
+
+@contextmanager
+def pending_answers(user_id: int) -> Iterator[List[Dict]]:
+    """pending_answers() of the process journal, or no answers when write-behind is off."""
+    if answer_journal is None:
+        yield []
+    else:
+        with answer_journal.pending_answers(user_id) as records:
+            yield records